@@ -0,0 +1,363 @@
+#! /usr/bin/env python
+"""
+Benchmarks the time-ordered viewsets from 'tests.views' against seeded
+tables, and writes the results as JSON so that versions can be compared.
+
+For each model, row count, configuration and limit it measures:
+ - the latency of a shallow page (the start of the feed) and of a deep page
+   (90% of the way through it), in milliseconds;
+ - the number of queries issued for each of those pages;
+ - the time, pages and queries needed to drain the whole feed.
+
+    $ ./runbenchmarks.py
+    $ ./runbenchmarks.py --rows 10000 100000 1000000 --limits 100
+    $ ./runbenchmarks.py --compare benchmarks/13280c6-sqlite.json
+
+Results are written to 'benchmarks/results/' (which git ignores), named
+after the commit they were measured at. The baselines kept next to it in
+'benchmarks/' are named the same way.
+
+PostgreSQL is benchmarked too when it is reachable with the usual libpq
+environment variables (PGHOST, PGPORT, PGUSER, PGPASSWORD, PGDATABASE). The
+benchmarks run in a 'test_' database that is created and destroyed.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'src'))
+
+timer = time.perf_counter
+
+DATABASES = {
+    'sqlite': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    },
+    'postgresql': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('PGDATABASE', 'postgres'),
+        'USER': os.environ.get('PGUSER', ''),
+        'PASSWORD': os.environ.get('PGPASSWORD', ''),
+        'HOST': os.environ.get('PGHOST', ''),
+        'PORT': os.environ.get('PGPORT', ''),
+    },
+}
+
+
+def configure(database):
+    from django.conf import settings
+
+    settings.configure(
+        DATABASES={'default': DATABASES[database]},
+        SECRET_KEY='not very secret in benchmarks',
+        ALLOWED_HOSTS=['testserver'],
+        ROOT_URLCONF='tests.urls',
+        INSTALLED_APPS=(
+            'django.contrib.auth',
+            'django.contrib.contenttypes',
+            'rest_framework',
+            'timeordered_pagination',
+            'tests',
+        ),
+        REST_FRAMEWORK={'PAGE_SIZE': 100},
+    )
+    import django
+    django.setup()
+
+
+def get_configurations():
+    from timeordered_pagination.counts import NoCount
+
+    return {
+        'default': {},
+        'lean': {
+            'prefetch_next_item_override': True,
+            'count_strategy_override': NoCount(),
+        },
+    }
+
+
+def get_viewsets():
+    from rest_framework import serializers
+    from tests import models, views
+
+    class ModelWithAnotherFieldSerializer(serializers.ModelSerializer):
+
+        class Meta:
+            model = models.ModelWithAnotherField
+            fields = ('id', 'n', 'another_field')
+
+    class ViewSetWithModified(views.ViewSetWithModified):
+        serializer_class = views.ModelWithModifiedSerializer
+
+    class ViewSetWithAnotherField(views.ViewSetWithAnotherField):
+        serializer_class = ModelWithAnotherFieldSerializer
+
+    return {
+        'ModelWithModified': (ViewSetWithModified, 'modified'),
+        'ModelWithAnotherField': (ViewSetWithAnotherField, 'another_field'),
+    }
+
+
+def seed(model, rows, batch_size=10000):
+    """
+    Tops the table up to 'rows' rows.
+    """
+    existing = model.objects.count()
+    for start in range(existing, rows, batch_size):
+        model.objects.bulk_create([
+            model(n=n) for n in range(start, min(start + batch_size, rows))
+        ])
+
+
+class QueryCounter(object):
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def request(view, url):
+    from rest_framework.test import APIRequestFactory
+
+    response = view(APIRequestFactory().get(url))
+    response.render()
+    return response
+
+
+def measure_page(view, url, repeat):
+    from django.db import connection
+
+    timings = []
+    for _ in range(repeat):
+        started = timer()
+        request(view, url)
+        timings.append((timer() - started) * 1000)
+    timings.sort()
+    queries = QueryCounter()
+    with connection.execute_wrapper(queries):
+        request(view, url)
+    return {
+        'min_ms': round(timings[0], 3),
+        'median_ms': round(timings[len(timings) // 2], 3),
+        'queries': queries.count,
+    }
+
+
+def measure_drain(view, url, max_pages):
+    from django.db import connection
+
+    pages = 0
+    queries = QueryCounter()
+    started = timer()
+    with connection.execute_wrapper(queries):
+        while url is not None:
+            if pages == max_pages:
+                return None
+            url = request(view, url).data['next']
+            pages += 1
+    return {
+        'seconds': round(timer() - started, 3),
+        'pages': pages,
+        'queries': queries.count,
+    }
+
+
+def run(database, options):
+    try:
+        configure(database)
+        from django.db import connection
+        connection.ensure_connection()
+    except Exception as e:
+        print('Skipping {}: {}'.format(database, e))
+        return None
+    connection.creation.create_test_db(verbosity=0, serialize=False)
+
+    from django.utils.http import urlencode
+
+    results = []
+    try:
+        for model_name, (viewset, field) in sorted(get_viewsets().items()):
+            model = viewset.queryset.model
+            ordered = model.objects.order_by(field, 'id')
+            for rows in sorted(options.rows):
+                seed(model, rows)
+                first = getattr(ordered.first(), field)
+                deep = ordered[int(rows * 0.9)]
+                for config_name, config in sorted(
+                        get_configurations().items()):
+                    view = viewset.as_view({'get': 'list'}, **config)
+                    for limit in options.limits:
+                        shallow_url = '/data/?' + urlencode({
+                            field + '_from': first.isoformat(),
+                            'limit': limit,
+                        })
+                        deep_url = '/data/?' + urlencode({
+                            field + '_from': getattr(deep, field).isoformat(),
+                            'start_from_id': deep.pk,
+                            'limit': limit,
+                        })
+                        result = {
+                            'model': model_name,
+                            'rows': rows,
+                            'config': config_name,
+                            'limit': limit,
+                            'shallow': measure_page(view, shallow_url,
+                                                    options.repeat),
+                            'deep': measure_page(view, deep_url,
+                                                 options.repeat),
+                            'drain': measure_drain(view, shallow_url,
+                                                   options.max_drain_pages),
+                        }
+                        print(format_result(result))
+                        results.append(result)
+    finally:
+        connection.creation.destroy_test_db(
+            connection.settings_dict['NAME'], verbosity=0)
+    return results
+
+
+def format_result(result):
+    drain = result['drain']
+    return '{model} rows={rows} {config} limit={limit}: ' \
+        'shallow {shallow[median_ms]}ms/{shallow[queries]}q, ' \
+        'deep {deep[median_ms]}ms/{deep[queries]}q, ' \
+        'drain {drain_summary}'.format(
+            drain_summary='skipped' if drain is None else
+            '{seconds}s/{pages}p/{queries}q'.format(**drain),
+            **result)
+
+
+def result_key(result):
+    return (result['model'], result['rows'], result['config'],
+            result['limit'])
+
+
+def compare(results, baseline):
+    """
+    Prints the ratio of each timing to the baseline (> 1 is slower).
+    """
+    baseline = dict((result_key(result), result) for result in baseline)
+    for result in results:
+        before = baseline.get(result_key(result))
+        if before is None:
+            continue
+        ratios = []
+        for name in ('shallow', 'deep'):
+            ratios.append('{} x{:.2f}'.format(
+                name, result[name]['median_ms'] /
+                max(before[name]['median_ms'], 0.001)))
+        if result['drain'] and before['drain']:
+            ratios.append('drain x{:.2f}'.format(
+                result['drain']['seconds'] /
+                max(before['drain']['seconds'], 0.001)))
+        print('{} rows={} {} limit={}: {}'.format(
+            *(result_key(result) + (', '.join(ratios),))))
+
+
+def strip_argument(argv, name, nargs):
+    if name not in argv:
+        return argv
+    index = argv.index(name)
+    return argv[:index] + argv[index + 1 + nargs:]
+
+
+def get_commit():
+    """
+    Returns the abbreviated hash of the checked out commit ('-dirty' if the
+    tree has changes), or None outside of a git checkout.
+    """
+    try:
+        output = subprocess.check_output(
+            ['git', 'describe', '--always', '--dirty', '--abbrev=7'],
+            cwd=ROOT, stderr=open(os.devnull, 'w'))
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode('ascii').strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmarks time-ordered pagination.')
+    parser.add_argument('--database', nargs='+', choices=sorted(DATABASES),
+                        default=sorted(DATABASES))
+    parser.add_argument('--rows', nargs='+', type=int,
+                        default=[10000, 100000])
+    parser.add_argument('--limits', nargs='+', type=int,
+                        default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='How many times each page is timed.')
+    parser.add_argument('--max-drain-pages', type=int, default=1000,
+                        help='Drains needing more pages are skipped.')
+    parser.add_argument('--output', default=None,
+                        help='Where to write the results (defaults to '
+                             'benchmarks/results/<commit>-<database>.json). '
+                             'The database is appended when there are '
+                             'several.')
+    parser.add_argument('--compare', default=None,
+                        help='Results to compare against.')
+    options = parser.parse_args()
+
+    if len(options.database) > 1:
+        # Django can only be configured once per process
+        argv = strip_argument(sys.argv[1:], '--database',
+                              len(options.database))
+        argv = strip_argument(argv, '--output', 1)
+        for database in options.database:
+            output = []
+            if options.output:
+                root, ext = os.path.splitext(options.output)
+                output = ['--output', '{}-{}{}'.format(root, database, ext)]
+            ret = subprocess.call([sys.executable, __file__,
+                                   '--database', database] + output + argv)
+            if ret:
+                sys.exit(ret)
+        return
+
+    database = options.database[0]
+    results = run(database, options)
+    if results is None:
+        return
+
+    import django
+    import rest_framework
+    import timeordered_pagination
+    from django.db import connection
+
+    commit = get_commit()
+    output = options.output or os.path.join(
+        ROOT, 'benchmarks', 'results', '{}-{}.json'.format(
+            commit or timeordered_pagination.__version__, database))
+    if not os.path.isdir(os.path.dirname(output)):
+        os.makedirs(os.path.dirname(output))
+    with open(output, 'w') as f:
+        json.dump({
+            'version': timeordered_pagination.__version__,
+            'commit': commit,
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'djangorestframework': rest_framework.VERSION,
+            'date': datetime.utcnow().isoformat(),
+            'results': results,
+        }, f, indent=2, sort_keys=True)
+    print('Wrote {}'.format(output))
+
+    if options.compare:
+        with open(options.compare) as f:
+            compare(results, json.load(f)['results'])
+
+
+if __name__ == '__main__':
+    main()
@@ -18,21 +18,26 @@ CLASSIFIERS = [
     "License :: Other/Proprietary License",
     "Operating System :: OS Independent",
     'Framework :: Django',
-    'Framework :: Django :: 1.8',
-    'Framework :: Django :: 1.9',
+    'Framework :: Django :: 3.2',
+    'Framework :: Django :: 4.0',
+    'Framework :: Django :: 4.1',
+    'Framework :: Django :: 4.2',
     'Intended Audience :: Developers',
     "Programming Language :: Python",
-    "Programming Language :: Python :: 2",
-    "Programming Language :: Python :: 2.7",
     "Programming Language :: Python :: 3",
-    "Programming Language :: Python :: 3.4",
-    "Programming Language :: Python :: 3.5",
+    "Programming Language :: Python :: 3 :: Only",
     "Programming Language :: Python :: 3.6",
+    "Programming Language :: Python :: 3.7",
+    "Programming Language :: Python :: 3.8",
+    "Programming Language :: Python :: 3.9",
+    "Programming Language :: Python :: 3.10",
+    "Programming Language :: Python :: 3.11",
     "Topic :: Software Development :: Libraries :: Python Modules",
 ]
+PYTHON_REQUIRES = ">=3.6"
 INSTALL_REQUIRES = [
-    'django>=1.8',
-    'djangorestframework>=3.1',
+    'django>=3.2',
+    'djangorestframework>=3.12',
 ]
 
 ###############################################################################
@@ -89,5 +94,6 @@ if __name__ == "__main__":
         package_dir={"": "src"},
         zip_safe=False,
         classifiers=CLASSIFIERS,
+        python_requires=PYTHON_REQUIRES,
         install_requires=INSTALL_REQUIRES,
     )
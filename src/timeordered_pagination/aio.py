@@ -0,0 +1,130 @@
+"""
+Async counterparts of the paginator and the viewset mixin, using Django's
+async ORM interface (Django 4.1+, Python 3 only).
+
+Independent queries (the count, the page and, unless it is prefetched, the
+next item) are awaited concurrently. Django currently runs async ORM calls
+on a single thread per request, so the queries themselves are still issued
+one after the other, but no thread is held while waiting for them.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+
+from .counts import ExactCount
+from .notifiers import monotonic
+from .pagination import TimeOrderedPagination
+from .views import TimeOrderedPaginationViewSetMixin
+
+
+async def _alist(queryset):
+    return [item async for item in queryset]
+
+
+class AsyncTimeOrderedPagination(TimeOrderedPagination):
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.cursor = self.get_cursor(request)
+        self.page = self.next_item = None
+        # The count and page phases are not measured separately, as their
+        # queries overlap
+        self.start_metrics(queryset)
+        tombstones = None
+        if getattr(view, 'tombstone_model', None) is not None:
+            tombstones = await sync_to_async(view.get_tombstone_queryset)()
+        self.merged_tombstones = tombstones is not None
+        if tombstones is not None:
+            rows, count = await asyncio.gather(
+                sync_to_async(self.merge_tombstones)(queryset, tombstones),
+                self.aget_count(queryset))
+            self.set_page(rows)
+        elif self.prefetch_next_item or self.is_reverse():
+            rows, count = await asyncio.gather(
+                _alist(queryset[:(self.limit + 1)]),
+                self.aget_count(queryset))
+            self.set_page(rows)
+        else:
+            self.page, self.next_item, count = await asyncio.gather(
+                _alist(queryset[:self.limit]),
+                _alist(queryset[self.limit:(self.limit + 1)]),
+                self.aget_count(queryset))
+        self.count, self.count_strategy_name = count
+        return self.page
+
+    async def aget_count(self, queryset):
+        if type(self.count_strategy) is ExactCount:
+            return await queryset.acount(), self.count_strategy.name
+        return await sync_to_async(self.count_strategy.get_count)(
+            queryset, self)
+
+    def get_next_item(self):
+        # apaginate_queryset() always fetches the next item with the page
+        return self.next_item[0] if self.next_item else None
+
+
+class AsyncTimeOrderedPaginationViewSetMixin(
+        TimeOrderedPaginationViewSetMixin):
+    """
+    A TimeOrderedPaginationViewSetMixin whose 'list' action is async.
+
+    The viewset must be dispatched by an async capable view class (for
+    example one from 'adrf'), as Django REST Framework's own views call
+    their handlers synchronously.
+
+    Sharded pages ('shard_aliases') and 'values_fields' pages are listed by
+    the synchronous mixin, in a thread.
+    """
+    timeordered_pagination_class = AsyncTimeOrderedPagination
+
+    async def list(self, request, *args, **kwargs):
+        if not self.is_timeordered_pagination_request():
+            return await sync_to_async(
+                super(AsyncTimeOrderedPaginationViewSetMixin, self).list)(
+                    request, *args, **kwargs)
+        if self.shard_aliases:
+            return await sync_to_async(self.sharded_list)(request)
+        if self.is_timeordered_stream_request():
+            return self.stream_list(request)
+        response = await sync_to_async(
+            self.get_high_water_mark_response)() or await sync_to_async(
+            self.get_cached_timeordered_response)()
+        if response is not None:
+            return response
+        if self.values_fields is not None:
+            response = await sync_to_async(self.values_list_page)(request)
+            self.add_high_water_mark_etag(response)
+            return self.render_values_response(response)
+
+        # Building the queryset may query (e.g. for a snapshot's bound)
+        queryset = await sync_to_async(
+            lambda: self.filter_queryset(self.get_queryset()))()
+        page = await self.apaginate_queryset(queryset)
+        data = await sync_to_async(self.serialize_timeordered_page)(page)
+        response = self.paginator.get_paginated_response(data)
+        self.add_high_water_mark_etag(response)
+        return response
+
+    async def apaginate_queryset(self, queryset):
+        paginator = self.paginator
+        wait = self.get_wait_timeout()
+        if not wait:
+            return await paginator.apaginate_queryset(
+                queryset, self.request, view=self)
+
+        # Listen before querying, so that changes made while the page is
+        # being fetched still wake us up
+        listener = await sync_to_async(self.change_notifier.listen)(
+            queryset.model)
+        try:
+            deadline = monotonic() + wait
+            while True:
+                page = await paginator.apaginate_queryset(
+                    queryset.all(), self.request, view=self)
+                remaining = deadline - monotonic()
+                if page or remaining <= 0 or \
+                        not await listener.await_change(remaining):
+                    return page
+        finally:
+            listener.close()
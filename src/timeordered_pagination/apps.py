@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+from django.core import checks
+
+
+class TimeOrderedPaginationConfig(AppConfig):
+    name = 'timeordered_pagination'
+    verbose_name = 'Time-ordered pagination'
+
+    def ready(self):
+        from .checks import check_keyset_indexes, check_replica_target_fields
+        checks.register(check_keyset_indexes, checks.Tags.models)
+        checks.register(check_replica_target_fields, checks.Tags.models)
@@ -0,0 +1,163 @@
+"""
+System checks for the models behind time-ordered viewsets.
+"""
+from django.core import checks
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections, models
+from django.urls import get_resolver
+
+from .keyset import as_tuple
+from .views import TimeOrderedPaginationViewSetMixin
+
+
+def iter_timeordered_viewsets(urlpatterns=None, prefix=''):
+    """
+    Yields a (url pattern, viewset class) pair for every view in the URL
+    configuration that uses TimeOrderedPaginationViewSetMixin.
+
+    Each viewset is only yielded for the first URL pattern it is found at.
+    """
+    seen = set()
+    if urlpatterns is None:
+        urlpatterns = get_resolver().url_patterns
+    for pattern in urlpatterns:
+        if hasattr(pattern, 'url_patterns'):
+            found = iter_timeordered_viewsets(
+                pattern.url_patterns, prefix + str(pattern.pattern))
+        else:
+            viewset = getattr(pattern.callback, 'cls', None)
+            if viewset is None or not issubclass(
+                    viewset, TimeOrderedPaginationViewSetMixin):
+                continue
+            found = [(prefix + str(pattern.pattern), viewset)]
+        for path, viewset in found:
+            if viewset not in seen:
+                seen.add(viewset)
+                yield path, viewset
+
+
+def get_keyset_fields(viewset):
+    return [viewset.target_field] + list(
+        as_tuple(viewset.start_from_target_field))
+
+
+def get_keyset_columns(viewset, model):
+    return [model._meta.get_field(name).column
+            for name in get_keyset_fields(viewset)]
+
+
+def _declared_indexes(model):
+    opts = model._meta
+    for index in getattr(opts, 'indexes', []):
+        yield [name.lstrip('-') for name in index.fields]
+    for fields in getattr(opts, 'index_together', ()):
+        yield list(fields)
+    for fields in getattr(opts, 'unique_together', ()):
+        yield list(fields)
+    for constraint in getattr(opts, 'constraints', []):
+        if getattr(constraint, 'fields', None):
+            yield list(constraint.fields)
+
+
+def has_declared_keyset_index(viewset, model):
+    """
+    Returns True if the model's Meta declares an index that starts with the
+    viewset's (target_field, start_from_target_field).
+    """
+    columns = get_keyset_columns(viewset, model)
+    for fields in _declared_indexes(model):
+        try:
+            index_columns = [model._meta.get_field(name).column
+                             for name in fields[:len(columns)]]
+        except FieldDoesNotExist:
+            continue
+        if index_columns == columns:
+            return True
+    return False
+
+
+def has_database_keyset_index(viewset, model, using='default'):
+    """
+    Returns True if the database has an index that starts with the
+    viewset's (target_field, start_from_target_field) columns.
+    """
+    columns = get_keyset_columns(viewset, model)
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(
+            cursor, model._meta.db_table)
+    for constraint in constraints.values():
+        if not (constraint['index'] or constraint['unique'] or
+                constraint['primary_key']):
+            continue
+        if list(constraint['columns'] or [])[:len(columns)] == columns:
+            return True
+    return False
+
+
+def check_keyset_indexes(app_configs=None, databases=None, **kwargs):
+    """
+    Warns about time-ordered viewsets whose models lack a composite index
+    on (target_field, start_from_target_field).
+
+    The database is only introspected when the checks are run against one
+    (e.g. 'manage.py check --database default').
+    """
+    errors = []
+    for path, viewset in iter_timeordered_viewsets():
+        queryset = getattr(viewset, 'queryset', None)
+        if queryset is None:
+            continue
+        model = queryset.model
+        if app_configs is not None and \
+                model._meta.app_config not in app_configs:
+            continue
+
+        if has_declared_keyset_index(viewset, model):
+            continue
+        if any(has_database_keyset_index(viewset, model, using)
+               for using in databases or []):
+            continue
+
+        fields = get_keyset_fields(viewset)
+        errors.append(checks.Warning(
+            "'{}' is paginated by {} but has no index on those "
+            "fields.".format(model._meta.label, tuple(fields)),
+            hint="Add models.Index(fields={}) to {}.Meta.indexes.".format(
+                fields, model.__name__),
+            obj=viewset,
+            id='timeordered_pagination.W001',
+        ))
+    return errors
+
+
+def check_replica_target_fields(app_configs=None, **kwargs):
+    """
+    Reports time-ordered viewsets that read from replicas but whose target
+    field isn't a DateTimeField, which replay times can't bound.
+    """
+    errors = []
+    for path, viewset in iter_timeordered_viewsets():
+        queryset = getattr(viewset, 'queryset', None)
+        if not viewset.replica_aliases or queryset is None:
+            continue
+        model = queryset.model
+        if app_configs is not None and \
+                model._meta.app_config not in app_configs:
+            continue
+
+        try:
+            field = model._meta.get_field(viewset.target_field)
+        except FieldDoesNotExist:
+            field = None
+        if isinstance(field, models.DateTimeField):
+            continue
+        errors.append(checks.Error(
+            "'{}' reads from replicas, but its target field '{}' is not a "
+            "DateTimeField.".format(viewset.__name__, viewset.target_field),
+            hint='Replica reads are bounded by replay times, so they need a '
+                 'timestamp target field.',
+            obj=viewset,
+            id='timeordered_pagination.E001',
+        ))
+    return errors
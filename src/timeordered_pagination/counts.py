@@ -0,0 +1,150 @@
+"""
+Strategies for producing the 'count' included in time-ordered pages.
+
+Each strategy returns a (count, name) pair from 'get_count', where the name
+is included in the response so that clients know how the number was
+produced.
+"""
+import json
+
+from django.db import connections
+from rest_framework import pagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class BaseCountStrategy(object):
+    name = None
+
+    def get_count(self, queryset, paginator):
+        raise NotImplementedError('get_count() must be implemented.')
+
+    def get_empty_count(self):
+        """
+        Returns the (count, name) pair for a page known to be empty.
+        """
+        return 0, self.name
+
+    def update_next_link(self, url, paginator):
+        return url
+
+    def update_previous_link(self, url, paginator):
+        """
+        Returns 'url', a link that doesn't carry on forwards from the page.
+        """
+        return url
+
+
+class NoCount(BaseCountStrategy):
+    """
+    Omits the count entirely.
+    """
+    name = 'none'
+
+    def get_count(self, queryset, paginator):
+        return None, self.name
+
+    def get_empty_count(self):
+        return None, self.name
+
+
+class ExactCount(BaseCountStrategy):
+    """
+    Counts every item remaining in the filtered queryset.
+    """
+    name = 'exact'
+
+    def get_count(self, queryset, paginator):
+        if paginator.prefetch_next_item and paginator.next_item == [] and \
+                not paginator.merged_tombstones:
+            # The remainder of the queryset was fetched along with the page
+            return len(paginator.page), self.name
+        return queryset.count(), self.name
+
+
+class CappedCount(BaseCountStrategy):
+    """
+    Counts the remaining items, but stops counting at 'threshold'.
+
+    Counts beyond the threshold are reported as a string, e.g. '1000+'.
+    """
+    name = 'capped'
+
+    def __init__(self, threshold=1000):
+        self.threshold = threshold
+
+    def get_count(self, queryset, paginator):
+        count = queryset[:(self.threshold + 1)].count()
+        if count > self.threshold:
+            return '{}+'.format(self.threshold), self.name
+        return count, self.name
+
+
+class EstimatedCount(BaseCountStrategy):
+    """
+    Uses the database planner's estimate of the number of remaining items.
+
+    This is supported on PostgreSQL and MySQL, other backends fall back to
+    'fallback' (an exact count by default).
+    """
+    name = 'estimated'
+
+    def __init__(self, fallback=None):
+        self.fallback = fallback or ExactCount()
+
+    def get_count(self, queryset, paginator):
+        connection = connections[queryset.db]
+        sql, params = queryset.order_by().query.get_compiler(
+            queryset.db).as_sql()
+        if connection.vendor == 'postgresql':
+            count = self._estimate_postgresql(connection, sql, params)
+        elif connection.vendor == 'mysql':
+            count = self._estimate_mysql(connection, sql, params)
+        else:
+            return self.fallback.get_count(queryset, paginator)
+        return count, self.name
+
+    def _estimate_postgresql(self, connection, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        if not isinstance(plan, list):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def _estimate_mysql(self, connection, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + sql, params)
+            columns = [column[0] for column in cursor.description]
+            row = dict(zip(columns, cursor.fetchone()))
+        filtered = float(row.get('filtered') or 100)
+        return int(int(row['rows'] or 0) * filtered / 100)
+
+
+class CursorCount(BaseCountStrategy):
+    """
+    Counts the items once, on the first page, and then carries the count
+    forward in the 'next' link, decrementing it by the size of each page.
+
+    The carried count does not reflect items that change during
+    pagination.
+    """
+    name = 'cursor'
+
+    def __init__(self, query_param='count'):
+        self.query_param = query_param
+
+    def get_count(self, queryset, paginator):
+        try:
+            count = pagination._positive_int(
+                paginator.request.query_params[self.query_param])
+        except (KeyError, ValueError):
+            return ExactCount().get_count(queryset, paginator)
+        return count, self.name
+
+    def update_next_link(self, url, paginator):
+        remaining = max(paginator.count - len(paginator.page), 0)
+        return replace_query_param(url, self.query_param, remaining)
+
+    def update_previous_link(self, url, paginator):
+        # The carried count only holds going forwards
+        return remove_query_param(url, self.query_param)
@@ -0,0 +1,280 @@
+"""
+Positions in a time-ordered feed, and their encoding as opaque tokens.
+
+A token is the url-safe base64 encoding of a small binary payload followed by
+a truncated HMAC of it, so that it is compact and cannot be tampered with.
+Datetimes are packed as integer microseconds since the epoch, and the values
+of several start_from target fields as a tuple. Compound tokens carry a named
+cursor for each of several feeds.
+"""
+import base64
+import struct
+import uuid
+from datetime import datetime, timedelta, timezone as datetime_timezone
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+UTC = datetime_timezone.utc
+
+VERSION = 1
+SALT = 'timeordered_pagination.cursors'
+SIGNATURE_LENGTH = 12
+
+INCLUSIVE = 0x01
+COMPOUND = 0x02
+REVERSE = 0x04
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class Cursor(object):
+    """
+    A position in a time-ordered feed.
+
+    'position' is a value of the target field and 'start_from' a value of
+    the start_from target field (or None). If 'inclusive' is set the cursor
+    includes the item at the position itself (i.e. it is a 'from' rather
+    than an 'after' cursor). If 'reverse' is set the cursor is the end of
+    a page that is read backwards, i.e. the items before the position.
+    """
+
+    def __init__(self, position, start_from=None, inclusive=True,
+                 reverse=False):
+        self.position = position
+        self.start_from = start_from
+        self.inclusive = inclusive
+        self.reverse = reverse
+
+    def __eq__(self, other):
+        return isinstance(other, Cursor) and \
+            self.__dict__ == other.__dict__
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'Cursor({!r}, {!r}, inclusive={!r}, reverse={!r})'.format(
+            self.position, self.start_from, self.inclusive, self.reverse)
+
+
+def parse_timestamp(field, value):
+    """
+    Returns the ISO 8601 or epoch timestamp 'value' as a datetime in the
+    default time zone, which is aware if USE_TZ is set. Datetimes (e.g.
+    decoded from a cursor token) are only converted.
+    """
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromtimestamp(float(value), UTC)
+        except (ValueError, OverflowError, OSError):
+            parsed = field.to_python(value)
+            if parsed is None:
+                return None
+    if settings.USE_TZ and timezone.is_naive(parsed):
+        return timezone.make_aware(parsed)
+    if not settings.USE_TZ and timezone.is_aware(parsed):
+        return timezone.make_naive(parsed)
+    return parsed
+
+
+def parse_position(field, value):
+    """
+    Returns 'value' (e.g. a query parameter) as a value of the model field
+    'field', parsing timestamps with 'parse_timestamp'.
+
+    Raises ValidationError if the value is not valid for the field.
+    """
+    try:
+        if isinstance(field, models.DateTimeField):
+            parsed = parse_timestamp(field, value)
+        else:
+            parsed = field.to_python(value)
+    except TypeError:
+        raise ValidationError('This value is not valid.')
+    if parsed is None:
+        raise ValidationError('This field may not be blank.')
+    return parsed
+
+
+def _microseconds(delta):
+    return (delta.days * 86400 + delta.seconds) * 1000000 + \
+        delta.microseconds
+
+
+def _pack_value(value):
+    if value is None:
+        return b'N'
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            delta = value - EPOCH.replace(tzinfo=UTC)
+            return b'T' + struct.pack('>q', _microseconds(delta))
+        return b'D' + struct.pack('>q', _microseconds(value - EPOCH))
+    if isinstance(value, bool):
+        raise TypeError('Cannot encode {!r} in a cursor'.format(value))
+    if isinstance(value, int) and -2 ** 63 <= value < 2 ** 63:
+        return b'I' + struct.pack('>q', value)
+    if isinstance(value, uuid.UUID):
+        return b'U' + value.bytes
+    if isinstance(value, tuple):
+        if len(value) > 255:
+            raise TypeError('Cannot encode {!r} in a cursor'.format(value))
+        return b'R' + struct.pack('>B', len(value)) + b''.join(
+            _pack_value(item) for item in value)
+    if not isinstance(value, bytes):
+        value = '{}'.format(value).encode('utf-8')
+        return b'S' + struct.pack('>H', len(value)) + value
+    raise TypeError('Cannot encode {!r} in a cursor'.format(value))
+
+
+def _unpack_value(payload, offset):
+    tag = payload[offset:offset + 1]
+    offset += 1
+    if tag == b'N':
+        return None, offset
+    if tag in (b'T', b'D', b'I'):
+        number, = struct.unpack_from('>q', payload, offset)
+        offset += 8
+        if tag == b'I':
+            return number, offset
+        value = EPOCH + timedelta(microseconds=number)
+        if tag == b'T':
+            value = value.replace(tzinfo=UTC)
+        return value, offset
+    if tag == b'U':
+        return uuid.UUID(bytes=payload[offset:offset + 16]), offset + 16
+    if tag == b'S':
+        length, = struct.unpack_from('>H', payload, offset)
+        offset += 2
+        value = payload[offset:offset + length].decode('utf-8')
+        return value, offset + length
+    if tag == b'R':
+        length, = struct.unpack_from('>B', payload, offset)
+        offset += 1
+        values = []
+        for _ in range(length):
+            value, offset = _unpack_value(payload, offset)
+            values.append(value)
+        return tuple(values), offset
+    raise InvalidCursor('Unknown value in cursor')
+
+
+def _sign(payload):
+    return salted_hmac(SALT, payload).digest()[:SIGNATURE_LENGTH]
+
+
+def _dump(payload):
+    token = base64.urlsafe_b64encode(payload + _sign(payload))
+    return token.decode('ascii').rstrip('=')
+
+
+def _load(token):
+    """
+    Returns the (version, flags, payload) of a token made by '_dump'.
+    """
+    try:
+        token = token.encode('ascii')
+        data = base64.urlsafe_b64decode(token + b'=' * (-len(token) % 4))
+    except (AttributeError, TypeError, ValueError):
+        raise InvalidCursor('Cursor is not valid base64')
+
+    payload, signature = data[:-SIGNATURE_LENGTH], data[-SIGNATURE_LENGTH:]
+    if len(payload) < 2 or not constant_time_compare(signature,
+                                                     _sign(payload)):
+        raise InvalidCursor('Cursor signature does not match')
+
+    version, flags = struct.unpack_from('>BB', payload)
+    if version != VERSION:
+        raise InvalidCursor('Unknown cursor version')
+    return version, flags, payload
+
+
+def _pack_cursor(cursor):
+    return _pack_value(cursor.position) + _pack_value(cursor.start_from)
+
+
+def _unpack_cursor(payload, offset, inclusive, reverse=False):
+    position, offset = _unpack_value(payload, offset)
+    start_from, offset = _unpack_value(payload, offset)
+    return Cursor(position, start_from, inclusive=inclusive,
+                  reverse=reverse), offset
+
+
+def encode_cursor(cursor):
+    """
+    Returns the cursor as a signed, url-safe token.
+    """
+    flags = (INCLUSIVE if cursor.inclusive else 0) | \
+        (REVERSE if cursor.reverse else 0)
+    return _dump(struct.pack('>BB', VERSION, flags) + _pack_cursor(cursor))
+
+
+def decode_cursor(token):
+    """
+    Returns the Cursor for a token made by 'encode_cursor'.
+
+    Raises InvalidCursor if the token is malformed or has been tampered
+    with.
+    """
+    version, flags, payload = _load(token)
+    if flags & COMPOUND:
+        raise InvalidCursor('Cursor is a compound cursor')
+    try:
+        cursor, offset = _unpack_cursor(payload, 2, bool(flags & INCLUSIVE),
+                                        bool(flags & REVERSE))
+    except (struct.error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor('Cursor is malformed: {}'.format(e))
+    if offset != len(payload):
+        raise InvalidCursor('Cursor is malformed')
+    return cursor
+
+
+def encode_cursors(cursors):
+    """
+    Returns a dict of names to cursors as a single signed, url-safe token.
+
+    Merged feeds are only read forwards, so 'reverse' is not encoded.
+    """
+    payload = struct.pack('>BBH', VERSION, COMPOUND, len(cursors))
+    for name in sorted(cursors):
+        cursor = cursors[name]
+        payload += _pack_value(name) + \
+            struct.pack('>B', INCLUSIVE if cursor.inclusive else 0) + \
+            _pack_cursor(cursor)
+    return _dump(payload)
+
+
+def decode_cursors(token):
+    """
+    Returns the dict of names to cursors for a token made by
+    'encode_cursors'.
+
+    Raises InvalidCursor if the token is malformed or has been tampered
+    with.
+    """
+    version, flags, payload = _load(token)
+    if not flags & COMPOUND:
+        raise InvalidCursor('Cursor is not a compound cursor')
+    cursors = {}
+    try:
+        length, = struct.unpack_from('>H', payload, 2)
+        offset = 4
+        for _ in range(length):
+            name, offset = _unpack_value(payload, offset)
+            cursor_flags, = struct.unpack_from('>B', payload, offset)
+            cursors[name], offset = _unpack_cursor(
+                payload, offset + 1, bool(cursor_flags & INCLUSIVE))
+    except (struct.error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor('Cursor is malformed: {}'.format(e))
+    if offset != len(payload):
+        raise InvalidCursor('Cursor is malformed')
+    return cursors
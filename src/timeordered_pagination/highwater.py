@@ -0,0 +1,177 @@
+"""
+High-water marks: the largest (target field, start_from target field) of a
+model, kept in a shared cache so that polls at the end of a time-ordered
+feed can be answered without querying the database.
+
+Marks are raised by post_save, and by 'bump' (e.g. from
+'HighWaterMarkQuerySet.bulk_update'), once the save's transaction commits,
+and are recomputed from the database every 'reconcile_interval' seconds.
+Raising and reconciling a mark hold a lock in the cache (taken with
+'cache.add'), so that neither can overwrite a higher mark with a lower
+one.
+
+A mark that is too high only disables the fast path, but one that is too
+low hides newer items behind empty pages. Saves that send no signals (e.g.
+queryset.update()) leave the mark too low until the next reconcile, so
+they should be followed by a 'bump' of the updated items.
+"""
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.db import models, transaction
+from django.db.models.signals import post_save
+
+from .keyset import as_tuple, get_values, values_tuple
+
+_marks = {}
+_lock = threading.Lock()
+
+
+class HighWaterMark(object):
+    # How long a crashed holder can keep the lock, and how long to wait
+    # between attempts to take it
+    lock_timeout = 10
+    lock_poll_interval = 0.005
+
+    def __init__(self, model, target_field, start_from_target_field,
+                 cache='default', reconcile_interval=60):
+        self.model = model
+        self.target_field = target_field
+        self.start_from_target_field = start_from_target_field
+        self.cache = cache
+        self.reconcile_interval = reconcile_interval
+
+    @property
+    def cache_key(self):
+        return 'timeordered_pagination:highwater:{}:{}:{}'.format(
+            self.model._meta.label_lower, self.target_field,
+            self.start_from_target_field)
+
+    def get_item_key(self, item):
+        return (getattr(item, self.target_field),) + values_tuple(
+            self.start_from_target_field,
+            get_values(item, self.start_from_target_field))
+
+    @property
+    def lock_key(self):
+        return self.cache_key + ':lock'
+
+    @contextmanager
+    def lock(self):
+        """
+        Holds the mark's lock, waiting for any other holder to release it
+        (or for its lock to expire).
+        """
+        cache = caches[self.cache]
+        token = uuid.uuid4().hex
+        while not cache.add(self.lock_key, token, self.lock_timeout):
+            time.sleep(self.lock_poll_interval)
+        try:
+            yield cache
+        finally:
+            if cache.get(self.lock_key) == token:
+                cache.delete(self.lock_key)
+
+    def is_fresh(self, value):
+        return value is not None and \
+            time.time() - value[1] <= self.reconcile_interval
+
+    def get(self):
+        """
+        Returns the mark as a (target, start_from...) tuple, or None if
+        there are no items.
+        """
+        value = caches[self.cache].get(self.cache_key)
+        if not self.is_fresh(value):
+            return self.reconcile()
+        return value[0]
+
+    def reconcile(self):
+        fields = (self.target_field,) + as_tuple(self.start_from_target_field)
+        with self.lock() as cache:
+            # Another request may have reconciled it while we waited
+            value = cache.get(self.cache_key)
+            if self.is_fresh(value):
+                return value[0]
+            # The query runs under the lock, so items committed before a
+            # waiting bump are either in the result or raise it afterwards
+            mark = self.model._default_manager.order_by(
+                *('-' + field for field in fields)).values_list(
+                    *fields).first()
+            cache.set(self.cache_key, (mark, time.time()), None)
+        return mark
+
+    def bump(self, items):
+        """
+        Raises the mark to include 'items' (if it is cached, otherwise the
+        next 'get' reconciles it anyway).
+        """
+        keys = [key for key in map(self.get_item_key, items)
+                if None not in key]
+        if not keys:
+            return
+        with self.lock() as cache:
+            value = cache.get(self.cache_key)
+            if value is None:
+                return
+            mark, reconciled_at = value
+            if mark is None or max(keys) > tuple(mark):
+                cache.set(self.cache_key, (max(keys), reconciled_at), None)
+
+
+def get_high_water_mark(model, target_field, start_from_target_field,
+                        cache='default', reconcile_interval=60):
+    """
+    Returns the HighWaterMark for the model and fields, registering it so
+    that it is raised when instances of the model are saved.
+    """
+    key = (model, target_field, start_from_target_field, cache)
+    with _lock:
+        if key not in _marks:
+            _marks[key] = HighWaterMark(model, target_field,
+                                        start_from_target_field, cache,
+                                        reconcile_interval)
+            post_save.connect(_saved, sender=model,
+                              dispatch_uid=('timeordered_pagination', model))
+        return _marks[key]
+
+
+def bump(model, items, using=None):
+    """
+    Raises the registered marks of 'model' to include 'items', once the
+    current transaction on 'using' commits (or now, outside of one).
+    """
+    items = list(items)
+
+    def bump_marks():
+        for key, mark in list(_marks.items()):
+            if key[0] is model:
+                mark.bump(items)
+    transaction.on_commit(bump_marks, using=using)
+
+
+def _saved(sender, instance, using=None, **kwargs):
+    bump(sender, [instance], using=using)
+
+
+class HighWaterMarkQuerySet(models.QuerySet):
+    """
+    A QuerySet whose bulk_create and bulk_update raise the model's marks,
+    as they do not send post_save.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super(HighWaterMarkQuerySet, self).bulk_create(
+            objs, *args, **kwargs)
+        bump(self.model, objs, using=self.db)
+        return objs
+
+    def bulk_update(self, objs, *args, **kwargs):
+        objs = list(objs)
+        rows = super(HighWaterMarkQuerySet, self).bulk_update(
+            objs, *args, **kwargs)
+        bump(self.model, objs, using=self.db)
+        return rows
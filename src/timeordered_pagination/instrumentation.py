@@ -0,0 +1,114 @@
+"""
+Per-request instrumentation of time-ordered pages.
+
+When a paginator has a 'metrics_sink', each page is split into phases, which
+are timed and have their queries counted:
+ - 'count': producing the count;
+ - 'page': fetching the page;
+ - 'serialize': serializing the page (timed by the mixin);
+ - 'next_item': finding the first item of the next page;
+ - 'link': building the 'next' link.
+
+The sink is then called with a dict of the form:
+
+    {
+        'path': '/data/',
+        'phases': {'count': {'seconds': 0.002, 'queries': 1}, ...},
+        'rows': 100,
+        'limit': 100,
+        'count_strategy': 'exact',
+        'cursor_age': 3600.0,
+    }
+
+where 'cursor_age' is how many seconds old the first item of the page is (or
+None), i.e. how deep into the feed the page is.
+"""
+import logging
+import time
+from contextlib import contextmanager
+
+timer = time.perf_counter
+
+
+class QueryCounter(object):
+    """
+    A database execute wrapper that counts the queries run through it.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class _NullContext(object):
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_CONTEXT = _NullContext()
+
+
+@contextmanager
+def measure_phase(phases, name, connection):
+    """
+    Times the block and counts the queries it runs on 'connection', adding
+    them to phases[name].
+    """
+    queries = QueryCounter()
+    started = timer()
+    with connection.execute_wrapper(queries):
+        yield
+    phase = phases.setdefault(name, {'seconds': 0.0, 'queries': 0})
+    phase['seconds'] += timer() - started
+    phase['queries'] += queries.count
+
+
+class LoggingSink(object):
+    """
+    Logs the metrics of each page, as a single line.
+    """
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger(
+            'timeordered_pagination.metrics')
+        self.level = level
+
+    def __call__(self, metrics):
+        phases = ' '.join(
+            '{}={:.1f}ms/{}q'.format(name, phase['seconds'] * 1000,
+                                     phase['queries'])
+            for name, phase in sorted(metrics['phases'].items()))
+        self.logger.log(
+            self.level, '%s rows=%s limit=%s cursor_age=%s %s',
+            metrics['path'], metrics['rows'], metrics['limit'],
+            metrics['cursor_age'], phases)
+
+
+class StatsdSink(object):
+    """
+    Sends the metrics of each page to a statsd style client, i.e. one with
+    'timing(name, milliseconds)', 'incr(name, count)' and 'gauge(name,
+    value)' methods.
+    """
+
+    def __init__(self, client, prefix='timeordered_pagination'):
+        self.client = client
+        self.prefix = prefix
+
+    def __call__(self, metrics):
+        for name, phase in metrics['phases'].items():
+            self.client.timing('{}.{}.time'.format(self.prefix, name),
+                               phase['seconds'] * 1000)
+            self.client.incr('{}.{}.queries'.format(self.prefix, name),
+                             phase['queries'])
+        self.client.gauge('{}.rows'.format(self.prefix), metrics['rows'])
+        if metrics['cursor_age'] is not None:
+            self.client.gauge('{}.cursor_age'.format(self.prefix),
+                              metrics['cursor_age'])
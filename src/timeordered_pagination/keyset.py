@@ -0,0 +1,185 @@
+"""
+Keyset predicates, i.e. "(modified, id) >= (X, Y)".
+
+Where the database supports row-value comparisons the predicate is rendered
+as one, which lets the planner turn it into a single range scan over a
+composite index on the keyset fields. Elsewhere it is expanded into the
+equivalent "modified > X OR (modified = X AND id >= Y)" form.
+"""
+import django
+from django.db import connections
+from django.db.models import F, Q, Value
+from django.db.models.lookups import Lookup
+
+OPERATORS = {
+    '>': '__gt',
+    '>=': '__gte',
+    '<': '__lt',
+    '<=': '__lte',
+}
+
+
+def supports_row_values(connection):
+    """
+    Returns True if the connection supports row-value comparisons.
+    """
+    if connection.vendor in ('postgresql', 'mysql'):
+        return True
+    if connection.vendor == 'sqlite':
+        # Row values were added in SQLite 3.15
+        return connection.Database.sqlite_version_info >= (3, 15, 0)
+    return False
+
+
+def _check_operator(operator):
+    if operator not in OPERATORS:
+        raise ValueError('Unsupported keyset operator: {}'.format(operator))
+
+
+def _strict(operator):
+    return operator[0]
+
+
+class KeysetLookup(Lookup):
+    """
+    A lexicographic comparison of several fields against several values.
+
+    This is a Lookup (rather than a plain expression) so that it can be
+    passed straight to filter() without being compared to True.
+    """
+    lookup_name = 'keyset'
+
+    def __init__(self, fields, values, operator='>='):
+        _check_operator(operator)
+        if len(fields) != len(values):
+            raise ValueError('A keyset needs one value per field.')
+        # Lookup.__init__() expects a single lhs and rhs
+        super(Lookup, self).__init__()
+        self.operator = operator
+        self.lhs = [F(field) for field in fields]
+        self.rhs = [Value(value) for value in values]
+        self.bilateral_transforms = []
+
+    @property
+    def identity(self):
+        return (self.__class__, self.operator,
+                tuple(self.lhs), tuple(self.rhs))
+
+    def get_source_expressions(self):
+        return self.lhs + self.rhs
+
+    def set_source_expressions(self, exprs):
+        self.lhs = exprs[:len(self.lhs)]
+        self.rhs = exprs[len(self.lhs):]
+
+    def resolve_expression(self, query=None, allow_joins=True, reuse=None,
+                           summarize=False, for_save=False):
+        clone = self.copy()
+        clone.is_summary = summarize
+        clone.lhs = [
+            field.resolve_expression(query, allow_joins, reuse, summarize,
+                                     for_save)
+            for field in self.lhs
+        ]
+        # Prepare the values as the fields they are compared against
+        clone.rhs = [
+            Value(value.value, output_field=field.output_field)
+            for field, value in zip(clone.lhs, self.rhs)
+        ]
+        return clone
+
+    def as_sql(self, compiler, connection):
+        lhs = [compiler.compile(expr) for expr in self.lhs]
+        rhs = [compiler.compile(expr) for expr in self.rhs]
+        if supports_row_values(connection):
+            return self._row_value_sql(lhs, rhs)
+        return self._expanded_sql(lhs, rhs)
+
+    def as_oracle(self, compiler, connection):
+        return self.as_sql(compiler, connection)
+
+    def _row_value_sql(self, lhs, rhs):
+        params = []
+        for _, sql_params in lhs + rhs:
+            params.extend(sql_params)
+        sql = '({}) {} ({})'.format(
+            ', '.join(sql for sql, _ in lhs),
+            self.operator,
+            ', '.join(sql for sql, _ in rhs))
+        return sql, params
+
+    def _expanded_sql(self, lhs, rhs):
+        terms, params = [], []
+        for i in range(len(lhs)):
+            conditions = []
+            for (lhs_sql, lhs_params), (rhs_sql, rhs_params) in zip(
+                    lhs[:i], rhs[:i]):
+                conditions.append('{} = {}'.format(lhs_sql, rhs_sql))
+                params.extend(lhs_params)
+                params.extend(rhs_params)
+            operator = self.operator if i == len(lhs) - 1 else \
+                _strict(self.operator)
+            conditions.append('{} {} {}'.format(lhs[i][0], operator,
+                                                rhs[i][0]))
+            params.extend(lhs[i][1])
+            params.extend(rhs[i][1])
+            terms.append('({})'.format(' AND '.join(conditions)))
+        return '({})'.format(' OR '.join(terms)), params
+
+
+def keyset_q(fields, values, operator='>='):
+    """
+    Returns the expanded (OR) form of the keyset predicate as a Q object.
+    """
+    _check_operator(operator)
+    query = Q()
+    for i in range(len(fields)):
+        lookup = OPERATORS[operator] if i == len(fields) - 1 else \
+            OPERATORS[_strict(operator)]
+        term = Q(**dict(zip(fields[:i], values[:i])))
+        term &= Q(**{fields[i] + lookup: values[i]})
+        query |= term
+    return query
+
+
+def filter_keyset(queryset, fields, values, operator='>=', row_values=True):
+    """
+    Filters the queryset to the rows where 'fields' compare to 'values' by
+    'operator', lexicographically.
+
+    The row-value form is used if 'row_values' is set and both Django and
+    the database support it, otherwise the expanded form is used.
+    """
+    if row_values and django.VERSION >= (4, 0) and \
+            supports_row_values(connections[queryset.db]):
+        return queryset.filter(KeysetLookup(fields, values, operator))
+    return queryset.filter(keyset_q(fields, values, operator))
+
+
+def as_tuple(fields):
+    """
+    Returns 'fields', a single field name or a sequence of them (as a
+    start_from target field may be), as a tuple.
+    """
+    if isinstance(fields, (list, tuple)):
+        return tuple(fields)
+    return (fields,)
+
+
+def values_tuple(fields, values):
+    """
+    Returns the 'values' of 'fields' (a single value for a single field
+    name, or a tuple for a sequence of them) as a tuple.
+    """
+    if isinstance(fields, (list, tuple)):
+        return tuple(values)
+    return (values,)
+
+
+def get_values(item, fields):
+    """
+    Returns the values of 'fields' on 'item', shaped like 'fields'.
+    """
+    if isinstance(fields, (list, tuple)):
+        return tuple(getattr(item, field) for field in fields)
+    return getattr(item, fields)
@@ -0,0 +1,108 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from rest_framework.settings import api_settings
+
+from timeordered_pagination.checks import iter_timeordered_viewsets
+from timeordered_pagination.cursors import Cursor
+from timeordered_pagination.keyset import get_values
+
+
+def _postgresql_scans(plan):
+    scan = plan['Node Type']
+    if 'Index Name' in plan:
+        scan += ' using ' + plan['Index Name']
+    scans = [scan]
+    for child in plan.get('Plans', []):
+        scans.extend(_postgresql_scans(child))
+    return scans
+
+
+def _mysql_scans(block):
+    scans = []
+    if isinstance(block, dict):
+        if 'access_type' in block:
+            scan = '{} on {}'.format(block['access_type'],
+                                     block.get('table_name'))
+            if block.get('key'):
+                scan += ' using ' + block['key']
+            scans.append(scan)
+        for value in block.values():
+            scans.extend(_mysql_scans(value))
+    elif isinstance(block, list):
+        for value in block:
+            scans.extend(_mysql_scans(value))
+    return scans
+
+
+def explain(queryset):
+    """
+    Returns the (scan types, estimated cost) of the queryset's plan.
+
+    The cost is None for databases that do not estimate one (e.g. SQLite).
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        plan = json.loads(queryset.explain(format='json'))[0]['Plan']
+        return _postgresql_scans(plan), plan['Total Cost']
+    if vendor == 'mysql':
+        plan = json.loads(queryset.explain(format='json'))['query_block']
+        cost = plan.get('cost_info', {}).get('query_cost')
+        return _mysql_scans(plan), cost
+    scans = []
+    for line in queryset.explain().splitlines():
+        if vendor == 'sqlite':
+            # Strip the id, parent and notused columns
+            line = line.split(' ', 3)[-1]
+        scans.append(line.strip())
+    return scans, None
+
+
+class Command(BaseCommand):
+    help = ('Explains the queries for the first page and a deep page of '
+            'every time-ordered viewset in the URL configuration.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default='default',
+            help='The database to explain the queries against.')
+        parser.add_argument(
+            '--offset', type=int, default=10000,
+            help='How many items into the feed the deep page starts.')
+        parser.add_argument(
+            '--limit', type=int, default=None,
+            help='The page size (defaults to the viewset\'s page size).')
+
+    def handle(self, *args, **options):
+        for path, viewset_class in iter_timeordered_viewsets():
+            self.stdout.write('{} ({})'.format(path, viewset_class.__name__))
+            if getattr(viewset_class, 'queryset', None) is None:
+                self.stdout.write('  skipped: the viewset has no queryset')
+                continue
+            self.explain_viewset(viewset_class(), options)
+
+    def explain_viewset(self, viewset, options):
+        fields = viewset.keyset_fields
+        queryset = viewset.queryset.all().using(options['database'])
+        limit = options['limit'] or viewset.max_limit_override or \
+            api_settings.PAGE_SIZE or 100
+
+        ordered = queryset.order_by(*fields)
+        first = ordered.first()
+        if first is None:
+            self.stdout.write('  skipped: there are no items')
+            return
+        deep = ordered[options['offset']:(options['offset'] + 1)].first() \
+            or ordered.last()
+
+        for name, item in (('first page', first), ('deep page', deep)):
+            page = viewset.filter_timeordered_queryset(
+                queryset,
+                Cursor(getattr(item, viewset.target_field),
+                       get_values(item, viewset.start_from_target_field))
+            )[:limit]
+            scans, cost = explain(page)
+            self.stdout.write('  {}: {} (estimated cost: {})'.format(
+                name, '; '.join(scans),
+                'unknown' if cost is None else cost))
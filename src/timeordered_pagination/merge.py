@@ -0,0 +1,285 @@
+"""
+A single time-ordered feed over several querysets (e.g. of different
+models), so that clients mirroring them can poll one endpoint.
+
+Items are ordered by (target field, source name, start_from target field).
+Each page fetches at most 'limit + 1' items from every source and merges them
+with a heap, and its 'next' link carries a compound cursor with a position
+for each source.
+"""
+import heapq
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from django.db import close_old_connections, models
+from rest_framework import pagination
+from django.core.exceptions import ValidationError
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework.views import APIView
+
+from .cursors import (
+    Cursor, InvalidCursor, decode_cursors, encode_cursors, parse_position)
+from .keyset import as_tuple, filter_keyset, get_values, values_tuple
+
+
+class FeedSource(object):
+    """
+    One of the querysets of a merged feed.
+
+    'name' identifies the source in the results and in cursors, and defaults
+    to the model's label (e.g. 'app.model'). 'start_from_target_field' may
+    be a tuple of fields.
+    """
+
+    def __init__(self, queryset, serializer_class, target_field='modified',
+                 start_from_target_field='id', name=None,
+                 use_row_values=True):
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+        self.target_field = target_field
+        self.start_from_target_field = start_from_target_field
+        self.name = name or queryset.model._meta.label_lower
+        self.use_row_values = use_row_values
+
+    def get_queryset(self):
+        return self.queryset.all()
+
+    def filter_queryset(self, queryset, cursor):
+        """
+        Filters and orders the queryset for items at or after 'cursor'.
+        """
+        if cursor is None:
+            pass
+        elif cursor.start_from is None:
+            lookup = '__gte' if cursor.inclusive else '__gt'
+            queryset = queryset.filter(**{
+                self.target_field + lookup: cursor.position
+            })
+        else:
+            queryset = filter_keyset(
+                queryset, self.keyset_fields,
+                (cursor.position,) + values_tuple(
+                    self.start_from_target_field, cursor.start_from),
+                '>=' if cursor.inclusive else '>',
+                row_values=self.use_row_values)
+        return queryset.order_by(*self.keyset_fields)
+
+    @property
+    def keyset_fields(self):
+        return (self.target_field,) + as_tuple(self.start_from_target_field)
+
+    def parse_position(self, param, value, field_name=None):
+        """
+        Returns the 'value' of the query parameter 'param' as a value of the
+        target field (or of 'field_name').
+
+        Raises ParseError if the value is not valid for the field.
+        """
+        field = self.queryset.model._meta.get_field(
+            field_name or self.target_field)
+        try:
+            return parse_position(field, value)
+        except ValidationError as e:
+            raise ParseError({param: e.messages})
+
+    def clean_cursor(self, param, cursor):
+        """
+        Returns 'cursor', decoded from the token in the query parameter
+        'param', with its position and start_from parsed as values of their
+        fields.
+
+        A signed token can still carry values of the wrong type (e.g. one
+        issued by another feed), which raise ParseError.
+        """
+        field = self.queryset.model._meta.get_field(self.target_field)
+        if isinstance(field, models.DateTimeField) and \
+                not isinstance(cursor.position, datetime):
+            raise ParseError({param: ['Cursor position is not a timestamp.']})
+        position = self.parse_position(param, cursor.position)
+        start_from = cursor.start_from
+        if start_from is not None:
+            fields = as_tuple(self.start_from_target_field)
+            values = start_from if len(fields) > 1 else (start_from,)
+            if not isinstance(values, tuple) or len(values) != len(fields):
+                raise ParseError({param: [
+                    'Cursor has the wrong number of start_from values.']})
+            values = tuple(self.parse_position(param, value, field)
+                           for field, value in zip(fields, values))
+            start_from = values if len(fields) > 1 else values[0]
+        return Cursor(position, start_from, inclusive=cursor.inclusive)
+
+    def get_items(self, cursor, limit):
+        return list(self.filter_queryset(self.get_queryset(), cursor)[:limit])
+
+    def get_sort_key(self, item):
+        return (getattr(item, self.target_field), self.name,
+                get_values(item, self.start_from_target_field))
+
+    def get_item_cursor(self, item):
+        """
+        Returns the cursor just after 'item'.
+        """
+        return Cursor(getattr(item, self.target_field),
+                      get_values(item, self.start_from_target_field),
+                      inclusive=False)
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Returns the process's ThreadPoolExecutor for querying sources in
+    parallel.
+
+    Its threads, and the database connections each of them opens, are
+    reused from page to page.
+    """
+    global _executor, _executor_pid
+    with _executor_lock:
+        # The threads of an executor made before a fork don't exist in the
+        # child process
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                thread_name_prefix='timeordered-sources')
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _get_items_in_thread(source, cursor, limit):
+    # Worker threads never see the request_started and request_finished
+    # signals, so they close their expired (CONN_MAX_AGE) or broken
+    # connections themselves, as Django does around each request
+    close_old_connections()
+    try:
+        return source.get_items(cursor, limit)
+    finally:
+        close_old_connections()
+
+
+def merge_sources(sources, cursors, limit, executor=None):
+    """
+    Returns the first 'limit' items of the merged sources as (source, item)
+    pairs, and whether there are more.
+
+    If an 'executor' (e.g. from 'get_executor()') is given the sources are
+    queried in parallel, each on its worker thread's connection.
+    """
+    if executor is None:
+        fetched = [source.get_items(cursors.get(source.name), limit + 1)
+                   for source in sources]
+    else:
+        futures = [executor.submit(_get_items_in_thread, source,
+                                   cursors.get(source.name), limit + 1)
+                   for source in sources]
+        fetched = [future.result() for future in futures]
+
+    streams = []
+    for source, items in zip(sources, fetched):
+        streams.append([(source.get_sort_key(item), source, item)
+                        for item in items])
+    merged = []
+    for key, source, item in heapq.merge(*streams):
+        if len(merged) == limit:
+            return merged, True
+        merged.append((source, item))
+    return merged, False
+
+
+class MergedTimeOrderedFeedView(APIView):
+    """
+    Lists the items of several FeedSources in a single time-ordered feed.
+
+    The feed starts at 'from' (or just after 'after'), parsed as a value of
+    every source's target field (an invalid one gets a 400), or at the
+    beginning. Each result is of the form
+    {"type": <source name>, "data": <serialized item>}.
+
+    The 'next' link is always included, as it carries the position of
+    every source: an empty page means the client has caught up, and should
+    poll the 'next' link again later.
+    """
+    sources = ()
+    from_query_param = 'from'
+    after_query_param = 'after'
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    default_limit = api_settings.PAGE_SIZE
+    max_limit = None
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_sources(self):
+        return self.sources
+
+    def get_cursors(self, sources):
+        """
+        Returns a dict of source names to the Cursor each starts from.
+        """
+        query_params = self.request.query_params
+        token = query_params.get(self.cursor_query_param, None)
+        if token is not None:
+            try:
+                cursors = decode_cursors(token)
+            except InvalidCursor:
+                raise NotFound(self.invalid_cursor_message)
+            return dict(
+                (source.name, source.clean_cursor(
+                    self.cursor_query_param, cursors[source.name]))
+                for source in sources if source.name in cursors)
+
+        for param, inclusive in ((self.after_query_param, False),
+                                 (self.from_query_param, True)):
+            position = query_params.get(param, None)
+            if position is not None:
+                # Each source parses it, as their target fields may differ
+                return dict((source.name, Cursor(
+                    source.parse_position(param, position),
+                    inclusive=inclusive)) for source in sources)
+        return {}
+
+    def get_limit(self, request):
+        try:
+            return pagination._positive_int(
+                request.query_params[self.limit_query_param],
+                strict=True,
+                cutoff=self.max_limit
+            )
+        except (KeyError, ValueError):
+            return self.default_limit
+
+    def get(self, request, *args, **kwargs):
+        sources = self.get_sources()
+        cursors = self.get_cursors(sources)
+        merged, _ = merge_sources(sources, cursors, self.get_limit(request))
+
+        # Serialize each source's items together, then restore the order
+        items = {}
+        for source, item in merged:
+            items.setdefault(source, []).append(item)
+            cursors[source.name] = source.get_item_cursor(item)
+        data = {}
+        for source, source_items in items.items():
+            data[source] = iter(source.serializer_class(
+                source_items, many=True,
+                context={'request': request, 'view': self}).data)
+        results = [{'type': source.name, 'data': next(data[source])}
+                   for source, _ in merged]
+
+        return Response({
+            'next': self.get_link(cursors),
+            'results': results,
+        })
+
+    def get_link(self, cursors):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.from_query_param)
+        url = remove_query_param(url, self.after_query_param)
+        return replace_query_param(url, self.cursor_query_param,
+                                   encode_cursors(cursors))
@@ -0,0 +1,279 @@
+"""
+Change notifiers, used to hold empty time-ordered pages open until the
+feed changes (i.e. long polling).
+
+A notifier's 'listen(model)' returns a listener whose 'wait(timeout)'
+blocks until the model may have changed since the listener was created (or
+since the last 'wait'), returning False if the timeout expired first. Its
+'await_change(timeout)' does the same for async views, without holding a
+thread while it waits. Listeners are created before the page is queried,
+so that changes made while the page is being fetched are not missed.
+"""
+import asyncio
+import select
+import socket
+import threading
+import time
+
+from django.db import connections, transaction
+from django.db.models.signals import post_save
+
+monotonic = time.monotonic
+
+
+class BaseChangeNotifier(object):
+
+    def listen(self, model):
+        raise NotImplementedError('listen() must be implemented.')
+
+
+class _VersionedChangeNotifier(BaseChangeNotifier):
+    """
+    Counts the changes to each model, and wakes the listeners waiting for
+    them with a condition.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._versions = {}
+        # (event loop, asyncio.Event) of each waiting coroutine
+        self._async_waiters = set()
+
+    def _get_listener(self, model):
+        with self._condition:
+            return _VersionListener(self, model, self._versions.get(model, 0))
+
+    def _changed(self, model):
+        with self._condition:
+            self._versions[model] = self._versions.get(model, 0) + 1
+            self._condition.notify_all()
+            for loop, event in self._async_waiters:
+                loop.call_soon_threadsafe(event.set)
+
+    def wait(self, model, version, timeout):
+        """
+        Waits until the model's version differs from 'version', returning
+        the new version or None if the timeout expired first.
+        """
+        deadline = monotonic() + timeout
+        with self._condition:
+            while self._versions.get(model, 0) == version:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            return self._versions[model]
+
+    async def await_version(self, model, version, timeout):
+        """
+        The same as 'wait', for coroutines.
+        """
+        deadline = monotonic() + timeout
+        waiter = (asyncio.get_event_loop(), asyncio.Event())
+        with self._condition:
+            self._async_waiters.add(waiter)
+        try:
+            while True:
+                with self._condition:
+                    current = self._versions.get(model, 0)
+                    # Changes to any model set the event
+                    waiter[1].clear()
+                if current != version:
+                    return current
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    return None
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._condition:
+                self._async_waiters.discard(waiter)
+
+
+class _VersionListener(object):
+
+    def __init__(self, notifier, model, version):
+        self.notifier = notifier
+        self.model = model
+        self.version = version
+
+    def wait(self, timeout):
+        version = self.notifier.wait(self.model, self.version, timeout)
+        return self._waited(version)
+
+    async def await_change(self, timeout):
+        version = await self.notifier.await_version(
+            self.model, self.version, timeout)
+        return self._waited(version)
+
+    def _waited(self, version):
+        if version is None:
+            return False
+        self.version = version
+        return True
+
+    def close(self):
+        pass
+
+
+class SignalChangeNotifier(_VersionedChangeNotifier):
+    """
+    Notifies waiting requests in the same process when an instance of the
+    model is saved (once the transaction saving it commits).
+
+    Changes made by other processes, or with queryset.update(), are not
+    seen, so waiting requests can only be woken by the process they run in.
+    Use 'notify(model)' to report such changes by hand.
+    """
+
+    def listen(self, model):
+        post_save.connect(self._saved, sender=model, weak=False,
+                          dispatch_uid=(id(self), model))
+        return self._get_listener(model)
+
+    def _saved(self, sender, **kwargs):
+        transaction.on_commit(lambda: self.notify(sender))
+
+    def notify(self, model):
+        self._changed(model)
+
+
+class PostgresChangeNotifier(_VersionedChangeNotifier):
+    """
+    Uses PostgreSQL's LISTEN/NOTIFY, so that requests are woken by changes
+    made in any process.
+
+    Each process holds a single listening connection, read by a background
+    thread that wakes the waiting requests, so waiting doesn't take a
+    connection per request. Notifications are sent on the model's channel
+    ('timeordered_<db table>' by default) from post_save if
+    'notify_on_save' is set, and PostgreSQL only delivers them once the
+    saving transaction commits. They can also be sent by a trigger, with
+    "pg_notify('<channel>', '')".
+    """
+    channel_template = 'timeordered_{table}'
+
+    def __init__(self, using='default', notify_on_save=True):
+        super(PostgresChangeNotifier, self).__init__()
+        self.using = using
+        self.notify_on_save = notify_on_save
+        self._thread = None
+        self._channels = {}
+        self._pending = {}
+        self._error = None
+
+    def get_channel(self, model):
+        return self.channel_template.format(table=model._meta.db_table)
+
+    def get_listen_connection(self):
+        """
+        Returns a new autocommit connection for the listening thread.
+        """
+        wrapper = connections[self.using]
+        connection = wrapper.get_new_connection(
+            wrapper.get_connection_params())
+        connection.autocommit = True
+        return connection
+
+    def listen(self, model):
+        if self.notify_on_save:
+            post_save.connect(self._saved, sender=model, weak=False,
+                              dispatch_uid=(id(self), model))
+        channel = self.get_channel(model)
+        with self._condition:
+            if self._thread is None or not self._thread.is_alive():
+                # Not started yet, failed or (after a fork) in another process
+                self._start()
+            if channel not in self._channels:
+                # Wait for the LISTEN, so that no change made after the
+                # listener is returned can be missed
+                self._pending[channel] = model
+                self._wake()
+                while channel not in self._channels:
+                    if self._error is not None:
+                        raise self._error
+                    self._condition.wait()
+            return self._get_listener(model)
+
+    def _start(self):
+        self._channels, self._error = {}, None
+        self._wakeup, self._wakeup_writer = socket.socketpair()
+        self._thread = threading.Thread(
+            target=self._run, name='timeordered-listener')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _wake(self):
+        self._wakeup_writer.send(b'\0')
+
+    def _run(self):
+        connection = None
+        try:
+            connection = self.get_listen_connection()
+            if not hasattr(connection, 'poll'):
+                # psycopg 3 hands notifications that arrive during a LISTEN
+                # to its handlers
+                connection.add_notify_handler(
+                    lambda notify: self._dispatch([notify]))
+            while True:
+                self._subscribe(connection)
+                self._receive(connection)
+        except Exception as e:
+            with self._condition:
+                self._error = e
+                self._condition.notify_all()
+        finally:
+            if connection is not None:
+                connection.close()
+
+    def _subscribe(self, connection):
+        with self._condition:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        quote_name = connections[self.using].ops.quote_name
+        with connection.cursor() as cursor:
+            for channel in pending:
+                cursor.execute('LISTEN {}'.format(quote_name(channel)))
+        with self._condition:
+            self._channels.update(pending)
+            self._condition.notify_all()
+
+    def _receive(self, connection):
+        """
+        Waits until the connection has notifications, or until a listen()
+        wakes the thread, and passes them on to the waiting listeners.
+        """
+        psycopg2 = hasattr(connection, 'poll')
+        # Notifications that arrived during a LISTEN are already read
+        if not (psycopg2 and connection.notifies):
+            readable, _, _ = select.select(
+                [connection, self._wakeup], [], [])
+            if self._wakeup in readable:
+                self._wakeup.recv(4096)
+            if connection not in readable:
+                return
+            if psycopg2:
+                connection.poll()
+        if psycopg2:
+            notifies = list(connection.notifies)
+            del connection.notifies[:]
+        else:
+            notifies = connection.notifies(timeout=0)
+        self._dispatch(notifies)
+
+    def _dispatch(self, notifies):
+        for notify in notifies:
+            model = self._channels.get(notify.channel)
+            if model is not None:
+                self._changed(model)
+
+    def _saved(self, sender, using=None, **kwargs):
+        self.notify(sender)
+
+    def notify(self, model):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)',
+                           [self.get_channel(model), ''])
@@ -1,13 +1,42 @@
+import hashlib
+import heapq
+from datetime import datetime, timedelta
+from itertools import islice
+
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
 from rest_framework import pagination
 from rest_framework.response import Response
 from rest_framework.utils.urls import replace_query_param, remove_query_param
 from rest_framework.settings import api_settings
 
+from .counts import ExactCount
+from .cursors import Cursor, encode_cursor
+from .instrumentation import NULL_CONTEXT, measure_phase
+from .keyset import as_tuple, get_values, values_tuple
+
 
 class TimeOrderedPagination(pagination.BasePagination):
     max_limit = None
     default_limit = api_settings.PAGE_SIZE
     limit_query_param = 'limit'
+    prefetch_next_item = False
+    late_row_lookup = False
+    count_strategy = ExactCount()
+    cursor_query_param = None
+    before_query_param = None
+    until_query_param = None
+    cursor = None
+    merged_tombstones = False
+    settle_window = None
+    settled_max_age = 3600
+    cache_public = False
+    page_cache = None
+    cache_key = None
+    metrics_sink = None
+    metrics = None
 
     def __init__(self,
                  target_field,
@@ -16,7 +45,17 @@ class TimeOrderedPagination(pagination.BasePagination):
                  start_from_target_field,
                  start_from_id_query_param,
                  limit_query_param_override=None,
-                 max_limit_override=None):
+                 max_limit_override=None,
+                 prefetch_next_item_override=None,
+                 count_strategy_override=None,
+                 cursor_query_param_override=None,
+                 settle_window_override=None,
+                 page_cache_override=None,
+                 metrics_sink_override=None,
+                 before_query_param_override=None,
+                 late_row_lookup_override=None,
+                 until_query_param_override=None,
+                 cache_public_override=None):
         self.target_field = target_field
         self.after_query_param = after_query_param
         self.from_query_param = from_query_param
@@ -26,37 +65,426 @@ class TimeOrderedPagination(pagination.BasePagination):
             self.limit_query_param = limit_query_param_override
         if max_limit_override:
             self.max_limit = max_limit_override
+        if prefetch_next_item_override is not None:
+            self.prefetch_next_item = prefetch_next_item_override
+        if count_strategy_override:
+            self.count_strategy = count_strategy_override
+        if cursor_query_param_override:
+            self.cursor_query_param = cursor_query_param_override
+        if settle_window_override is not None:
+            self.settle_window = settle_window_override
+        if page_cache_override:
+            self.page_cache = page_cache_override
+        if metrics_sink_override is not None:
+            self.metrics_sink = metrics_sink_override
+        if before_query_param_override:
+            self.before_query_param = before_query_param_override
+        if late_row_lookup_override is not None:
+            self.late_row_lookup = late_row_lookup_override
+        if until_query_param_override:
+            self.until_query_param = until_query_param_override
+        if cache_public_override is not None:
+            self.cache_public = cache_public_override
 
-    def get_next_link(self):
+    def get_next_item(self):
+        """
+        Returns the first item of the next page, or None if there isn't one.
+
+        When 'prefetch_next_item' is set the item was fetched along with the
+        page, otherwise it is looked up with its own queries.
+        """
+        if isinstance(self.next_item, list):
+            return self.next_item[0] if self.next_item else None
         if not self.next_item.exists():
             return None
+        return self.next_item.get()
+
+    def get_item_key(self, item):
+        """
+        Returns the (target field, start_from target field) of 'item', which
+        may be a Tombstone. The start_from value is a tuple if there are
+        several start_from target fields.
+        """
+        if getattr(item, 'is_tombstone', False):
+            return item.deleted, item.object_id
+        return (getattr(item, self.target_field),
+                get_values(item, self.start_from_target_field))
+
+    def get_item_cursor(self, item):
+        """
+        Returns the cursor for a page starting from 'item'.
+        """
+        return Cursor(*self.get_item_key(item))
+
+    def get_cursor(self, request):
+        """
+        Returns the Cursor that the view parsed for 'request', or None.
+        """
+        cursor = getattr(request, 'timeordered_cursor', None)
+        return cursor if isinstance(cursor, Cursor) else None
+
+    def get_until(self, request):
+        """
+        Returns the upper bound of the target field that the view set for
+        'request', or None.
+        """
+        # Not getattr(), which a mock request would answer with a mock
+        return request.__dict__.get('timeordered_until', None)
+
+    def is_reverse(self):
+        """
+        Returns whether the page is read backwards from a 'before' cursor.
+        """
+        return self.cursor is not None and self.cursor.reverse
+
+    def get_link(self, cursor):
+        """
+        Returns the url of the current request, moved to 'cursor'.
+
+        The cursor is encoded as a token if 'cursor_query_param' is set, and
+        as separate query parameters otherwise.
+        """
         url = self.request.build_absolute_uri()
-        next_item = self.next_item.get()
-        after_value = getattr(next_item, self.target_field).isoformat()
+        until = self.get_until(self.request)
+        if until is not None and self.until_query_param:
+            # Keep the whole drain within the same snapshot
+            if hasattr(until, 'isoformat'):
+                until = until.isoformat()
+            url = replace_query_param(url, self.until_query_param, until)
+        if self.cursor_query_param:
+            for param in (self.after_query_param, self.from_query_param,
+                          self.before_query_param) + \
+                    as_tuple(self.start_from_id_query_param):
+                if param:
+                    url = remove_query_param(url, param)
+            return replace_query_param(url, self.cursor_query_param,
+                                       encode_cursor(cursor))
+
+        position = cursor.position
+        if hasattr(position, 'isoformat'):
+            position = position.isoformat()
+        if cursor.reverse:
+            # 'before' is exclusive, which is all that previous links need
+            url = remove_query_param(url, self.after_query_param)
+            url = remove_query_param(url, self.from_query_param)
+            url = replace_query_param(url, self.before_query_param, position)
+            return self.replace_start_from(url, cursor.start_from)
+
+        if self.before_query_param:
+            url = remove_query_param(url, self.before_query_param)
+        # The query parameters can't express 'after (X, Y)', so those
+        # cursors fall back to 'from (X, Y)', which repeats the item at Y
+        if not cursor.inclusive and cursor.start_from is None:
+            url = remove_query_param(url, self.from_query_param)
+            url = self.replace_start_from(url, None)
+            return replace_query_param(url, self.after_query_param, position)
 
         url = remove_query_param(url, self.after_query_param)
-        url = replace_query_param(url, self.from_query_param, after_value)
-        url = replace_query_param(url, self.start_from_id_query_param,
-                                  getattr(next_item,
-                                          self.start_from_target_field))
+        url = replace_query_param(url, self.from_query_param, position)
+        return self.replace_start_from(url, cursor.start_from)
+
+    def replace_start_from(self, url, start_from):
+        """
+        Returns 'url' with the start_from query parameter(s) set to
+        'start_from', or removed if it is None.
+        """
+        params = as_tuple(self.start_from_id_query_param)
+        if start_from is None:
+            for param in params:
+                url = remove_query_param(url, param)
+            return url
+        values = values_tuple(self.start_from_id_query_param, start_from)
+        for param, value in zip(params, values):
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            url = replace_query_param(url, param, value)
         return url
 
+    def get_next_link(self):
+        if self.is_reverse():
+            # The page ends where the cursor is, so the next page starts
+            # there
+            cursor = self.cursor
+            with self.measure('link'):
+                url = self.get_link(Cursor(cursor.position, cursor.start_from,
+                                           inclusive=not cursor.inclusive))
+                return self.count_strategy.update_previous_link(url, self)
+        with self.measure('next_item'):
+            next_item = self.get_next_item()
+        if next_item is None:
+            return None
+        with self.measure('link'):
+            url = self.get_link(self.get_item_cursor(next_item))
+            return self.count_strategy.update_next_link(url, self)
+
+    def get_previous_link(self):
+        """
+        Returns the link to the page just before the first item, or None.
+
+        Previous pages are read backwards over the same index, so going back
+        costs the same as going forward. Whether there are items before a
+        forward page isn't checked, to save a query, so the previous page
+        may turn out to be empty.
+        """
+        if not (self.cursor_query_param or self.before_query_param):
+            return None
+        page = list(self.page)
+        if not page or (self.is_reverse() and not self.previous_item):
+            return None
+        with self.measure('link'):
+            url = self.get_link(Cursor(*self.get_item_key(page[0]),
+                                       inclusive=False, reverse=True))
+            return self.count_strategy.update_previous_link(url, self)
+
     def get_paginated_response(self, data):
-        return Response({
+        response = Response({
             'next': self.get_next_link(),
-            'previous': None,  # TODO - Should I include this?
+            'previous': self.get_previous_link(),
             'count': self.count,
+            'count_strategy': self.count_strategy_name,
             'results': data,
         })
+        if self.settle_window is not None:
+            self.add_cache_headers(response)
+        if self.metrics is not None:
+            self.metrics_sink(self.get_metrics())
+        return response
+
+    def start_metrics(self, queryset=None):
+        """
+        Starts collecting the metrics of a page, if there is a metrics sink.
+        """
+        self.metrics = None
+        if self.metrics_sink is not None:
+            self.metrics = {'phases': {}}
+            self.metrics_connection = connections[
+                DEFAULT_DB_ALIAS if queryset is None else queryset.db]
+
+    def measure(self, phase):
+        """
+        Returns a context manager that adds the time and queries of its block
+        to 'phase' (or does nothing, if metrics are not being collected).
+        """
+        if self.metrics is None:
+            return NULL_CONTEXT
+        return measure_phase(self.metrics['phases'], phase,
+                             self.metrics_connection)
+
+    def get_metrics(self):
+        page = list(self.page)
+        cursor_age = None
+        if page:
+            position = self.get_item_key(page[0])[0]
+            if isinstance(position, datetime):
+                now = timezone.now()
+                if timezone.is_aware(position) != timezone.is_aware(now):
+                    now = datetime.now()
+                cursor_age = (now - position).total_seconds()
+        self.metrics.update({
+            'path': self.request.path,
+            'rows': len(page),
+            'limit': self.limit,
+            'count_strategy': self.count_strategy_name,
+            'cursor_age': cursor_age,
+        })
+        return self.metrics
+
+    def is_settled(self, response):
+        """
+        Returns whether the page's contents can no longer change.
+
+        A full page whose last item is older than 'settle_window' seconds is
+        settled, as new and updated items are only added at the end of the
+        feed. (The count is not settled, so cached pages carry the count from
+        when they were cached.)
+        """
+        page = list(self.page)
+        if len(page) < self.limit or response.data['next'] is None or \
+                self.is_reverse():
+            # Items can still be added just before a 'before' cursor
+            return False
+        position = self.get_item_key(page[-1])[0]
+        if not isinstance(position, datetime):
+            return False
+        return position < timezone.now() - timedelta(
+            seconds=self.settle_window)
+
+    def get_etag(self, response):
+        keys = [self.get_item_key(item) for item in self.page]
+        key = repr((keys, response.data['next'], response.data['count']))
+        return 'W/"{}"'.format(hashlib.md5(key.encode('utf-8')).hexdigest())
+
+    def get_cache_control(self):
+        """
+        Returns the Cache-Control header of settled pages, which are private
+        (as the queryset may depend on the user) unless 'cache_public' is set.
+        """
+        return '{}, max-age={}'.format(
+            'public' if self.cache_public else 'private', self.settled_max_age)
+
+    def add_cache_headers(self, response):
+        etag = self.get_etag(response)
+        response['ETag'] = etag
+        if not self.cache_public:
+            patch_vary_headers(response, ('Authorization', 'Cookie'))
+        if not self.is_settled(response):
+            response['Cache-Control'] = 'no-cache'
+            return
+        response['Cache-Control'] = self.get_cache_control()
+        if self.page_cache and self.cache_key:
+            caches[self.page_cache].set(
+                self.cache_key, (response.data, etag), self.settled_max_age)
+
+    def get_cache_key(self, request, cursor, key_parts=()):
+        """
+        Returns the page cache key for the page at 'cursor', which is
+        independent of how the cursor and the query parameters were written.
+
+        'key_parts' are added to the key, to tell apart the pages that the
+        view returns to different users.
+        """
+        cursor_params = (self.after_query_param, self.from_query_param,
+                         self.before_query_param, self.until_query_param,
+                         self.cursor_query_param, self.limit_query_param) + \
+            as_tuple(self.start_from_id_query_param)
+        params = sorted((param, value)
+                        for param, values in request.query_params.lists()
+                        if param not in cursor_params
+                        for value in values)
+        key = repr((request.build_absolute_uri(request.path),
+                    cursor.position, cursor.start_from, cursor.inclusive,
+                    cursor.reverse, self.get_until(request),
+                    self.get_limit(request), params, tuple(key_parts)))
+        return 'timeordered_pagination:{}'.format(
+            hashlib.md5(key.encode('utf-8')).hexdigest())
+
+    def get_cached_response(self, request, cursor, key_parts=()):
+        """
+        Returns the cached response for the page at 'cursor', or None.
+
+        On a miss the key is kept, so that the page is cached by
+        'get_paginated_response' if it turns out to be settled.
+        """
+        self.request = request
+        self.cache_key = self.get_cache_key(request, cursor, key_parts)
+        cached = caches[self.page_cache].get(self.cache_key)
+        if cached is None:
+            return None
+        data, etag = cached
+        response = Response(data, headers={
+            'ETag': etag,
+            'Cache-Control': self.get_cache_control(),
+        })
+        if not self.cache_public:
+            patch_vary_headers(response, ('Authorization', 'Cookie'))
+        return response
 
     def paginate_queryset(self, queryset, request, view=None):
-        self.limit = self.get_limit(request)
-        self.count = queryset.count()
-        self.page = queryset[:self.limit]
-        self.next_item = queryset[self.limit:(self.limit + 1)]
         self.request = request
+        self.limit = self.get_limit(request)
+        self.cursor = self.get_cursor(request)
+        self.start_metrics(queryset)
+        tombstones = None
+        if getattr(view, 'tombstone_model', None) is not None:
+            tombstones = view.get_tombstone_queryset()
+        self.merged_tombstones = tombstones is not None
+        if tombstones is not None:
+            with self.measure('page'):
+                rows = self.merge_tombstones(queryset, tombstones)
+            self.set_page(rows)
+        elif self.late_row_lookup and not queryset.query.values_select:
+            with self.measure('page'):
+                page, after = self.fetch_late_rows(queryset)
+            self.set_page(page + after, len(page))
+        elif self.prefetch_next_item or self.is_reverse():
+            # Fetch one extra row so that the 'next' link can be built
+            # without going back to the database
+            with self.measure('page'):
+                rows = list(queryset[:(self.limit + 1)])
+            self.set_page(rows)
+        else:
+            self.page = queryset[:self.limit]
+            self.next_item = queryset[self.limit:(self.limit + 1)]
+            if self.metrics is not None:
+                # Fetch the page now, rather than while it is serialized
+                with self.measure('page'):
+                    self.page = list(self.page)
+        with self.measure('count'):
+            self.count, self.count_strategy_name = \
+                self.count_strategy.get_count(queryset, self)
         return self.page
 
+    def set_page(self, rows, page_size=None):
+        """
+        Splits the rows into the page (the first 'page_size' rows, 'limit'
+        by default) and the item after it (or before it, for reverse pages,
+        which are read backwards and put back in order).
+        """
+        if page_size is None:
+            page_size = self.limit
+        if self.is_reverse():
+            self.page = rows[:page_size][::-1]
+            self.previous_item = rows[page_size:]
+            self.next_item = None
+        else:
+            self.page = rows[:page_size]
+            self.next_item = rows[page_size:]
+
+    def fetch_late_rows(self, queryset):
+        """
+        Returns the page's rows and a list of the row after it, fetching
+        only the keys of the first 'limit + 1' rows and then the page's rows
+        by primary key.
+
+        The keys can come from an index-only scan, and the (perhaps wide or
+        joined) rows are only read for the page. The row after the page is
+        left as its keys, a named tuple, as its link only needs those.
+        """
+        pk_name = queryset.model._meta.pk.name
+        fields = (self.target_field,) + as_tuple(self.start_from_target_field)
+        if pk_name not in fields:
+            fields += (pk_name,)
+        keys = list(queryset.values_list(*fields, named=True)[
+            :(self.limit + 1)])
+        pks = [getattr(key, pk_name) for key in keys[:self.limit]]
+        rows = dict((row.pk, row)
+                    for row in queryset.order_by().filter(pk__in=pks))
+        # Rows deleted in between are left out
+        return [rows[pk] for pk in pks if pk in rows], keys[self.limit:]
+
+    def merge_tombstones(self, queryset, tombstones):
+        """
+        Returns the first 'limit + 1' live items and tombstones, in order.
+
+        'tombstones' must be filtered and ordered like the queryset.
+        """
+        streams = []
+        for kind, items in enumerate((queryset, tombstones)):
+            streams.append([
+                (self.get_item_key(item) + (kind, index), item)
+                for index, item in enumerate(items[:(self.limit + 1)])
+            ])
+        if self.is_reverse():
+            rows = sorted(streams[0] + streams[1], reverse=True)
+        else:
+            rows = heapq.merge(*streams)
+        return [item for _, item in islice(rows, self.limit + 1)]
+
+    def get_empty_response(self, request):
+        """
+        Returns the response for a page that is known to be empty, without
+        querying the database.
+        """
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.cursor = None
+        self.start_metrics()
+        self.page = []
+        self.next_item = []
+        self.count, self.count_strategy_name = \
+            self.count_strategy.get_empty_count()
+        return self.get_paginated_response([])
+
     def get_limit(self, request):
         if self.limit_query_param:
             try:
@@ -0,0 +1,76 @@
+"""
+Replication lag detectors, used to read time-ordered pages from replicas.
+
+A detector's 'get_replayed_until(alias)' returns the commit time of the last
+transaction the replica 'alias' has replayed, or None if that isn't known
+(in which case the page is read from the primary). Pages read from a replica
+are bounded by that time, so that a 'next' link never moves past rows that
+have committed on the primary but not yet reached the replica.
+"""
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .notifiers import monotonic
+
+
+def _localize(value):
+    if value is None:
+        return None
+    if settings.USE_TZ and timezone.is_naive(value):
+        return timezone.make_aware(value)
+    if not settings.USE_TZ and timezone.is_aware(value):
+        return timezone.make_naive(value)
+    return value
+
+
+class BaseLagDetector(object):
+
+    def get_replayed_until(self, alias):
+        raise NotImplementedError('get_replayed_until() must be implemented.')
+
+
+class FixedLagDetector(BaseLagDetector):
+    """
+    Assumes that every replica is 'lag' seconds behind the primary, e.g. for
+    local development, tests or a replication setup that guarantees it.
+    """
+
+    def __init__(self, lag):
+        self.lag = lag
+
+    def get_replayed_until(self, alias):
+        return timezone.now() - timedelta(seconds=self.lag)
+
+
+class PostgresLagDetector(BaseLagDetector):
+    """
+    Asks a PostgreSQL standby for 'pg_last_xact_replay_timestamp()'.
+
+    The answer is kept for 'max_age' seconds per replica, as an older replay
+    time only makes the bound more conservative. A server that is not in
+    recovery (or hasn't replayed anything yet) answers None.
+    """
+    query = 'SELECT pg_last_xact_replay_timestamp()'
+
+    def __init__(self, max_age=1):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._replayed = {}
+
+    def get_replayed_until(self, alias):
+        now = monotonic()
+        with self._lock:
+            checked, replayed = self._replayed.get(alias, (None, None))
+        if checked is not None and now - checked < self.max_age:
+            return replayed
+
+        with connections[alias].cursor() as cursor:
+            cursor.execute(self.query)
+            replayed = _localize(cursor.fetchone()[0])
+        with self._lock:
+            self._replayed[alias] = (now, replayed)
+        return replayed
@@ -0,0 +1,47 @@
+"""
+Tombstones record deletions, so that they can be included in time-ordered
+feeds and clients syncing incrementally see them.
+
+    class ArticleTombstone(Tombstone):
+        class Meta:
+            indexes = [models.Index(fields=['deleted', 'object_id'],
+                                    name='article_tombstone_keyset')]
+
+    track_deletions(Article, ArticleTombstone)
+
+Tombstones are then interleaved with the live items of viewsets whose
+'tombstone_model' is set.
+"""
+from django.db import models
+from django.db.models.signals import post_delete
+from django.utils import timezone
+
+
+class Tombstone(models.Model):
+    """
+    The deletion of the object with the primary key 'object_id', at
+    'deleted'.
+
+    'object_id' is a BigIntegerField, override it for other primary keys.
+    """
+    object_id = models.BigIntegerField()
+    deleted = models.DateTimeField(default=timezone.now, db_index=True)
+
+    is_tombstone = True
+
+    class Meta:
+        abstract = True
+
+
+def track_deletions(model, tombstone_model):
+    """
+    Records a tombstone whenever an instance of 'model' is deleted (as long
+    as post_delete is sent, which it is not for raw SQL deletes).
+    """
+    def deleted(sender, instance, using, **kwargs):
+        tombstone_model._default_manager.using(using).create(
+            object_id=instance.pk)
+
+    post_delete.connect(deleted, sender=model, weak=False,
+                        dispatch_uid=('timeordered_pagination', model,
+                                      tombstone_model))
@@ -0,0 +1,78 @@
+"""
+Integer version target fields, as an alternative to modified times.
+
+Timestamps tie whenever several rows are saved together (or within the
+precision of the column), and every tie has to be broken with the
+start_from target field. A version stamped from a sequence on every save
+doesn't tie, and is compared as a plain integer:
+
+    class Article(models.Model):
+        version = VersionField()
+
+        class Meta:
+            indexes = [models.Index(fields=['version', 'id'],
+                                    name='article_version_keyset')]
+
+    class ArticleViewSet(TimeOrderedPaginationViewSetMixin, ...):
+        target_field = 'version'
+
+On PostgreSQL versions come from a sequence, which has to be created (e.g.
+with a RunSQL migration of 'CREATE SEQUENCE app_article_version_seq').
+Elsewhere a version is one more than the largest current version, which is
+only increasing if there is a single writer.
+"""
+from django.db import connections, router
+from django.db.models import BigIntegerField, Max
+
+
+def next_version(model, field_name, using=None):
+    """
+    Returns the next version for the VersionField 'field_name' of 'model'.
+
+    queryset.update() doesn't stamp versions, so pass one explicitly, e.g.
+    'queryset.update(version=next_version(Article, "version"), ...)'.
+    """
+    field = model._meta.get_field(field_name)
+    using = using or router.db_for_write(model)
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT nextval(%s)', [field.get_sequence_name()])
+            return cursor.fetchone()[0]
+    largest = model._default_manager.using(using).aggregate(
+        largest=Max(field_name))['largest']
+    return (largest or 0) + 1
+
+
+class VersionField(BigIntegerField):
+    """
+    A version number, stamped with the next version each time the instance
+    is saved.
+
+    'sequence' names the PostgreSQL sequence, and defaults to
+    '<db_table>_<column>_seq'.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.sequence = kwargs.pop('sequence', None)
+        kwargs.setdefault('default', 0)
+        kwargs.setdefault('editable', False)
+        super(VersionField, self).__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super(VersionField, self).deconstruct()
+        if self.sequence is not None:
+            kwargs['sequence'] = self.sequence
+        return name, path, args, kwargs
+
+    def get_sequence_name(self):
+        return self.sequence or '{}_{}_seq'.format(self.model._meta.db_table,
+                                                   self.column)
+
+    def pre_save(self, model_instance, add):
+        model = model_instance.__class__
+        value = next_version(
+            model, self.name,
+            router.db_for_write(model, instance=model_instance))
+        setattr(model_instance, self.attname, value)
+        return value
@@ -1,5 +1,29 @@
-from django.db.models import Q
+import json
+import random
+from datetime import datetime, timedelta
 
+import django
+from django.core.exceptions import (
+    FieldDoesNotExist, ImproperlyConfigured, ValidationError)
+from django.db import connections, models
+from django.db.models.functions import RowNumber
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import parse_etags
+from rest_framework import pagination
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework.utils.encoders import JSONEncoder
+
+from .cursors import (
+    Cursor, InvalidCursor, decode_cursor, decode_cursors, encode_cursor,
+    encode_cursors, parse_position)
+from .highwater import get_high_water_mark
+from .merge import FeedSource, get_executor, merge_sources
+from .keyset import as_tuple, filter_keyset, get_values, values_tuple
+from .notifiers import monotonic
 from .pagination import TimeOrderedPagination
 
 import logging
@@ -25,20 +49,172 @@ class TimeOrderedPaginationViewSetMixin(object):
             'modified_from' to choose which 'field' at which should be the
             first item in the page. This is necessary to allow robust
             pagination.
+
+    Pages are read backwards from 'modified_before' (optionally with
+    'start_from_<TARGET FIELD>'), which translates into a '(modified, id) <
+    (X, Y)' filter. The 'previous' links use it (or the cursor token, if
+    'cursor_query_param' is set) to go back one page at a time.
+
+    The values of these query parameters are parsed as values of the
+    target and start_from target fields before they are used, and invalid
+    values are rejected with a 400. Datetimes can be given in ISO 8601 or as
+    seconds since the epoch.
+
+    'start_from_target_field' may also be a tuple of fields (e.g. a
+    composite natural key, or a UUID and an id), which are compared in order
+    after the target field. Each then has its own 'start_from_<FIELD>' query
+    parameter, and all of them must be given together.
+
+    When supported, the 'start_from' filter is a row-value comparison (i.e.
+    '(modified, id) >= (X, Y)'), which databases can satisfy with a single
+    range scan of a composite index. Set 'use_row_values' to False to use
+    the equivalent 'OR' form instead.
+
+    Setting 'cursor_query_param' (e.g. to 'cursor') allows the position to
+    be given as a single signed token, which is also used in the 'next'
+    links. The other query parameters continue to work.
+
+    Setting 'prefetch_next_item_override' to True makes the paginator fetch
+    the page and the first item of the next page in a single query.
+
+    Setting 'late_row_lookup' to True makes the paginator fetch only the
+    keys of a page first, and then the page's rows (with the queryset's
+    select_related and prefetch_related) by primary key.
+
+    Setting 'count_strategy_override' to one of the strategies in
+    'timeordered_pagination.counts' changes how the 'count' is produced.
+
+    Setting 'stream_query_param' (e.g. to 'stream') allows the whole feed,
+    from the requested position onwards, to be streamed as newline-delimited
+    JSON (see 'stream_list'). The trailer resumes the feed just after the
+    last item streamed, which only a cursor can express, so
+    'cursor_query_param' must be set too.
+
+    Setting 'change_notifier' to one of the notifiers in
+    'timeordered_pagination.notifiers' allows clients to long poll, by
+    adding 'wait=<seconds>' to the request. If the page is empty the request
+    is held until the notifier reports a change or the wait (capped at
+    'max_wait' seconds) expires.
+
+    Setting 'settle_window' (in seconds) adds 'ETag' and 'Cache-Control'
+    headers to pages, and full pages whose items are all older than the
+    window are marked as cacheable. If 'page_cache' is also set (to the
+    alias of a Django cache) those pages are cached and served from there,
+    keyed by 'get_page_cache_key_parts' (by default the user) too. Settled
+    pages are only cacheable by the client, unless 'page_cache_public' is
+    set because the pages don't depend on who asks for them.
+
+    Setting 'high_water_mark_cache' (to the alias of a Django cache) keeps
+    the model's largest (target field, start_from target field) in that
+    cache, and requests for positions beyond it are answered with an empty
+    page (or a 304 to a matching 'If-None-Match') without querying the
+    database (see 'timeordered_pagination.highwater').
+
+    Setting 'metrics_sink' to a callable, such as one of the sinks in
+    'timeordered_pagination.instrumentation', reports the time and queries
+    spent in each phase of every page (a plain function must be wrapped in
+    staticmethod()).
+
+    Setting 'shard_aliases' to a list of database aliases makes pages fan
+    out over the same queryset on each of them (in parallel, unless
+    'shard_parallel' is False), merged by (target field, alias, start_from
+    target field). The 'next' link is always included, as it carries a
+    position for each shard, so 'cursor_query_param' must be set too.
+
+    Setting 'tombstone_model' to a model derived from
+    'timeordered_pagination.tombstones.Tombstone' interleaves the recorded
+    deletions with the items, ordered by their 'deleted' time and
+    'object_id', each as {<start_from target field>: <object_id>,
+    <target field>: <deleted>, "deleted": true}, in pages (sync and async)
+    and streams. The 'count' only covers the items. Sharded pages and
+    batches can't include tombstones, so they can't be combined with it,
+    and the target field must be a DateTimeField, like 'deleted'.
+
+    Setting 'fields_query_param' (e.g. to 'fields') allows clients to ask
+    for some of the serializer's fields (e.g. 'fields=n,title'). The target
+    and start_from target fields are always included, and if every field is
+    backed by a model field the page only fetches those columns.
+
+    Setting 'values_fields' to a list of field names (or lookups) makes
+    time-ordered pages fetch those columns with 'values_list', and render
+    each row straight to a JSON object, bypassing the serializer and the
+    renderer (see 'values_list_page'). The target and start_from target
+    fields are always included.
+
+    Setting 'batch_filter_fields' to a list of field names adds a 'batch'
+    action, which reads a page of each of several feeds (e.g. one per site)
+    filtered by those fields, in a single request (see 'batch').
+    'cursor_query_param' must be set too.
+
+    Setting 'snapshot_lag' (to a number of seconds) bounds each drain of the
+    feed by the target field, at 'snapshot_lag' seconds before the drain's
+    first page was requested (or, for targets that aren't timestamps, at the
+    largest value then). The bound is carried in every link (as e.g.
+    'modified_until'), so items that keep being modified can't keep a drain
+    going; they are picked up by the next drain instead. Streams are bounded
+    too, but sharded pages and batches are not.
+
+    Setting 'replica_aliases' to a list of database aliases (and
+    'replica_lag_detector' to one of the detectors in
+    'timeordered_pagination.replicas') reads time-ordered pages and streams
+    from one of those replicas, bounded by the commit time of the last
+    transaction it has replayed (as with 'snapshot_lag', and carried in the
+    links the same way). Pages are read from the primary when the detector
+    can't tell how far a replica has got.
     """
     after_query_param_template = '{}_after'
     from_query_param_template = '{}_from'
+    before_query_param_template = '{}_before'
+    until_query_param_template = '{}_until'
     start_from_query_param_template = 'start_from_{}'
     target_field = 'modified'
     start_from_target_field = 'id'
+    use_row_values = True
+    cursor_query_param = None
+    invalid_cursor_message = 'Invalid cursor'
     limit_query_param_override = None
     max_limit_override = None
+    prefetch_next_item_override = None
+    late_row_lookup = False
+    count_strategy_override = None
+    stream_query_param = None
+    stream_chunk_size = 500
+    change_notifier = None
+    wait_query_param = 'wait'
+    max_wait = 30
+    settle_window = None
+    snapshot_lag = None
+    replica_aliases = None
+    replica_lag_detector = None
+    page_cache = None
+    page_cache_public = False
+    high_water_mark_cache = None
+    high_water_mark_reconcile_interval = 60
+    metrics_sink = None
+    shard_aliases = None
+    shard_parallel = True
+    tombstone_model = None
+    fields_query_param = None
+    values_fields = None
+    batch_filter_fields = None
+    max_batch_size = 100
+    timeordered_pagination_class = None
 
     @property
     def start_from_query_param(self):
+        if isinstance(self.start_from_target_field, (list, tuple)):
+            return tuple(self.start_from_query_param_template.format(field)
+                         for field in self.start_from_target_field)
         return self.start_from_query_param_template.format(
             self.start_from_target_field)
 
+    @property
+    def keyset_fields(self):
+        """
+        The target field followed by the start_from target field(s).
+        """
+        return (self.target_field,) + as_tuple(self.start_from_target_field)
+
     @property
     def modified_after_query_param(self):
         return self.after_query_param_template.format(self.target_field)
@@ -47,6 +223,14 @@ class TimeOrderedPaginationViewSetMixin(object):
     def modified_from_query_param(self):
         return self.from_query_param_template.format(self.target_field)
 
+    @property
+    def modified_before_query_param(self):
+        return self.before_query_param_template.format(self.target_field)
+
+    @property
+    def modified_until_query_param(self):
+        return self.until_query_param_template.format(self.target_field)
+
     def get_queryset(self):
         queryset = super(TimeOrderedPaginationViewSetMixin,
                          self).get_queryset()
@@ -55,57 +239,846 @@ class TimeOrderedPaginationViewSetMixin(object):
             # Nothing for us to do
             return queryset
 
-        query_params = self.request.query_params
-        modified_after = query_params.get(
-            self.modified_after_query_param, None)
-        modified_from = query_params.get(self.modified_from_query_param, None)
+        queryset = self.filter_timeordered_until(
+            self.filter_timeordered_queryset(
+                queryset, self.get_timeordered_cursor()))
+        return self.project_timeordered_queryset(
+            self.route_timeordered_queryset(queryset))
 
-        if modified_after is not None:
+    def get_timeordered_cursor(self):
+        """
+        Returns the Cursor for the request.
+
+        The cursor is parsed once per request and kept on the request as
+        'timeordered_cursor', so that the paginator can reuse it.
+        """
+        request = self.request
+        if not hasattr(request, 'timeordered_cursor'):
+            request.timeordered_cursor = self.parse_timeordered_cursor(
+                request.query_params)
+        return request.timeordered_cursor
+
+    def get_timeordered_until(self):
+        """
+        Returns the upper bound of the target field for the request's drain,
+        or None if 'snapshot_lag' isn't set.
+
+        The bound is taken from the request's 'until' query parameter, or
+        else set from 'get_snapshot_until', and capped at the replay time of
+        the replica the page is read from. It is kept on the request as
+        'timeordered_until', so that the paginator carries it in the links.
+        """
+        if self.snapshot_lag is None and not self.replica_aliases:
+            return None
+        request = self.request
+        if not hasattr(request, 'timeordered_until'):
+            until = request.query_params.get(
+                self.modified_until_query_param, None)
+            if until is not None:
+                until = self.parse_timeordered_value(
+                    self.modified_until_query_param, self.target_field, until)
+            elif self.snapshot_lag is not None:
+                until = self.get_snapshot_until()
+            _, replayed = self.get_timeordered_replica()
+            if replayed is not None and (until is None or replayed < until):
+                # Never read past what the replica has seen
+                until = replayed
+            request.timeordered_until = until
+        return request.timeordered_until
+
+    def get_timeordered_replica(self):
+        """
+        Returns the (alias, replay time) of the replica to read the request's
+        pages from, or (None, None) to read them from the primary.
+
+        The replica is picked from 'replica_aliases' at random, and the choice
+        is kept on the request as 'timeordered_replica'.
+        """
+        if not self.replica_aliases:
+            return None, None
+        if self.replica_lag_detector is None:
+            raise ImproperlyConfigured(
+                'replica_lag_detector must be set to use replica_aliases.')
+        request = self.request
+        if not hasattr(request, 'timeordered_replica'):
+            alias = random.choice(self.replica_aliases)
+            replayed = self.replica_lag_detector.get_replayed_until(alias)
+            request.timeordered_replica = (alias, replayed) \
+                if replayed is not None else (None, None)
+        return request.timeordered_replica
+
+    def route_timeordered_queryset(self, queryset):
+        """
+        Moves the queryset to the request's replica, if there is one.
+        """
+        alias, _ = self.get_timeordered_replica()
+        if alias is None:
+            return queryset
+        return queryset.using(alias)
+
+    def get_snapshot_until(self):
+        """
+        Returns the upper bound for a new drain: 'snapshot_lag' seconds ago
+        for a timestamp target field, otherwise its current largest value.
+        """
+        queryset = super(TimeOrderedPaginationViewSetMixin,
+                         self).get_queryset()
+        field = queryset.model._meta.get_field(self.target_field)
+        if isinstance(field, models.DateTimeField):
+            return timezone.now() - timedelta(seconds=self.snapshot_lag)
+        return queryset.order_by().aggregate(
+            until=models.Max(self.target_field))['until']
+
+    def filter_timeordered_until(self, queryset, field=None):
+        """
+        Filters the queryset to the items with 'field' (by default the
+        target field) at or before the request's upper bound, if any.
+        """
+        until = self.get_timeordered_until()
+        if until is None:
+            return queryset
+        return queryset.filter(**{
+            (field or self.target_field) + '__lte': until})
+
+    def parse_timeordered_cursor(self, query_params):
+        if self.cursor_query_param:
+            token = query_params.get(self.cursor_query_param, None)
+            if token is not None:
+                try:
+                    cursor = decode_cursor(token)
+                except InvalidCursor:
+                    raise NotFound(self.invalid_cursor_message)
+                return self.clean_timeordered_cursor(cursor)
+
+        for param, inclusive, reverse in (
+                (self.modified_after_query_param, False, False),
+                (self.modified_from_query_param, True, False),
+                (self.modified_before_query_param, False, True)):
+            position = query_params.get(param, None)
+            if position is None:
+                continue
+            position = self.parse_timeordered_value(
+                param, self.target_field, position)
+            start_from = None
+            if param != self.modified_after_query_param:
+                start_from = self.parse_timeordered_start_from(query_params)
+            return Cursor(position, start_from, inclusive=inclusive,
+                          reverse=reverse)
+        return None
+
+    def clean_timeordered_cursor(self, cursor):
+        """
+        Returns a Cursor decoded from a token with its position and
+        start_from parsed as values of their model fields.
+
+        A signed token can still carry values of the wrong type (e.g. one
+        issued by another feed), which raise ParseError.
+        """
+        param = self.cursor_query_param
+        position = cursor.position
+        field = self.get_timeordered_model()._meta.get_field(
+            self.target_field)
+        if isinstance(field, models.DateTimeField) and \
+                not isinstance(position, datetime):
+            raise ParseError({param: ['Cursor position is not a timestamp.']})
+        position = self.parse_timeordered_value(
+            param, self.target_field, position)
+        start_from = cursor.start_from
+        if start_from is not None:
+            fields = as_tuple(self.start_from_target_field)
+            values = start_from if len(fields) > 1 else (start_from,)
+            if not isinstance(values, tuple) or len(values) != len(fields):
+                raise ParseError({param: [
+                    'Cursor has the wrong number of start_from values.']})
+            values = tuple(self.parse_timeordered_value(param, field, value)
+                           for field, value in zip(fields, values))
+            start_from = values if len(fields) > 1 else values[0]
+        return Cursor(position, start_from, inclusive=cursor.inclusive,
+                      reverse=cursor.reverse)
+
+    def parse_timeordered_start_from(self, query_params):
+        """
+        Returns the start_from value(s) of the query parameters (a tuple if
+        there are several start_from target fields), or None.
+        """
+        params = as_tuple(self.start_from_query_param)
+        values = [query_params.get(param, None) for param in params]
+        if all(value is None for value in values):
+            return None
+        missing = [param for param, value in zip(params, values)
+                   if value is None]
+        if missing:
+            raise ParseError(dict((param, ['This field is required.'])
+                                  for param in missing))
+        values = tuple(
+            self.parse_timeordered_value(param, field, value)
+            for param, field, value in zip(
+                params, as_tuple(self.start_from_target_field), values))
+        if isinstance(self.start_from_target_field, (list, tuple)):
+            return values
+        return values[0]
+
+    def get_timeordered_model(self):
+        """
+        Returns the model of the viewset's queryset.
+        """
+        return super(TimeOrderedPaginationViewSetMixin,
+                     self).get_queryset().model
+
+    def parse_timeordered_value(self, param, field_name, value):
+        """
+        Returns the 'value' of the query parameter 'param' as a value of the
+        model field 'field_name'.
+
+        Raises ParseError if the value is not valid for the field.
+        """
+        field = self.get_timeordered_model()._meta.get_field(field_name)
+        try:
+            return parse_position(field, value)
+        except ValidationError as e:
+            raise ParseError({param: e.messages})
+
+    def filter_timeordered_queryset(self, queryset, cursor, fields=None):
+        """
+        Filters and orders the queryset for a page starting at 'cursor' (or,
+        for a reverse cursor, for a page read backwards from it).
+
+        'fields' are the (target field, start_from target field) to use, and
+        default to the viewset's.
+        """
+        target_field, start_from_target_field = fields or \
+            (self.target_field, self.start_from_target_field)
+        keyset_fields = (target_field,) + as_tuple(start_from_target_field)
+        if cursor is None:
+            logger.error('This should not be possible')
+        elif cursor.start_from is None:
+            if cursor.reverse:
+                lookup = '__lte' if cursor.inclusive else '__lt'
+            else:
+                lookup = '__gte' if cursor.inclusive else '__gt'
             queryset = queryset.filter(**{
-                self.target_field + '__gt': modified_after
+                target_field + lookup: cursor.position
             })
-        elif modified_from is not None:
-            start_at = query_params.get(self.start_from_query_param, None)
-            if start_at is None:
-                queryset = queryset.filter(**{
-                    self.target_field + '__gte': modified_from
-                })
-            else:
-                # modified > modified_from || modified == modified_from and id
-                # >= start_at
-                query = Q(**{self.target_field + '__gt': modified_from}) |\
-                    (Q(**{self.target_field: modified_from}) &
-                     Q(**{self.start_from_target_field + '__gte': start_at}))
-                queryset = queryset.filter(query)
         else:
-            logger.error('This should not be possible')
+            # (modified, id) >= (modified_from, start_at)
+            operator = '<' if cursor.reverse else '>'
+            queryset = filter_keyset(
+                queryset, keyset_fields,
+                (cursor.position,) + values_tuple(start_from_target_field,
+                                                  cursor.start_from),
+                operator + '=' if cursor.inclusive else operator,
+                row_values=self.use_row_values)
 
         # Ensure order by modified then 'id', as this is how we maintain a
         # consistent ordering between calls
-        queryset = queryset.order_by(
-            self.target_field, self.start_from_target_field)
+        if cursor is not None and cursor.reverse:
+            return queryset.order_by(*('-' + field
+                                       for field in keyset_fields))
+        return queryset.order_by(*keyset_fields)
+
+    def check_forward_cursor(self, cursor):
+        if cursor is not None and cursor.reverse:
+            raise ParseError('This feed can only be read forwards.')
+
+    def get_requested_fields(self):
+        """
+        Returns the names of the fields requested with 'fields_query_param'
+        (always including the target and start_from target fields), or None
+        for all of them.
+        """
+        if not self.fields_query_param or \
+                not self.is_timeordered_pagination_request():
+            return None
+        fields = self.request.query_params.get(self.fields_query_param, None)
+        if not fields:
+            return None
+        requested = set(field.strip() for field in fields.split(','))
+        requested.update(self.keyset_fields)
+        return requested
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super(TimeOrderedPaginationViewSetMixin,
+                           self).get_serializer(*args, **kwargs)
+        requested = self.get_requested_fields()
+        fields = getattr(getattr(serializer, 'child', serializer),
+                         'fields', None)
+        if requested is not None and fields is not None:
+            for name in list(fields):
+                if name not in requested:
+                    fields.pop(name)
+        return serializer
 
-        return queryset
+    def project_timeordered_queryset(self, queryset):
+        """
+        Restricts the queryset to the columns of the requested fields.
+
+        The queryset is left alone if any requested field isn't a model
+        field (e.g. a SerializerMethodField), as deferred columns would be
+        loaded one row at a time.
+        """
+        if self.get_requested_fields() is None:
+            return queryset
+        fields = getattr(self.get_serializer(), 'fields', None)
+        if fields is None:
+            return queryset
+        opts = queryset.model._meta
+        columns = set(self.keyset_fields)
+        for field in fields.values():
+            if field.source == 'pk':
+                columns.add(opts.pk.name)
+                continue
+            try:
+                model_field = opts.get_field(field.source)
+            except FieldDoesNotExist:
+                return queryset
+            if model_field.concrete and not model_field.many_to_many:
+                columns.add(model_field.name)
+        return queryset.only(*columns)
+
+    def is_timeordered_stream_request(self):
+        if not self.stream_query_param or \
+                not self.is_timeordered_pagination_request():
+            return False
+        stream = self.request.query_params.get(self.stream_query_param, None)
+        return stream is not None and stream.lower() not in ('0', 'false')
+
+    def list(self, request, *args, **kwargs):
+        if self.shard_aliases and self.is_timeordered_pagination_request():
+            return self.sharded_list(request)
+        if self.is_timeordered_stream_request():
+            return self.stream_list(request)
+        response = self.get_high_water_mark_response() or \
+            self.get_cached_timeordered_response()
+        if response is not None:
+            return response
+        if self.values_fields is not None and \
+                self.is_timeordered_pagination_request():
+            response = self.values_list_page(request)
+            self.add_high_water_mark_etag(response)
+            return self.render_values_response(response)
+        if (self.metrics_sink is not None or
+                self.tombstone_model is not None) and \
+                self.is_timeordered_pagination_request():
+            response = self.timeordered_list(request)
+        else:
+            response = super(TimeOrderedPaginationViewSetMixin, self).list(
+                request, *args, **kwargs)
+        self.add_high_water_mark_etag(response)
+        return response
+
+    def timeordered_list(self, request):
+        """
+        Lists a page as ListModelMixin.list does, also measuring the
+        serialization of the page and serializing any tombstones in it.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        with self.paginator.measure('serialize'):
+            data = self.serialize_timeordered_page(page)
+        return self.get_paginated_response(data)
+
+    def serialize_timeordered_page(self, page):
+        """
+        Serializes the items in the page with the serializer, and any
+        tombstones with 'serialize_tombstone', keeping their order.
+        """
+        live = [item for item in page
+                if not getattr(item, 'is_tombstone', False)]
+        items = iter(self.get_serializer(live, many=True).data)
+        return [self.serialize_tombstone(item)
+                if getattr(item, 'is_tombstone', False) else next(items)
+                for item in page]
+
+    def values_list_page(self, request):
+        """
+        Lists a page of the 'values_fields' of each item, as plain dicts.
+
+        The rows are named tuples, from which the paginator reads the
+        position of the next page.
+        """
+        fields = list(self.values_fields)
+        for field in self.keyset_fields:
+            if field not in fields:
+                fields.append(field)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(
+            queryset.values_list(*fields, named=True))
+        with self.paginator.measure('serialize'):
+            data = [self.serialize_tombstone(row)
+                    if getattr(row, 'is_tombstone', False)
+                    else dict(zip(fields, row))
+                    for row in page]
+        return self.get_paginated_response(data)
+
+    def render_values_response(self, response):
+        """
+        Renders the JSON of 'response' directly, without content
+        negotiation.
+        """
+        rendered = HttpResponse(
+            json.dumps(response.data, cls=JSONEncoder, ensure_ascii=False,
+                       separators=(',', ':')),
+            content_type='application/json', status=response.status_code)
+        for header, value in response.items():
+            if header.lower() != 'content-type':
+                rendered[header] = value
+        return rendered
+
+    def get_tombstone_queryset(self, cursor=None):
+        """
+        Returns the tombstones at or after 'cursor' (by default the
+        request's), ordered like the items.
+        """
+        if isinstance(self.start_from_target_field, (list, tuple)):
+            raise ImproperlyConfigured(
+                'tombstone_model needs a single start_from_target_field.')
+        field = self.get_timeordered_model()._meta.get_field(
+            self.target_field)
+        if not isinstance(field, models.DateTimeField):
+            raise ImproperlyConfigured(
+                'tombstone_model needs a DateTimeField target_field.')
+        tombstones = self.filter_timeordered_queryset(
+            self.tombstone_model._default_manager.all(),
+            cursor or self.get_timeordered_cursor(), ('deleted', 'object_id'))
+        if isinstance(self.get_timeordered_until(), datetime):
+            tombstones = self.filter_timeordered_until(tombstones, 'deleted')
+        return self.route_timeordered_queryset(tombstones)
+
+    def serialize_tombstone(self, tombstone):
+        return {
+            self.start_from_target_field: tombstone.object_id,
+            self.target_field: tombstone.deleted,
+            'deleted': True,
+        }
+
+    def get_shard_sources(self):
+        queryset = self.project_timeordered_queryset(self.filter_queryset(
+            super(TimeOrderedPaginationViewSetMixin, self).get_queryset()))
+        return [FeedSource(queryset.using(alias), self.get_serializer_class(),
+                           self.target_field, self.start_from_target_field,
+                           name=alias, use_row_values=self.use_row_values)
+                for alias in self.shard_aliases]
+
+    def get_shard_cursors(self, sources):
+        """
+        Returns a dict of shard aliases to the Cursor each starts from.
+        """
+        query_params = self.request.query_params
+        token = query_params.get(self.cursor_query_param, None)
+        if token is not None:
+            try:
+                cursors = decode_cursors(token)
+            except InvalidCursor:
+                raise NotFound(self.invalid_cursor_message)
+            return dict((name, self.clean_timeordered_cursor(cursor))
+                        for name, cursor in cursors.items())
+        cursor = self.parse_timeordered_cursor(query_params)
+        self.check_forward_cursor(cursor)
+        return dict((source.name, cursor) for source in sources)
+
+    def sharded_list(self, request):
+        """
+        Lists a page merged from the queryset on every shard, with one query
+        per shard.
+        """
+        if not self.cursor_query_param:
+            raise ImproperlyConfigured(
+                'cursor_query_param must be set to use shard_aliases.')
+        if self.tombstone_model is not None:
+            raise ImproperlyConfigured(
+                'tombstone_model cannot be combined with shard_aliases.')
+        sources = self.get_shard_sources()
+        cursors = self.get_shard_cursors(sources)
+        limit = self.paginator.get_limit(request)
+
+        executor = get_executor() if self.shard_parallel else None
+        merged, _ = merge_sources(sources, cursors, limit, executor)
+
+        # As with merged feeds, 'next' always carries every shard's position
+        for source, item in merged:
+            cursors[source.name] = source.get_item_cursor(item)
+        next_link = request.build_absolute_uri()
+        for param in (self.modified_after_query_param,
+                      self.modified_from_query_param,
+                      self.modified_before_query_param) + \
+                as_tuple(self.start_from_query_param):
+            next_link = remove_query_param(next_link, param)
+        next_link = replace_query_param(
+            next_link, self.cursor_query_param, encode_cursors(cursors))
+        serializer = self.get_serializer([item for _, item in merged],
+                                         many=True)
+        return Response({
+            'next': next_link,
+            'previous': None,
+            'count': None,
+            'count_strategy': 'none',
+            'results': serializer.data,
+        })
+
+    @classmethod
+    def get_extra_actions(cls):
+        actions = super(TimeOrderedPaginationViewSetMixin,
+                        cls).get_extra_actions()
+        if cls.batch_filter_fields is None:
+            # Only route the batch action for the viewsets that enable it
+            actions = [extra for extra in actions if extra.__name__ != 'batch']
+        return actions
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request, *args, **kwargs):
+        """
+        Returns a page of each of several feeds, each filtered by some of the
+        'batch_filter_fields' and starting at its own position, e.g.
+
+            {"feeds": [{"filter": {"site": 1}, "cursor": "<token>"},
+                       {"filter": {"site": 2}, "modified_from": "...",
+                        "limit": 50}]}
+
+        is answered with a page for each feed, in the same order:
+
+            {"feeds": [{"next": "<token>", "results": [...]}, ...]}
+
+        As with merged feeds, 'next' is always the cursor to read the feed
+        from in the next batch, and an empty page means it is caught up.
+        """
+        if not self.cursor_query_param:
+            raise ImproperlyConfigured(
+                'cursor_query_param must be set to use batch_filter_fields.')
+        if self.tombstone_model is not None:
+            raise ImproperlyConfigured(
+                'tombstone_model cannot be combined with batch_filter_fields.')
+        entries = self.parse_batch_entries(request.data)
+        pages = self.fetch_batch_pages([
+            (self.get_batch_queryset(filters, cursor), limit)
+            for filters, cursor, limit in entries])
+
+        serializer = self.get_serializer(
+            [item for page in pages for item in page], many=True)
+        data = iter(serializer.data)
+        feeds = []
+        for (_, cursor, _), page in zip(entries, pages):
+            if page:
+                cursor = Cursor(
+                    getattr(page[-1], self.target_field),
+                    get_values(page[-1], self.start_from_target_field),
+                    inclusive=False)
+            feeds.append({
+                'next': encode_cursor(cursor) if cursor else None,
+                'results': [next(data) for _ in page],
+            })
+        return Response({'feeds': feeds})
+
+    def parse_batch_entries(self, data):
+        """
+        Returns a (filters, cursor, limit) tuple for each feed in the body of
+        a batch request.
+        """
+        feeds = data.get('feeds', None) if isinstance(data, dict) else None
+        if not isinstance(feeds, list) or not feeds:
+            raise ParseError({'feeds': ['Expected a non-empty list.']})
+        if len(feeds) > self.max_batch_size:
+            raise ParseError({'feeds': [
+                'Ensure this list has no more than {} feeds.'.format(
+                    self.max_batch_size)]})
+
+        entries = []
+        for feed in feeds:
+            if not isinstance(feed, dict):
+                raise ParseError({'feeds': ['Expected a list of objects.']})
+            filters = feed.get('filter', None) or {}
+            if not isinstance(filters, dict) or \
+                    set(filters) - set(self.batch_filter_fields):
+                raise ParseError({'filter': [
+                    'Feeds can only be filtered by {}.'.format(
+                        ', '.join(self.batch_filter_fields))]})
+            filters = dict(
+                (field, self.parse_timeordered_value(field, field, value))
+                for field, value in filters.items())
+            cursor = self.parse_timeordered_cursor(feed)
+            self.check_forward_cursor(cursor)
+            entries.append((filters, cursor, self.get_batch_limit(feed)))
+        return entries
+
+    def get_batch_limit(self, feed):
+        pagination_class = self.timeordered_pagination_class or \
+            TimeOrderedPagination
+        try:
+            return pagination._positive_int(
+                feed[self.limit_query_param_override or
+                     pagination_class.limit_query_param],
+                strict=True,
+                cutoff=self.max_limit_override or pagination_class.max_limit)
+        except (KeyError, TypeError, ValueError):
+            return pagination_class.default_limit
+
+    def get_batch_queryset(self, filters, cursor):
+        queryset = self.filter_queryset(
+            super(TimeOrderedPaginationViewSetMixin, self).get_queryset())
+        queryset = queryset.filter(**filters)
+        if cursor is None:
+            return queryset.order_by(*self.keyset_fields)
+        return self.filter_timeordered_queryset(queryset, cursor)
+
+    def fetch_batch_pages(self, querysets):
+        """
+        Returns the first 'limit' items of each (queryset, limit) pair.
+
+        They are fetched with a single UNION ALL of the querysets, each
+        sliced where the database allows sliced queries to be combined (e.g.
+        PostgreSQL), or else (e.g. SQLite) limited by a ROW_NUMBER() window
+        over its keyset order. Otherwise they take one query each.
+        """
+        queryset, _ = querysets[0]
+        features = connections[queryset.db].features
+        entries = [
+            (queryset.annotate(timeordered_batch_entry=models.Value(
+                i, output_field=models.IntegerField())), limit)
+            for i, (queryset, limit) in enumerate(querysets)]
+        if len(querysets) > 1 and \
+                features.supports_slicing_ordering_in_compound:
+            parts = [queryset[:limit] for queryset, limit in entries]
+        elif len(querysets) > 1 and features.supports_over_clause and \
+                django.VERSION >= (4, 2):
+            # Filtering on a window function needs Django 4.2
+            row_number = models.Window(RowNumber(), order_by=[
+                models.F(field).asc() for field in self.keyset_fields])
+            parts = [queryset.order_by().annotate(
+                timeordered_batch_row=row_number).filter(
+                timeordered_batch_row__lte=limit)
+                for queryset, limit in entries]
+        else:
+            return [list(queryset[:limit]) for queryset, limit in querysets]
+
+        pages = [[] for _ in querysets]
+        for item in parts[0].union(*parts[1:], all=True):
+            pages[item.timeordered_batch_entry].append(item)
+
+        # The order of the combined rows is not defined, so restore the
+        # order of each page
+        def key(item):
+            return (getattr(item, self.target_field),) + values_tuple(
+                self.start_from_target_field,
+                get_values(item, self.start_from_target_field))
+        return [sorted(page, key=key) for page in pages]
+
+    def get_high_water_mark(self):
+        return get_high_water_mark(
+            self.get_timeordered_model(), self.target_field,
+            self.start_from_target_field, self.high_water_mark_cache,
+            self.high_water_mark_reconcile_interval)
+
+    def is_beyond_high_water_mark(self, cursor):
+        """
+        Returns whether there can be no items at or after 'cursor'.
+
+        This is only the case if it is beyond the high-water mark of the
+        whole model, which is also beyond that of any filtered queryset.
+        """
+        if cursor.reverse:
+            return False
+        mark = self.get_high_water_mark().get()
+        if mark is None:
+            return True
+        opts = self.get_timeordered_model()._meta
+        try:
+            position = opts.get_field(self.target_field).to_python(
+                cursor.position)
+            if cursor.start_from is None:
+                return position > mark[0] or \
+                    (not cursor.inclusive and position == mark[0])
+            key = (position,) + tuple(
+                opts.get_field(field).to_python(value)
+                for field, value in zip(
+                    as_tuple(self.start_from_target_field),
+                    values_tuple(self.start_from_target_field,
+                                 cursor.start_from)))
+            return key > tuple(mark) or \
+                (not cursor.inclusive and key == tuple(mark))
+        except (TypeError, ValidationError):
+            # e.g. a naive position when the mark is aware
+            return False
+
+    def get_high_water_mark_response(self):
+        # The mark doesn't cover tombstones, and long polls have to wait
+        if not self.high_water_mark_cache or \
+                self.tombstone_model is not None or \
+                not self.is_timeordered_pagination_request() or \
+                self.get_wait_timeout():
+            return None
+        if not self.is_beyond_high_water_mark(self.get_timeordered_cursor()):
+            return None
+
+        response = self.paginator.get_empty_response(self.request)
+        self.add_high_water_mark_etag(response)
+        if_none_match = self.request.META.get('HTTP_IF_NONE_MATCH', '')
+        if response['ETag'] in parse_etags(if_none_match):
+            return Response(status=304, headers={'ETag': response['ETag']})
+        return response
+
+    def add_high_water_mark_etag(self, response):
+        # Empty pages need an ETag for clients to send 'If-None-Match'
+        if self.high_water_mark_cache and \
+                self.is_timeordered_pagination_request() and \
+                not response.data['results'] and 'ETag' not in response:
+            response['ETag'] = self.paginator.get_etag(response)
+
+    def get_cached_timeordered_response(self):
+        if not self.page_cache or \
+                not self.is_timeordered_pagination_request():
+            return None
+        if self.settle_window is None:
+            # Only settled pages are stored
+            raise ImproperlyConfigured(
+                'settle_window must be set to use page_cache.')
+        # The bound is part of the cache key
+        self.get_timeordered_until()
+        return self.paginator.get_cached_response(
+            self.request, self.get_timeordered_cursor(),
+            self.get_page_cache_key_parts())
+
+    def get_page_cache_key_parts(self):
+        """
+        Returns the values, besides the URL, that the page depends on, so
+        that users only get their own cached pages.
+
+        Override this (e.g. to return the tenant) if 'get_queryset' depends
+        on anything else about the request.
+        """
+        user = getattr(self.request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return (None,)
+        return (user.pk,)
+
+    def stream_list(self, request):
+        """
+        Streams every item from the requested position onwards as
+        newline-delimited JSON, followed by a trailer record of the form:
+
+            {"trailer": {"next": <url to resume from>, "count": <items>}}
+
+        The feed is walked in chunks of 'stream_chunk_size' items, each
+        fetched with a fresh keyset query from the last item seen, so memory
+        use does not depend on the number of items.
+        """
+        if not self.cursor_query_param:
+            raise ImproperlyConfigured(
+                'cursor_query_param must be set to use stream_query_param.')
+        cursor = self.get_timeordered_cursor()
+        self.check_forward_cursor(cursor)
+        return StreamingHttpResponse(
+            self.iter_timeordered_stream(cursor),
+            content_type='application/x-ndjson')
+
+    def iter_timeordered_stream(self, cursor):
+        queryset = super(TimeOrderedPaginationViewSetMixin,
+                         self).get_queryset()
+        paginator = self.paginator
+        paginator.request = self.request
+        count = 0
+        while True:
+            chunk = list(self.project_timeordered_queryset(
+                self.filter_queryset(self.route_timeordered_queryset(
+                    self.filter_timeordered_until(
+                        self.filter_timeordered_queryset(queryset, cursor)))))
+                [:self.stream_chunk_size])
+            if self.tombstone_model is not None:
+                # Both are ordered, so the first 'stream_chunk_size' of
+                # either are all that can be in this chunk
+                chunk = sorted(
+                    chunk + list(self.get_tombstone_queryset(cursor)[
+                        :self.stream_chunk_size]),
+                    key=paginator.get_item_key)[:self.stream_chunk_size]
+            for data in self.serialize_timeordered_page(chunk):
+                yield self.render_stream_record(data)
+            count += len([item for item in chunk
+                          if not getattr(item, 'is_tombstone', False)])
+            if chunk:
+                # Carry on from just after the last item (or tombstone)
+                cursor = Cursor(*paginator.get_item_key(chunk[-1]),
+                                inclusive=False)
+            if len(chunk) < self.stream_chunk_size:
+                break
+
+        yield self.render_stream_record({'trailer': {
+            'next': paginator.get_link(cursor),
+            'count': count,
+        }})
+
+    def render_stream_record(self, data):
+        return json.dumps(data, cls=JSONEncoder,
+                          separators=(',', ':')) + '\n'
+
+    def get_wait_timeout(self):
+        if self.change_notifier is None or \
+                not self.is_timeordered_pagination_request():
+            return 0
+        try:
+            wait = float(self.request.query_params[self.wait_query_param])
+        except (KeyError, ValueError):
+            return 0
+        return max(0, min(wait, self.max_wait))
+
+    def paginate_queryset(self, queryset):
+        wait = self.get_wait_timeout()
+        if not wait:
+            return super(TimeOrderedPaginationViewSetMixin,
+                         self).paginate_queryset(queryset)
+
+        # Listen before querying, so that changes made while the page is
+        # being fetched still wake us up
+        listener = self.change_notifier.listen(queryset.model)
+        try:
+            deadline = monotonic() + wait
+            while True:
+                page = super(TimeOrderedPaginationViewSetMixin,
+                             self).paginate_queryset(queryset.all())
+                remaining = deadline - monotonic()
+                if page or remaining <= 0 or not listener.wait(remaining):
+                    return page
+        finally:
+            listener.close()
 
     def is_timeordered_pagination_request(self):
-        modified_after = self.request.query_params.get(
+        query_params = self.request.query_params
+        if self.cursor_query_param and \
+                query_params.get(self.cursor_query_param, None) is not None:
+            return True
+        modified_after = query_params.get(
             self.modified_after_query_param, None)
-        modified_from = self.request.query_params.get(
+        modified_from = query_params.get(
             self.modified_from_query_param, None)
-        return modified_after is not None or modified_from is not None
+        modified_before = query_params.get(
+            self.modified_before_query_param, None)
+        return modified_after is not None or modified_from is not None or \
+            modified_before is not None
 
     @property
     def paginator(self):
         if self.is_timeordered_pagination_request():
             if not hasattr(self, '_timeordered_paginator'):
-                self._timeordered_paginator = TimeOrderedPagination(
+                pagination_class = self.timeordered_pagination_class or \
+                    TimeOrderedPagination
+                self._timeordered_paginator = pagination_class(
                     self.target_field,
                     self.modified_after_query_param,
                     self.modified_from_query_param,
                     self.start_from_target_field,
                     self.start_from_query_param,
                     self.limit_query_param_override,
-                    self.max_limit_override)
+                    self.max_limit_override,
+                    prefetch_next_item_override=(
+                        self.prefetch_next_item_override),
+                    count_strategy_override=self.count_strategy_override,
+                    cursor_query_param_override=self.cursor_query_param,
+                    settle_window_override=self.settle_window,
+                    page_cache_override=self.page_cache,
+                    cache_public_override=self.page_cache_public,
+                    metrics_sink_override=self.metrics_sink,
+                    before_query_param_override=(
+                        self.modified_before_query_param),
+                    late_row_lookup_override=self.late_row_lookup,
+                    until_query_param_override=(
+                        self.modified_until_query_param))
 
             return self._timeordered_paginator
         return super(TimeOrderedPaginationViewSetMixin, self).paginator
@@ -1,13 +1,21 @@
+import uuid
+
 from django.db import models
 from model_utils.models import TimeStampedModel
 from model_utils.fields import AutoLastModifiedField
 
+from timeordered_pagination.tombstones import Tombstone, track_deletions
+from timeordered_pagination.versions import VersionField
+
 
 class ModelWithModified(TimeStampedModel):
     n = models.IntegerField("An integer")
 
     class Meta:
         ordering = ('n',)
+        indexes = [
+            models.Index(fields=['modified', 'id']),
+        ]
 
 
 class ModelWithAnotherField(models.Model):
@@ -16,3 +24,42 @@ class ModelWithAnotherField(models.Model):
 
     class Meta:
         ordering = ('n',)
+
+
+class ModelWithVersion(models.Model):
+    n = models.IntegerField("An integer")
+    version = VersionField()
+
+    class Meta:
+        ordering = ('n',)
+        indexes = [
+            models.Index(fields=['version', 'id'],
+                         name='modelwithversion_keyset'),
+        ]
+
+
+class ModelWithNaturalKey(models.Model):
+    tenant = models.CharField(max_length=20)
+    key = models.UUIDField(default=uuid.uuid4)
+    n = models.IntegerField("An integer")
+    modified = AutoLastModifiedField()
+
+    class Meta:
+        ordering = ('n',)
+        unique_together = [('tenant', 'key')]
+        indexes = [
+            models.Index(fields=['modified', 'tenant', 'key'],
+                         name='modelwithnaturalkey_keyset'),
+        ]
+
+
+class ModelWithModifiedTombstone(Tombstone):
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted', 'object_id'],
+                         name='modelwithmodified_tombstone'),
+        ]
+
+
+track_deletions(ModelWithModified, ModelWithModifiedTombstone)
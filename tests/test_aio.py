@@ -0,0 +1,148 @@
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework.viewsets import ReadOnlyModelViewSet
+
+from timeordered_pagination.aio import (
+    AsyncTimeOrderedPagination, AsyncTimeOrderedPaginationViewSetMixin)
+from timeordered_pagination.counts import CappedCount
+from tests.models import ModelWithModified, ModelWithVersion
+from tests.utils import create_at
+from tests.views import PassThroughSerializer
+
+
+factory = APIRequestFactory()
+
+
+class AsyncViewSet(AsyncTimeOrderedPaginationViewSetMixin,
+                   ReadOnlyModelViewSet):
+    queryset = ModelWithModified.objects.all()
+    serializer_class = PassThroughSerializer
+
+
+class AsyncViewSetWithVersionSnapshot(AsyncViewSet):
+    queryset = ModelWithVersion.objects.all()
+    target_field = 'version'
+    snapshot_lag = 0
+
+
+class AsyncShardedViewSet(AsyncViewSet):
+    cursor_query_param = 'cursor'
+    shard_aliases = ['default', 'shard']
+    shard_parallel = False
+
+
+class AsyncViewSetWithValues(AsyncViewSet):
+    values_fields = ('n',)
+
+
+@pytest.mark.django_db
+class TestAsyncPagination:
+
+    def setup(self):
+        self.start_of_test = timezone.now()
+        self.models = [
+            ModelWithModified.objects.create(n=n) for n in range(6)
+        ]
+        self.queryset = ModelWithModified.objects.order_by('modified', 'id')
+        self.request = Request(factory.get('/data/', {'limit': 4}))
+
+    def paginate(self, **kwargs):
+        paginator = AsyncTimeOrderedPagination(
+            'modified', 'modified_after', 'modified_from', 'id',
+            'start_from_id', **kwargs)
+        with CaptureQueriesContext(connection) as queries:
+            page = async_to_sync(paginator.apaginate_queryset)(
+                self.queryset, self.request)
+        return paginator, page, len(queries)
+
+    def test_it_paginates_the_queryset(self):
+        paginator, page, num_queries = self.paginate()
+        assert page == self.models[:4]
+        assert paginator.get_next_item() == self.models[4]
+        assert paginator.count == 6
+        # count, page and next item
+        assert num_queries == 3
+
+    def test_it_fetches_the_next_item_with_the_page(self):
+        paginator, page, num_queries = self.paginate(
+            prefetch_next_item_override=True)
+        assert page == self.models[:4]
+        assert paginator.get_next_item() == self.models[4]
+        assert num_queries == 2
+
+    def test_it_uses_other_count_strategies(self):
+        paginator, _, _ = self.paginate(
+            count_strategy_override=CappedCount(3))
+        assert paginator.count == '3+'
+        assert paginator.count_strategy_name == 'capped'
+
+    def test_it_builds_the_response_without_querying(self):
+        paginator, page, _ = self.paginate()
+        with CaptureQueriesContext(connection) as queries:
+            response = paginator.get_paginated_response(page)
+        assert len(queries) == 0
+        assert 'start_from_id={}'.format(self.models[4].id) in \
+            response.data['next']
+
+
+@pytest.mark.django_db(databases=['default', 'shard'])
+class TestAsyncViewSet:
+
+    def setup(self):
+        self.start_of_test = timezone.now()
+        self.models = [
+            ModelWithModified.objects.create(n=n) for n in range(6)
+        ]
+
+    def list(self, params, viewset_class=AsyncViewSet):
+        viewset = viewset_class(action_map={'get': 'list'})
+        request = viewset.initialize_request(factory.get('/data/', params))
+        viewset.request = request
+        viewset.format_kwarg = None
+        viewset.args, viewset.kwargs = (), {}
+        return async_to_sync(viewset.list)(request)
+
+    def test_it_lists_a_time_ordered_page(self):
+        response = self.list({
+            'modified_from': self.start_of_test.isoformat(), 'limit': 4})
+        assert response.data['results'] == self.models[:4]
+        assert response.data['count'] == 6
+        assert 'start_from_id={}'.format(self.models[4].id) in \
+            response.data['next']
+
+    def test_it_lists_normally_without_time_ordering(self):
+        response = self.list({})
+        assert response.data['results'] == self.models[:5]
+
+    def test_it_bounds_snapshots_without_blocking(self):
+        versions = [ModelWithVersion.objects.create(n=n) for n in range(3)]
+        response = self.list(
+            {'version_from': 0, 'limit': 2}, AsyncViewSetWithVersionSnapshot)
+        assert response.data['results'] == versions[:2]
+        assert 'version_until=3' in response.data['next']
+
+    def test_it_lists_sharded_pages(self):
+        create_at(ModelWithModified, self.start_of_test, using='shard',
+                  n=100)
+        response = self.list({
+            'modified_from': self.start_of_test.isoformat(), 'limit': 10},
+            AsyncShardedViewSet)
+        assert sorted(item.n for item in response.data['results']) == \
+            [0, 1, 2, 3, 4, 5, 100]
+        assert 'cursor=' in response.data['next']
+
+    def test_it_lists_values_pages(self):
+        response = self.list({
+            'modified_from': self.start_of_test.isoformat(), 'limit': 4},
+            AsyncViewSetWithValues)
+        data = json.loads(response.content)
+        assert [item['n'] for item in data['results']] == [0, 1, 2, 3]
+        assert 'start_from_id={}'.format(self.models[4].id) in data['next']
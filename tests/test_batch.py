@@ -0,0 +1,133 @@
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.test import APIRequestFactory
+from rest_framework.viewsets import ReadOnlyModelViewSet
+
+from timeordered_pagination.cursors import decode_cursor
+from timeordered_pagination.views import TimeOrderedPaginationViewSetMixin
+from tests.models import ModelWithNaturalKey
+from tests.utils import an_hour_ago, create_at
+from tests.views import PassThroughSerializer, ViewSetWithCursor
+
+
+factory = APIRequestFactory()
+
+
+class BatchViewSet(TimeOrderedPaginationViewSetMixin, ReadOnlyModelViewSet):
+    queryset = ModelWithNaturalKey.objects.all()
+    serializer_class = PassThroughSerializer
+    cursor_query_param = 'cursor'
+    batch_filter_fields = ('tenant',)
+    max_batch_size = 3
+
+
+@pytest.mark.django_db
+class TestBatch:
+
+    def setup(self):
+        self.an_hour_ago = an_hour_ago()
+        for n in range(9):
+            create_at(ModelWithNaturalKey,
+                      self.an_hour_ago + timedelta(seconds=n),
+                      tenant='tenant-{}'.format(n % 3), n=n)
+        self.view = BatchViewSet.as_view({'post': 'batch'})
+
+    def post(self, *feeds):
+        request = factory.post('/data/batch/', {'feeds': list(feeds)},
+                               format='json')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.view(request)
+        return response, queries
+
+    def feed(self, tenant, **params):
+        params.setdefault('modified_from', self.an_hour_ago.isoformat())
+        return dict(params, filter={'tenant': tenant})
+
+    def summarize(self, response):
+        return [[item.n for item in feed['results']]
+                for feed in response.data['feeds']]
+
+    def test_it_returns_a_page_per_feed(self):
+        response, _ = self.post(self.feed('tenant-0'),
+                                self.feed('tenant-1', limit=2),
+                                {'modified_from': self.an_hour_ago.isoformat(),
+                                 'limit': 4})
+        assert response.status_code == 200
+        assert self.summarize(response) == [[0, 3, 6], [1, 4], [0, 1, 2, 3]]
+
+    def test_the_next_cursor_continues_each_feed(self):
+        response, _ = self.post(self.feed('tenant-1', limit=2))
+        next_cursor = response.data['feeds'][0]['next']
+        assert decode_cursor(next_cursor).inclusive is False
+
+        response, _ = self.post({'filter': {'tenant': 'tenant-1'},
+                                 'cursor': next_cursor, 'limit': 2})
+        assert self.summarize(response) == [[7]]
+
+        last_cursor = response.data['feeds'][0]['next']
+        response, _ = self.post({'filter': {'tenant': 'tenant-1'},
+                                 'cursor': last_cursor})
+        assert self.summarize(response) == [[]]
+        assert response.data['feeds'][0]['next'] == last_cursor
+
+    def test_a_feed_without_a_position_starts_at_the_beginning(self):
+        response, _ = self.post({'filter': {'tenant': 'tenant-2'}})
+        assert self.summarize(response) == [[2, 5, 8]]
+
+    def test_it_reads_every_feed_in_one_query(self):
+        response, queries = self.post(self.feed('tenant-0', limit=2),
+                                      self.feed('tenant-2', limit=2),
+                                      self.feed('tenant-0', limit=1))
+        assert self.summarize(response) == [[0, 3], [2, 5], [0]]
+        assert len(queries) == 1
+        assert 'UNION ALL' in queries[0]['sql']
+
+    def test_it_limits_each_feed_with_a_window_function(self, monkeypatch):
+        monkeypatch.setattr(connection.features,
+                            'supports_slicing_ordering_in_compound', False)
+        response, queries = self.post(
+            self.feed('tenant-0', limit=2),
+            self.feed('tenant-1', modified_from=(
+                self.an_hour_ago + timedelta(seconds=2)).isoformat()))
+        assert self.summarize(response) == [[0, 3], [4, 7]]
+        assert len(queries) == 1
+        assert 'ROW_NUMBER()' in queries[0]['sql']
+
+    def test_it_reads_one_query_per_feed_otherwise(self, monkeypatch):
+        monkeypatch.setattr(connection.features,
+                            'supports_slicing_ordering_in_compound', False)
+        monkeypatch.setattr(connection.features,
+                            'supports_over_clause', False)
+        response, queries = self.post(self.feed('tenant-0', limit=2),
+                                      self.feed('tenant-2', limit=2))
+        assert self.summarize(response) == [[0, 3], [2, 5]]
+        assert len(queries) == 2
+
+    @pytest.mark.parametrize('body', [
+        {},
+        {'feeds': []},
+        {'feeds': [{}] * 4},
+        {'feeds': ['tenant-0']},
+        {'feeds': [{'filter': {'n': 1}}]},
+        {'feeds': [{'modified_from': 'yesterday'}]},
+        {'feeds': [{'modified_before': '2017-01-01'}]},
+    ])
+    def test_it_rejects_invalid_batches_without_querying(self, body):
+        request = factory.post('/data/batch/', body, format='json')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.view(request)
+        assert response.status_code == 400
+        assert len(queries) == 0
+
+    def test_it_rejects_invalid_cursors(self):
+        response, _ = self.post({'cursor': 12})
+        assert response.status_code == 404
+
+    def test_it_is_only_routed_when_enabled(self):
+        assert [action.__name__ for action in
+                BatchViewSet.get_extra_actions()] == ['batch']
+        assert ViewSetWithCursor.get_extra_actions() == []
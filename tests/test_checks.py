@@ -0,0 +1,121 @@
+from io import StringIO
+
+import mock
+import pytest
+from django.core.management import call_command
+
+from timeordered_pagination.checks import (
+    check_keyset_indexes, check_replica_target_fields,
+    has_database_keyset_index, has_declared_keyset_index,
+    iter_timeordered_viewsets)
+from timeordered_pagination.replicas import FixedLagDetector
+from tests.models import ModelWithModified, ModelWithAnotherField
+from tests.test_versions import ViewSetWithVersion
+from tests.views import ViewSetWithModified, ViewSetWithAnotherField
+
+
+class ViewSetWithReplica(ViewSetWithModified):
+    replica_aliases = ['shard']
+    replica_lag_detector = FixedLagDetector(1)
+
+
+class ViewSetWithVersionReplica(ViewSetWithVersion):
+    replica_aliases = ['shard']
+    replica_lag_detector = FixedLagDetector(1)
+
+
+class TestIterTimeOrderedViewSets:
+
+    def test_it_finds_each_viewset_in_the_url_configuration_once(self):
+        viewsets = [viewset for _, viewset in iter_timeordered_viewsets()]
+        assert viewsets == [ViewSetWithModified, ViewSetWithAnotherField]
+
+    def test_it_includes_the_url_pattern(self):
+        paths = [path for path, _ in iter_timeordered_viewsets()]
+        assert paths[0].startswith('^')
+        assert 'data' in paths[0]
+
+
+class TestIndexDetection:
+
+    def test_it_finds_declared_indexes(self):
+        assert has_declared_keyset_index(ViewSetWithModified,
+                                         ModelWithModified)
+
+    def test_it_reports_missing_declared_indexes(self):
+        assert not has_declared_keyset_index(ViewSetWithAnotherField,
+                                             ModelWithAnotherField)
+
+    @pytest.mark.django_db
+    def test_it_finds_indexes_in_the_database(self):
+        assert has_database_keyset_index(ViewSetWithModified,
+                                         ModelWithModified)
+
+    @pytest.mark.django_db
+    def test_it_reports_indexes_missing_from_the_database(self):
+        assert not has_database_keyset_index(ViewSetWithAnotherField,
+                                             ModelWithAnotherField)
+
+
+class TestCheckKeysetIndexes:
+
+    def test_it_warns_about_models_without_a_keyset_index(self):
+        errors = check_keyset_indexes()
+        assert [error.id for error in errors] == \
+            ['timeordered_pagination.W001']
+        assert errors[0].obj == ViewSetWithAnotherField
+        assert "'another_field', 'id'" in errors[0].msg
+
+    @pytest.mark.django_db
+    def test_it_introspects_the_database_when_asked_to(self):
+        errors = check_keyset_indexes(databases=['default'])
+        assert [error.obj for error in errors] == [ViewSetWithAnotherField]
+
+    def test_it_only_checks_the_given_apps(self):
+        from django.apps import apps
+        assert check_keyset_indexes(
+            app_configs=[apps.get_app_config('auth')]) == []
+
+
+class TestCheckReplicaTargetFields:
+
+    def check(self, *viewsets):
+        with mock.patch(
+                'timeordered_pagination.checks.iter_timeordered_viewsets',
+                return_value=[('^data/$', viewset) for viewset in viewsets]):
+            return check_replica_target_fields()
+
+    def test_it_reports_replicas_without_a_timestamp_target(self):
+        errors = self.check(ViewSetWithVersionReplica, ViewSetWithVersion,
+                            ViewSetWithReplica)
+        assert [error.id for error in errors] == \
+            ['timeordered_pagination.E001']
+        assert errors[0].obj == ViewSetWithVersionReplica
+
+    def test_the_url_configuration_passes(self):
+        assert check_replica_target_fields() == []
+
+
+@pytest.mark.django_db
+class TestExplainCommand:
+
+    def setup(self):
+        ModelWithModified.objects.bulk_create(
+            ModelWithModified(n=n) for n in range(20))
+
+    def call(self, *args):
+        out = StringIO()
+        call_command('timeordered_explain', *args, stdout=out)
+        return out.getvalue()
+
+    def test_it_explains_the_first_and_deep_pages_of_each_viewset(self):
+        output = self.call('--offset', '10')
+        assert '(ViewSetWithModified)' in output
+        assert '  first page: ' in output
+        assert '  deep page: ' in output
+        assert 'USING INDEX' in output
+
+    def test_it_skips_viewsets_without_items(self):
+        output = self.call()
+        assert '(ViewSetWithAnotherField)\n  skipped: there are no items' \
+            in output
@@ -0,0 +1,196 @@
+import json
+
+import pytest
+from mock import Mock, patch
+
+from django.db import connection
+from django.db.models.sql.query import Query
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from rest_framework.test import APIRequestFactory
+
+from timeordered_pagination.counts import (
+    NoCount, ExactCount, CappedCount, EstimatedCount, CursorCount)
+from timeordered_pagination.pagination import TimeOrderedPagination
+from tests.models import ModelWithModified
+from tests.views import ViewSetWithModified
+
+
+factory = APIRequestFactory()
+
+
+class FakeCursor(object):
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = [(column,) for column in connection.columns]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def execute(self, sql, params):
+        self.connection.executed.append((sql, params))
+
+    def fetchone(self):
+        return self.connection.row
+
+
+class FakeConnection(object):
+    """
+    A connection to a 'vendor' database whose queries all return 'row'.
+    """
+
+    def __init__(self, vendor, row, columns=('QUERY PLAN',)):
+        self.vendor = vendor
+        self.row = row
+        self.columns = columns
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+@pytest.mark.django_db
+class TestCountStrategies:
+
+    def setup(self):
+        self.start_of_test = timezone.now()
+        self.models = [
+            ModelWithModified.objects.create(n=n) for n in range(6)
+        ]
+        self.queryset = ModelWithModified.objects.order_by('modified', 'id')
+        self.paginator = TimeOrderedPagination(
+            'modified', 'modified_after', 'modified_from', 'id',
+            'start_from_id')
+        self.paginator.request = Mock()
+        self.paginator.request.query_params = {}
+
+    def test_no_count_does_not_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            count = NoCount().get_count(self.queryset, self.paginator)
+        assert count == (None, 'none')
+        assert len(queries) == 0
+
+    def test_exact_count(self):
+        assert ExactCount().get_count(self.queryset, self.paginator) == \
+            (6, 'exact')
+
+    def test_capped_count_below_the_threshold(self):
+        assert CappedCount(10).get_count(self.queryset, self.paginator) == \
+            (6, 'capped')
+
+    def test_capped_count_above_the_threshold(self):
+        assert CappedCount(3).get_count(self.queryset, self.paginator) == \
+            ('3+', 'capped')
+
+    def test_estimated_count_falls_back_to_exact_count_on_sqlite(self):
+        assert EstimatedCount().get_count(self.queryset, self.paginator) == \
+            (6, 'exact')
+
+    def estimate(self, connection, queryset=None):
+        queryset = self.queryset if queryset is None else queryset
+        with patch('timeordered_pagination.counts.connections',
+                   {queryset.db: connection}):
+            return EstimatedCount().get_count(queryset, self.paginator)
+
+    def test_estimated_count_on_postgresql(self):
+        plan = [{'Plan': {'Node Type': 'Seq Scan', 'Plan Rows': 1234,
+                          'Total Cost': 22.5}}]
+        connection = FakeConnection('postgresql', [plan])
+        assert self.estimate(connection) == (1234, 'estimated')
+        sql, params = connection.executed[0]
+        assert sql.startswith('EXPLAIN (FORMAT JSON) SELECT ')
+        assert 'ORDER BY' not in sql
+
+    def test_estimated_count_parses_json_plans(self):
+        plan = json.dumps([{'Plan': {'Plan Rows': 7}}])
+        connection = FakeConnection('postgresql', [plan])
+        assert self.estimate(connection) == (7, 'estimated')
+
+    def test_estimated_count_on_mysql(self):
+        connection = FakeConnection(
+            'mysql', [1, 'SIMPLE', 'tests_modelwithmodified', None, 'range',
+                      'modified', 'modified', '8', None, 200, 25.0, None],
+            columns=['id', 'select_type', 'table', 'partitions', 'type',
+                     'possible_keys', 'key', 'key_len', 'ref', 'rows',
+                     'filtered', 'Extra'])
+        assert self.estimate(connection) == (50, 'estimated')
+        sql, params = connection.executed[0]
+        assert sql.startswith('EXPLAIN SELECT ')
+
+    def test_estimated_count_on_mysql_without_filtered(self):
+        connection = FakeConnection('mysql', [1, 300, None],
+                                    columns=['id', 'rows', 'filtered'])
+        assert self.estimate(connection) == (300, 'estimated')
+
+    def test_estimated_count_compiles_for_the_querysets_database(self):
+        plan = [{'Plan': {'Plan Rows': 3}}]
+        connection = FakeConnection('postgresql', [plan])
+        with patch.object(Query, 'get_compiler', autospec=True,
+                          side_effect=Query.get_compiler) as get_compiler:
+            assert self.estimate(connection, self.queryset.using('shard')) \
+                == (3, 'estimated')
+        assert get_compiler.call_args[0][1] == 'shard'
+
+    def test_cursor_count_counts_if_nothing_is_carried(self):
+        assert CursorCount().get_count(self.queryset, self.paginator) == \
+            (6, 'exact')
+
+    def test_cursor_count_uses_the_carried_count(self):
+        self.paginator.request.query_params = {'count': '4'}
+        with CaptureQueriesContext(connection) as queries:
+            count = CursorCount().get_count(self.queryset, self.paginator)
+        assert count == (4, 'cursor')
+        assert len(queries) == 0
+
+
+@pytest.mark.django_db
+class TestCountStrategiesInViews:
+
+    def setup(self):
+        self.start_of_test = timezone.now()
+        self.models = [
+            ModelWithModified.objects.create(n=n) for n in range(6)
+        ]
+
+    def get_view(self, count_strategy):
+        class ViewSet(ViewSetWithModified):
+            count_strategy_override = count_strategy
+        return ViewSet.as_view({'get': 'list'})
+
+    def test_it_reports_the_exact_count_by_default(self):
+        response = ViewSetWithModified.as_view({'get': 'list'})(factory.get(
+            '/data/', {'modified_from': self.start_of_test.isoformat()}))
+        assert response.data['count'] == 6
+        assert response.data['count_strategy'] == 'exact'
+
+    def test_it_omits_the_count(self):
+        response = self.get_view(NoCount())(factory.get(
+            '/data/', {'modified_from': self.start_of_test.isoformat()}))
+        assert response.data['count'] is None
+        assert response.data['count_strategy'] == 'none'
+
+    def test_it_caps_the_count(self):
+        response = self.get_view(CappedCount(2))(factory.get(
+            '/data/', {'modified_from': self.start_of_test.isoformat()}))
+        assert response.data['count'] == '2+'
+        assert response.data['count_strategy'] == 'capped'
+
+    def test_it_carries_the_count_forward_in_the_next_link(self):
+        view = self.get_view(CursorCount())
+        response = view(factory.get('/data/', {
+            'modified_from': self.start_of_test.isoformat(), 'limit': 4}))
+        assert response.data['count'] == 6
+        assert 'count=2' in response.data['next']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = view(factory.get(response.data['next']))
+        assert response.data['count'] == 2
+        assert response.data['count_strategy'] == 'cursor'
+        assert response.data['results'] == self.models[4:]
+        # only the page and the (empty) next item probe, no count
+        assert len(queries) == 2
@@ -0,0 +1,142 @@
+import uuid
+from datetime import datetime
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from django.utils import timezone
+
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from timeordered_pagination.cursors import (
+    Cursor, InvalidCursor, UTC, decode_cursor, decode_cursors, encode_cursor,
+    encode_cursors)
+from tests.models import ModelWithModified
+from tests.views import ViewSetWithCursor
+
+
+factory = APIRequestFactory()
+
+
+class TestCursorTokens:
+
+    @pytest.mark.parametrize('cursor', [
+        Cursor(datetime(2017, 1, 2, 3, 4, 5, 678901, tzinfo=UTC), 123),
+        Cursor(datetime(2017, 1, 2, 3, 4, 5, 678901), 123),
+        Cursor(datetime(1960, 1, 1), None, inclusive=False),
+        Cursor(12345, 'a string tie-breaker'),
+        Cursor(-1, uuid.UUID('12345678-1234-5678-1234-567812345678')),
+        Cursor(datetime(2017, 1, 2), 123, inclusive=False, reverse=True),
+        Cursor(datetime(2017, 1, 2), (
+            'tenant', uuid.UUID('12345678-1234-5678-1234-567812345678'))),
+    ])
+    def test_it_round_trips_cursors(self, cursor):
+        assert decode_cursor(encode_cursor(cursor)) == cursor
+
+    def test_it_decodes_typed_values(self):
+        position = datetime(2017, 1, 2, tzinfo=UTC)
+        cursor = decode_cursor(encode_cursor(Cursor(position, 7)))
+        assert isinstance(cursor.position, datetime)
+        assert cursor.position == position
+        assert cursor.start_from == 7
+
+    def test_it_is_compact_and_url_safe(self):
+        token = encode_cursor(Cursor(timezone.now(), 2 ** 40))
+        assert len(token) <= 48
+        assert all(c.isalnum() or c in '-_' for c in token)
+
+    def test_it_rejects_tampered_tokens(self):
+        token = encode_cursor(Cursor(datetime(2017, 1, 1), 1))
+        tampered = encode_cursor(Cursor(datetime(2017, 1, 1), 2))
+        # keep the original signature, but change the payload
+        forged = tampered[:-16] + token[-16:]
+        with pytest.raises(InvalidCursor):
+            decode_cursor(forged)
+
+    @pytest.mark.parametrize('token', ['', 'not a token', '!!!!', 'AAAA'])
+    def test_it_rejects_malformed_tokens(self, token):
+        with pytest.raises(InvalidCursor):
+            decode_cursor(token)
+
+    def test_it_rejects_values_it_cannot_encode(self):
+        with pytest.raises(TypeError):
+            encode_cursor(Cursor(True))
+
+    def test_it_round_trips_compound_cursors(self):
+        cursors = {
+            'tests.modelwithmodified': Cursor(
+                datetime(2017, 1, 2, 3, 4, 5, 678901, tzinfo=UTC), 123,
+                inclusive=False),
+            'tests.modelwithanotherfield': Cursor(u'2017-01-01', None),
+        }
+        assert decode_cursors(encode_cursors(cursors)) == cursors
+        assert decode_cursors(encode_cursors({})) == {}
+
+    def test_it_does_not_mix_up_single_and_compound_cursors(self):
+        with pytest.raises(InvalidCursor):
+            decode_cursor(encode_cursors({'a': Cursor(1)}))
+        with pytest.raises(InvalidCursor):
+            decode_cursors(encode_cursor(Cursor(1)))
+
+
+@pytest.mark.django_db
+class TestCursorParam:
+
+    def setup(self):
+        self.start_of_test = timezone.now()
+        self.models = [
+            ModelWithModified.objects.create(n=n) for n in range(10)
+        ]
+        self.view = ViewSetWithCursor.as_view({'get': 'list'})
+
+    def test_it_builds_next_links_with_a_cursor(self):
+        response = self.view(factory.get('/data/', {
+            'modified_from': self.start_of_test.isoformat(), 'limit': 3}))
+        assert response.data['results'] == self.models[:3]
+
+        next_link = response.data['next']
+        assert 'modified_from' not in next_link
+        assert 'start_from_id' not in next_link
+        assert 'limit=3' in next_link
+        token = parse_qs(urlparse(next_link).query)['cursor'][0]
+        assert decode_cursor(token) == \
+            Cursor(self.models[3].modified, self.models[3].id)
+
+    def test_it_walks_the_feed_with_cursors(self):
+        response = self.view(factory.get('/data/', {
+            'modified_from': self.start_of_test.isoformat(), 'limit': 3}))
+        results = list(response.data['results'])
+        while response.data['next']:
+            response = self.view(factory.get(response.data['next']))
+            results.extend(response.data['results'])
+        assert results == self.models
+
+    def test_it_accepts_exclusive_cursors(self):
+        token = encode_cursor(Cursor(self.models[4].modified,
+                                     self.models[4].id, inclusive=False))
+        response = self.view(factory.get('/data/', {'cursor': token}))
+        assert response.data['results'] == self.models[5:10]
+
+    def test_it_keeps_the_parsed_cursor_on_the_request(self):
+        token = encode_cursor(Cursor(self.models[4].modified,
+                                     self.models[4].id))
+        viewset = ViewSetWithCursor()
+        viewset.request = Request(factory.get('/data/', {'cursor': token}))
+        cursor = viewset.get_timeordered_cursor()
+        assert viewset.request.timeordered_cursor is cursor
+        assert cursor.position == self.models[4].modified
+
+    def test_it_returns_not_found_for_invalid_cursors(self):
+        response = self.view(factory.get('/data/', {'cursor': 'nonsense'}))
+        assert response.status_code == 404
+        assert response.data['detail'] == 'Invalid cursor'
+
+    def test_the_other_query_params_still_work(self):
+        response = self.view(factory.get('/data/', {
+            'modified_from': self.models[2].modified.isoformat(),
+            'start_from_id': self.models[2].id}))
+        assert response.data['results'] == self.models[2:7]
+
+        response = self.view(factory.get('/data/', {
+            'modified_after': self.models[7].modified.isoformat()}))
+        assert response.data['results'] == self.models[8:]
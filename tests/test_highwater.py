@@ -0,0 +1,216 @@
+import threading
+import time
+from datetime import timedelta
+
+import mock
+import pytest
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from rest_framework.test import APIRequestFactory
+
+from timeordered_pagination.highwater import (
+    HighWaterMarkQuerySet, get_high_water_mark)
+from timeordered_pagination.views import TimeOrderedPaginationViewSetMixin
+from tests.models import ModelWithModified
+from tests.test_replicas import GetQuerySetViewSet
+from tests.views import ViewSetWithModified
+
+
+factory = APIRequestFactory()
+
+
+class ViewSetWithHighWaterMark(ViewSetWithModified):
+    high_water_mark_cache = 'default'
+
+
+class ViewSetWithHighWaterMarkAndGetQuerySet(
+        TimeOrderedPaginationViewSetMixin, GetQuerySetViewSet):
+    high_water_mark_cache = 'default'
+
+
+def get_mark():
+    return get_high_water_mark(ModelWithModified, 'modified', 'id')
+
+
+@pytest.mark.django_db
+class TestHighWaterMark:
+
+    def setup(self):
+        caches['default'].clear()
+        self.models = [
+            ModelWithModified.objects.create(n=n) for n in range(3)
+        ]
+
+    def key(self, model):
+        return (model.modified, model.pk)
+
+    def test_it_is_reconciled_from_the_database(self):
+        with CaptureQueriesContext(connection) as queries:
+            assert get_mark().get() == self.key(self.models[-1])
+            assert get_mark().get() == self.key(self.models[-1])
+        assert len(queries) == 1
+
+    def test_it_is_none_without_items(self):
+        ModelWithModified.objects.all().delete()
+        assert get_mark().get() is None
+
+    def test_it_is_raised_by_saves(self, django_capture_on_commit_callbacks):
+        get_mark().get()
+        with django_capture_on_commit_callbacks(execute=True):
+            self.models[0].save()
+        with CaptureQueriesContext(connection) as queries:
+            assert get_mark().get() == self.key(self.models[0])
+        assert len(queries) == 0
+
+    def test_it_is_only_raised_once_saves_commit(
+            self, django_capture_on_commit_callbacks):
+        get_mark().get()
+        with django_capture_on_commit_callbacks() as callbacks:
+            self.models[0].save()
+            assert get_mark().get() == self.key(self.models[-1])
+        for callback in callbacks:
+            callback()
+        assert get_mark().get() == self.key(self.models[0])
+
+    def test_it_is_raised_by_bulk_updates(
+            self, django_capture_on_commit_callbacks):
+        get_mark().get()
+        self.models[1].modified = timezone.now() + timedelta(hours=1)
+        with django_capture_on_commit_callbacks(execute=True):
+            HighWaterMarkQuerySet(ModelWithModified).bulk_update(
+                [self.models[1]], ['modified'])
+        assert get_mark().get() == self.key(self.models[1])
+
+    def test_bumps_wait_for_the_lock(self):
+        mark = get_mark()
+        mark.get()
+        self.models[0].modified = timezone.now() + timedelta(hours=1)
+        bumping = threading.Thread(target=mark.bump, args=([self.models[0]],))
+        with mark.lock():
+            bumping.start()
+            time.sleep(0.05)
+            # e.g. a reconcile that read the database before the bump
+            assert bumping.is_alive()
+        bumping.join()
+        assert mark.get() == self.key(self.models[0])
+
+    def test_reconciles_do_not_lower_a_mark_raised_while_waiting(self):
+        mark = get_mark()
+        later = timezone.now() + timedelta(hours=1)
+        reconciling = threading.Thread(target=mark.reconcile)
+        with mark.lock() as cache:
+            reconciling.start()
+            time.sleep(0.05)
+            # Another request reconciles and raises the mark meanwhile
+            cache.set(mark.cache_key, ((later, 0), time.time()), None)
+        reconciling.join()
+        assert mark.get() == (later, 0)
+
+    def test_it_is_not_lowered_by_older_items(self):
+        get_mark().get()
+        ModelWithModified.objects.filter(pk=self.models[0].pk).update(
+            modified=timezone.now() + timedelta(hours=1))
+        self.models[1].modified = timezone.now() - timedelta(hours=1)
+        get_mark().bump([self.models[1]])
+        assert get_mark().get() == self.key(self.models[-1])
+
+    def test_it_is_periodically_reconciled(self):
+        get_mark().get()
+        later = timezone.now() + timedelta(hours=1)
+        ModelWithModified.objects.filter(pk=self.models[0].pk).update(
+            modified=later)
+        assert get_mark().get() == self.key(self.models[-1])
+        with mock.patch('timeordered_pagination.highwater.time.time',
+                        return_value=10 ** 10):
+            assert get_mark().get() == (later, self.models[0].pk)
+
+
+@pytest.mark.django_db
+class TestHighWaterMarkFastPath:
+
+    def setup(self):
+        caches['default'].clear()
+        self.models = [
+            ModelWithModified.objects.create(n=n) for n in range(3)
+        ]
+        self.last = self.models[-1]
+        self.view = ViewSetWithHighWaterMark.as_view({'get': 'list'})
+        # Reconcile the mark
+        get_mark().get()
+
+    def get(self, params, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.view(factory.get('/data/', params, **headers))
+        return response, len(queries)
+
+    def test_it_returns_an_empty_page_without_querying(self):
+        response, queries = self.get(
+            {'modified_after': self.last.modified.isoformat()})
+        assert queries == 0
+        assert response.status_code == 200
+        assert response.data['results'] == []
+        assert response.data['next'] is None
+        assert response.data['count'] == 0
+        assert 'ETag' in response
+
+    def test_it_returns_not_modified_for_a_matching_etag(self):
+        params = {'modified_after': self.last.modified.isoformat()}
+        response, _ = self.get(params)
+        not_modified, queries = self.get(
+            params, HTTP_IF_NONE_MATCH=response['ETag'])
+        assert queries == 0
+        assert not_modified.status_code == 304
+        assert not_modified['ETag'] == response['ETag']
+
+    def test_empty_pages_from_the_slow_path_have_the_same_etag(self):
+        fast, _ = self.get({'modified_after': self.last.modified.isoformat()})
+        # The mark is now too high, so the page is queried
+        self.last.delete()
+        slow, queries = self.get(
+            {'modified_after': self.models[1].modified.isoformat()})
+        assert queries > 0
+        assert slow.data['results'] == []
+        assert slow['ETag'] == fast['ETag']
+
+    def test_it_handles_start_from_cursors(self):
+        response, queries = self.get({
+            'modified_from': self.last.modified.isoformat(),
+            'start_from_id': self.last.pk + 1,
+        })
+        assert queries == 0
+        assert response.data['results'] == []
+
+        response, queries = self.get({
+            'modified_from': self.last.modified.isoformat(),
+            'start_from_id': self.last.pk,
+        })
+        assert queries > 0
+        assert [item.n for item in response.data['results']] == [2]
+        assert 'ETag' not in response
+
+    def test_it_queries_for_positions_before_the_mark(self):
+        response, queries = self.get(
+            {'modified_after': self.models[1].modified.isoformat()})
+        assert queries > 0
+        assert [item.n for item in response.data['results']] == [2]
+
+    def test_it_sees_new_items(self, django_capture_on_commit_callbacks):
+        params = {'modified_after': self.last.modified.isoformat()}
+        self.get(params)
+        with django_capture_on_commit_callbacks(execute=True):
+            ModelWithModified.objects.create(n=3)
+        response, _ = self.get(params)
+        assert [item.n for item in response.data['results']] == [3]
+
+    def test_it_works_without_a_queryset_attribute(self):
+        view = ViewSetWithHighWaterMarkAndGetQuerySet.as_view(
+            {'get': 'list'})
+        with CaptureQueriesContext(connection) as queries:
+            response = view(factory.get(
+                '/data/', {'modified_after': self.last.modified.isoformat()}))
+        assert len(queries) == 0
+        assert response.status_code == 200
+        assert response.data['results'] == []
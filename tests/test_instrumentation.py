@@ -0,0 +1,102 @@
+import logging
+from datetime import timedelta
+
+import mock
+import pytest
+from django.utils import timezone
+
+from rest_framework.test import APIRequestFactory
+
+from timeordered_pagination.instrumentation import LoggingSink, StatsdSink
+from tests.models import ModelWithModified
+from tests.views import ViewSetWithModified, ViewSetWithPrefetchedNextItem
+
+
+factory = APIRequestFactory()
+
+
+class Sink(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, metrics):
+        self.calls.append(metrics)
+
+
+@pytest.mark.django_db
+class TestInstrumentation:
+
+    def setup(self):
+        self.an_hour_ago = timezone.now() - timedelta(hours=1)
+        for n in range(7):
+            ModelWithModified.objects.create(n=n)
+        ModelWithModified.objects.update(modified=self.an_hour_ago)
+        self.params = {'modified_from': self.an_hour_ago.isoformat()}
+
+    def get(self, viewset, sink, params=None):
+        view = viewset.as_view({'get': 'list'}, metrics_sink=sink)
+        return view(factory.get('/data/', params or self.params))
+
+    def test_it_reports_each_phase(self):
+        sink = Sink()
+        response = self.get(ViewSetWithModified, sink)
+        assert len(response.data['results']) == 5
+        assert len(sink.calls) == 1
+        metrics = sink.calls[0]
+        assert metrics['path'] == '/data/'
+        assert metrics['rows'] == 5
+        assert metrics['limit'] == 5
+        assert metrics['count_strategy'] == 'exact'
+        assert 3500 < metrics['cursor_age'] < 3700
+        phases = metrics['phases']
+        assert sorted(phases) == \
+            ['count', 'link', 'next_item', 'page', 'serialize']
+        assert phases['page']['queries'] == 1
+        assert phases['count']['queries'] == 1
+        assert phases['next_item']['queries'] == 2
+        assert phases['serialize']['queries'] == 0
+        assert phases['link']['queries'] == 0
+        for phase in phases.values():
+            assert phase['seconds'] >= 0
+
+    def test_it_reports_prefetched_pages(self):
+        sink = Sink()
+        self.get(ViewSetWithPrefetchedNextItem, sink)
+        phases = sink.calls[0]['phases']
+        assert phases['page']['queries'] == 1
+        assert phases['next_item']['queries'] == 0
+
+    def test_it_reports_empty_pages(self):
+        sink = Sink()
+        self.get(ViewSetWithModified, sink, {
+            'modified_after': self.an_hour_ago.isoformat()})
+        metrics = sink.calls[0]
+        assert metrics['rows'] == 0
+        assert metrics['cursor_age'] is None
+        assert 'link' not in metrics['phases']
+
+    def test_it_does_nothing_without_a_sink(self):
+        view = ViewSetWithModified.as_view({'get': 'list'})
+        with mock.patch('timeordered_pagination.pagination.measure_phase') \
+                as measure_phase:
+            response = view(factory.get('/data/', self.params))
+        assert len(response.data['results']) == 5
+        assert not measure_phase.called
+
+    def test_the_logging_sink_logs_a_line(self, caplog):
+        with caplog.at_level(logging.INFO):
+            self.get(ViewSetWithModified, LoggingSink())
+        assert len(caplog.records) == 1
+        message = caplog.records[0].getMessage()
+        assert message.startswith('/data/ rows=5 limit=5 cursor_age=')
+        assert 'count=' in message and 'next_item=' in message
+
+    def test_the_statsd_sink_sends_stats(self):
+        client = mock.Mock()
+        self.get(ViewSetWithModified, StatsdSink(client, prefix='feed'))
+        client.timing.assert_any_call('feed.count.time', mock.ANY)
+        client.incr.assert_any_call('feed.next_item.queries', 2)
+        client.gauge.assert_any_call('feed.rows', 5)
+        client.gauge.assert_any_call('feed.cursor_age', mock.ANY)
+        assert client.timing.call_count == 5
@@ -0,0 +1,116 @@
+import pytest
+from mock import patch
+
+from django.db import connection
+from django.db.models import Q
+
+from timeordered_pagination.keyset import (
+    filter_keyset, keyset_q, supports_row_values)
+from tests.models import ModelWithModified
+
+
+requires_row_values = pytest.mark.skipif(
+    not supports_row_values(connection),
+    reason='The database does not support row values')
+
+
+class TestKeysetQ:
+
+    def test_it_expands_a_single_field(self):
+        assert keyset_q(('modified',), ('X',)) == Q(modified__gte='X')
+
+    def test_it_expands_two_fields(self):
+        assert keyset_q(('modified', 'id'), ('X', 'Y'), '>=') == \
+            Q(modified__gt='X') | (Q(modified='X') & Q(id__gte='Y'))
+
+    def test_it_expands_three_fields_in_reverse(self):
+        assert keyset_q(('a', 'b', 'c'), (1, 2, 3), '<') == \
+            Q(a__lt=1) | (Q(a=1) & Q(b__lt=2)) | \
+            (Q(a=1, b=2) & Q(c__lt=3))
+
+    def test_it_rejects_unknown_operators(self):
+        with pytest.raises(ValueError):
+            keyset_q(('a',), (1,), '==')
+
+
+@pytest.mark.django_db
+class TestFilterKeyset:
+
+    def setup(self):
+        self.models = [
+            ModelWithModified.objects.create(n=n) for n in range(20)
+        ]
+        # make some ties in the modified field
+        ModelWithModified.objects.filter(n__in=range(5, 10)).update(
+            modified=self.models[5].modified)
+        self.queryset = ModelWithModified.objects.order_by('modified', 'id')
+        self.cursor = ModelWithModified.objects.get(n=7)
+
+    def filter(self, operator, row_values):
+        return list(filter_keyset(
+            self.queryset,
+            ('modified', 'id'),
+            (self.cursor.modified, self.cursor.id),
+            operator,
+            row_values=row_values))
+
+    @requires_row_values
+    def test_it_uses_a_row_value_comparison(self):
+        queryset = filter_keyset(self.queryset, ('modified', 'id'),
+                                 (self.cursor.modified, self.cursor.id))
+        assert '("tests_modelwithmodified"."modified", ' \
+            '"tests_modelwithmodified"."id") >= (' in str(queryset.query)
+
+    def test_it_can_use_the_expanded_form(self):
+        queryset = filter_keyset(self.queryset, ('modified', 'id'),
+                                 (self.cursor.modified, self.cursor.id),
+                                 row_values=False)
+        assert ' OR ' in str(queryset.query)
+
+    @pytest.mark.parametrize('operator', ['>', '>=', '<', '<='])
+    def test_both_forms_return_the_same_rows(self, operator):
+        assert self.filter(operator, True) == self.filter(operator, False)
+
+    def test_it_returns_the_rows_from_the_keyset(self):
+        assert [m.n for m in self.filter('>=', True)] == \
+            list(range(7, 20))
+        assert [m.n for m in self.filter('<', True)] == list(range(7))
+
+    def test_the_lookup_falls_back_to_the_expanded_form(self):
+        with patch('timeordered_pagination.keyset.supports_row_values') \
+                as supports:
+            supports.return_value = False
+            queryset = filter_keyset(self.queryset, ('modified', 'id'),
+                                     (self.cursor.modified, self.cursor.id))
+            assert [m.n for m in queryset] == list(range(7, 20))
+
+
+@requires_row_values
+@pytest.mark.skipif(connection.vendor != 'sqlite',
+                    reason='Compares SQLite query plans')
+@pytest.mark.django_db
+class TestKeysetQueryPlans:
+
+    def setup(self):
+        ModelWithModified.objects.bulk_create(
+            ModelWithModified(n=n) for n in range(100))
+        self.cursor = ModelWithModified.objects.order_by('id')[50]
+
+    def get_plan(self, row_values):
+        return filter_keyset(
+            ModelWithModified.objects.order_by('modified', 'id'),
+            ('modified', 'id'),
+            (self.cursor.modified, self.cursor.id),
+            row_values=row_values)[:10].explain()
+
+    def test_row_values_are_a_single_ordered_index_range_scan(self):
+        plan = self.get_plan(row_values=True)
+        assert 'SEARCH tests_modelwithmodified USING INDEX' in plan
+        assert 'MULTI-INDEX OR' not in plan
+        assert 'TEMP B-TREE' not in plan
+
+    def test_the_expanded_form_needs_more_work(self):
+        plan = self.get_plan(row_values=False)
+        assert plan != self.get_plan(row_values=True)
+        assert 'MULTI-INDEX OR' in plan or 'SCAN' in plan or \
+            'TEMP B-TREE' in plan
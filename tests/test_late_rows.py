@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+import pytest
+
+from tests.models import ModelWithModified
+from tests.utils import an_hour_ago, create_at, get_with_queries, summarize
+from tests.views import ViewSetWithModified
+
+
+class ViewSetWithLateRowLookup(ViewSetWithModified):
+    late_row_lookup = True
+
+
+@pytest.mark.django_db
+class TestLateRowLookup:
+
+    def setup(self):
+        self.an_hour_ago = an_hour_ago()
+        # modified in the reverse order of 'n', the model's default ordering
+        for n in range(8):
+            create_at(ModelWithModified,
+                      self.an_hour_ago + timedelta(seconds=10 - n), n=n)
+
+    def params(self, **params):
+        return dict(params, modified_from=self.an_hour_ago.isoformat())
+
+    def test_it_returns_the_same_pages(self):
+        url = '/data/?modified_from={}'.format(self.an_hour_ago.isoformat())
+        for _ in range(2):
+            late, _ = get_with_queries(ViewSetWithLateRowLookup, url)
+            normal, _ = get_with_queries(ViewSetWithModified, url)
+            assert summarize(late) == summarize(normal)
+            assert late.data['next'] == normal.data['next']
+            assert late.data['count'] == normal.data['count']
+            url = late.data['next']
+        assert summarize(late) == [2, 1, 0]
+
+    def test_it_fetches_the_keys_then_the_page(self):
+        response, queries = get_with_queries(ViewSetWithLateRowLookup,
+                                             self.params())
+        assert summarize(response) == [7, 6, 5, 4, 3]
+        keys, rows, count = [query['sql'] for query in queries]
+        assert keys.startswith(
+            'SELECT "tests_modelwithmodified"."modified", '
+            '"tests_modelwithmodified"."id" FROM')
+        assert 'LIMIT 6' in keys
+        assert ' IN (' in rows and 'ORDER BY' not in rows
+        assert 'COUNT' in count
+
+    def test_the_next_item_is_not_hydrated(self):
+        response, queries = get_with_queries(ViewSetWithLateRowLookup,
+                                             self.params(limit=2))
+        pks = queries[1]['sql'].split(' IN (')[1].split(')')[0].split(', ')
+        assert sorted(int(pk) for pk in pks) == \
+            sorted(item.id for item in response.data['results'])
+        next_id = ModelWithModified.objects.get(n=5).id
+        assert 'start_from_id={}'.format(next_id) in response.data['next']
+
+    def test_it_reads_reverse_pages(self):
+        response, _ = get_with_queries(ViewSetWithLateRowLookup, {
+            'modified_before': (self.an_hour_ago +
+                                timedelta(seconds=6)).isoformat(),
+            'limit': 2})
+        assert summarize(response) == [6, 5]
+        previous, _ = get_with_queries(ViewSetWithLateRowLookup,
+                                       response.data['previous'])
+        assert summarize(previous) == [7]
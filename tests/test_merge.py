@@ -0,0 +1,182 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from rest_framework import serializers
+
+from timeordered_pagination.cursors import Cursor, encode_cursors
+from timeordered_pagination.merge import (
+    FeedSource, MergedTimeOrderedFeedView, merge_sources)
+from tests.models import ModelWithAnotherField, ModelWithModified
+from tests.utils import create_at, get
+from tests.views import ModelWithModifiedSerializer
+
+
+class ModelWithAnotherFieldSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = ModelWithAnotherField
+        fields = ('id', 'n')
+
+
+class MergedFeedView(MergedTimeOrderedFeedView):
+    sources = (
+        FeedSource(ModelWithModified.objects.all(),
+                   ModelWithModifiedSerializer),
+        FeedSource(ModelWithAnotherField.objects.all(),
+                   ModelWithAnotherFieldSerializer,
+                   target_field='another_field', name='another'),
+    )
+
+
+@pytest.mark.django_db
+class TestMergedFeed:
+
+    def setup(self):
+        self.start_of_test = timezone.now() - timedelta(hours=1)
+        # Interleave the models: modified rows at even seconds and the
+        # others at odd seconds, with a tie at 10 seconds
+        for n in range(6):
+            create_at(ModelWithModified, self.at(n * 2), n=n)
+            create_at(ModelWithAnotherField, self.at(min(n * 2 + 1, 10)),
+                      field='another_field', n=n)
+        self.view = MergedFeedView.as_view()
+
+    def at(self, seconds):
+        return self.start_of_test + timedelta(seconds=seconds)
+
+    def summarize(self, response):
+        return [(result['type'], result['data']['n'])
+                for result in response.data['results']]
+
+    def test_it_merges_the_sources_in_order(self):
+        response = get(self.view, {'from': self.start_of_test.isoformat(),
+                                   'limit': 12})
+        assert self.summarize(response) == [
+            ('tests.modelwithmodified', 0), ('another', 0),
+            ('tests.modelwithmodified', 1), ('another', 1),
+            ('tests.modelwithmodified', 2), ('another', 2),
+            ('tests.modelwithmodified', 3), ('another', 3),
+            ('tests.modelwithmodified', 4), ('another', 4),
+            # Ties are ordered by source name
+            ('another', 5), ('tests.modelwithmodified', 5),
+        ]
+
+    def test_it_walks_the_feed_with_compound_cursors(self):
+        seen = []
+        url = '/feed/?limit=5'
+        for _ in range(3):
+            response = get(self.view, url)
+            seen.extend(self.summarize(response))
+            url = response.data['next']
+        assert len(seen) == 12
+        assert len(set(seen)) == 12
+        assert seen[-2:] == [('another', 5), ('tests.modelwithmodified', 5)]
+
+        response = get(self.view, url)
+        assert response.data['results'] == []
+        ModelWithAnotherField.objects.create(n=6)
+        response = get(self.view, response.data['next'])
+        assert self.summarize(response) == [('another', 6)]
+
+    def test_it_queries_each_source_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = get(self.view, {'limit': 5})
+        assert len(response.data['results']) == 5
+        assert len(queries) == 2
+
+    def test_it_starts_after_a_position(self):
+        response = get(self.view, {'after': self.at(9).isoformat(),
+                                   'limit': 3})
+        assert self.summarize(response) == [
+            ('another', 5), ('tests.modelwithmodified', 5)]
+
+    def test_the_next_link_carries_only_the_cursor(self):
+        response = get(self.view, {'from': self.start_of_test.isoformat(),
+                                   'limit': 2})
+        params = parse_qs(urlparse(response.data['next']).query)
+        assert sorted(params) == ['cursor', 'limit']
+
+    def test_it_returns_not_found_for_invalid_cursors(self):
+        response = get(self.view, {'cursor': 'not a cursor'})
+        assert response.status_code == 404
+
+    def test_it_parses_positions_with_each_source_field(self):
+        epoch = timezone.make_aware(self.at(9)).timestamp() + 0.5
+        response = get(self.view, {'after': epoch, 'limit': 3})
+        assert self.summarize(response) == [
+            ('another', 5), ('tests.modelwithmodified', 5)]
+
+    def test_it_parses_the_positions_of_cursors(self):
+        response = get(self.view, {'from': self.start_of_test.isoformat(),
+                                   'limit': 3})
+        response = get(self.view, response.data['next'])
+        assert self.summarize(response) == [
+            ('another', 1), ('tests.modelwithmodified', 2), ('another', 2)]
+
+    @pytest.mark.parametrize('cursor', [
+        Cursor(1, 2),
+        Cursor(timezone.now(), (1, 2)),
+        Cursor(timezone.now(), 'one'),
+    ])
+    def test_it_rejects_invalid_cursor_values_without_querying(self, cursor):
+        token = encode_cursors({'another': Cursor(timezone.now()),
+                                'tests.modelwithmodified': cursor})
+        with CaptureQueriesContext(connection) as queries:
+            response = get(self.view, {'cursor': token})
+        assert response.status_code == 400
+        assert list(response.data) == ['cursor']
+        assert len(queries) == 0
+
+    @pytest.mark.parametrize('params', [
+        {'from': 'yesterday'},
+        {'after': ''},
+    ])
+    def test_it_rejects_invalid_positions_without_querying(self, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = get(self.view, params)
+        assert response.status_code == 400
+        assert list(response.data) == list(params)
+        assert len(queries) == 0
+
+
+class ListSource(FeedSource):
+
+    def __init__(self, name, items):
+        super(ListSource, self).__init__(
+            ModelWithModified.objects.all(), None, name=name)
+        self.items = [ModelWithModified(id=id, modified=modified)
+                      for id, modified in items]
+
+    def get_items(self, cursor, limit):
+        return self.items[:limit]
+
+
+class TestMergeSources:
+
+    def setup(self):
+        now = timezone.now()
+        self.sources = [
+            ListSource('a', [(1, now), (2, now + timedelta(seconds=2))]),
+            ListSource('b', [(1, now), (2, now + timedelta(seconds=1))]),
+        ]
+
+    def summarize(self, merged):
+        return [(source.name, item.id) for source, item in merged]
+
+    def test_it_merges_the_sources(self):
+        merged, more = merge_sources(self.sources, {}, 3)
+        assert self.summarize(merged) == [('a', 1), ('b', 1), ('b', 2)]
+        assert more
+
+    def test_it_queries_the_sources_in_parallel(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            merged, more = merge_sources(self.sources, {}, 4, executor)
+        assert self.summarize(merged) == \
+            [('a', 1), ('b', 1), ('b', 2), ('a', 2)]
+        assert not more
@@ -0,0 +1,370 @@
+import socket
+import threading
+import time
+from collections import namedtuple
+
+import pytest
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import TestCase
+from django.utils import timezone
+
+from rest_framework.test import APIRequestFactory
+from rest_framework.viewsets import ReadOnlyModelViewSet
+
+from timeordered_pagination.aio import AsyncTimeOrderedPaginationViewSetMixin
+from timeordered_pagination.notifiers import (
+    PostgresChangeNotifier, SignalChangeNotifier, monotonic)
+from tests.models import ModelWithModified, ModelWithAnotherField
+from tests.views import PassThroughSerializer, ViewSetWithModified
+
+
+factory = APIRequestFactory()
+
+
+class FakeListener(object):
+
+    def __init__(self, on_wait):
+        self.on_wait = on_wait
+        self.waits = []
+        self.closed = False
+
+    def wait(self, timeout):
+        self.waits.append(timeout)
+        return self.on_wait()
+
+    async def await_change(self, timeout):
+        self.waits.append(timeout)
+        return await sync_to_async(self.on_wait)()
+
+    def close(self):
+        self.closed = True
+
+
+class FakeNotifier(object):
+
+    def __init__(self, on_wait):
+        self.on_wait = on_wait
+        self.listeners = []
+
+    def listen(self, model):
+        listener = FakeListener(self.on_wait)
+        listener.model = model
+        self.listeners.append(listener)
+        return listener
+
+
+class AsyncViewSetWithModified(AsyncTimeOrderedPaginationViewSetMixin,
+                               ReadOnlyModelViewSet):
+    queryset = ModelWithModified.objects.all()
+    serializer_class = PassThroughSerializer
+    ordering = 'id'
+
+
+Notify = namedtuple('Notify', 'channel payload')
+
+
+class FakePostgresCursor(object):
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def execute(self, sql):
+        self.connection.statements.append(sql)
+
+
+class FakePostgresConnection(object):
+    """
+    Stands in for a psycopg2 connection: it becomes readable when 'send'
+    is called, and 'poll' then moves the sent notifications to 'notifies'.
+    """
+
+    def __init__(self):
+        self.socket, self.server = socket.socketpair()
+        self.lock = threading.Lock()
+        self.sent = []
+        self.notifies = []
+        self.statements = []
+        self.autocommit = False
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def cursor(self):
+        return FakePostgresCursor(self)
+
+    def send(self, channel=None):
+        with self.lock:
+            if channel is not None:
+                self.sent.append(Notify(channel, ''))
+            self.server.send(b'\0')
+
+    def poll(self):
+        with self.lock:
+            self.socket.recv(4096)
+            self.notifies.extend(self.sent)
+            del self.sent[:]
+
+    def close(self):
+        self.socket.close()
+        self.server.close()
+
+
+class FakePostgresChangeNotifier(PostgresChangeNotifier):
+
+    def __init__(self, error=None):
+        super(FakePostgresChangeNotifier, self).__init__(
+            notify_on_save=False)
+        self.error = error
+        self.connections = []
+
+    def get_listen_connection(self):
+        if self.error is not None:
+            raise self.error
+        connection = FakePostgresConnection()
+        self.connections.append(connection)
+        return connection
+
+
+class TestPostgresChangeNotifier:
+
+    def setup(self):
+        self.notifier = FakePostgresChangeNotifier()
+        self.channel = self.notifier.get_channel(ModelWithModified)
+
+    def send_later(self, channel, delay=0.05):
+        timer = threading.Timer(
+            delay, self.notifier.connections[0].send, [channel])
+        timer.start()
+        return timer
+
+    def test_listeners_share_one_connection(self):
+        self.notifier.listen(ModelWithModified)
+        self.notifier.listen(ModelWithModified)
+        self.notifier.listen(ModelWithAnotherField)
+        assert len(self.notifier.connections) == 1
+        assert self.notifier.connections[0].statements == [
+            'LISTEN "timeordered_tests_modelwithmodified"',
+            'LISTEN "timeordered_tests_modelwithanotherfield"',
+        ]
+
+    def test_it_times_out_without_changes(self):
+        listener = self.notifier.listen(ModelWithModified)
+        assert not listener.wait(0.01)
+
+    def test_it_wakes_up_every_waiting_listener(self):
+        listeners = [self.notifier.listen(ModelWithModified)
+                     for _ in range(2)]
+        timer = self.send_later(self.channel)
+        try:
+            started = monotonic()
+            assert all(listener.wait(5) for listener in listeners)
+            assert monotonic() - started < 5
+        finally:
+            timer.cancel()
+
+    def test_it_sees_changes_made_before_waiting(self):
+        listener = self.notifier.listen(ModelWithModified)
+        self.notifier.connections[0].send(self.channel)
+        assert listener.wait(5)
+        assert not listener.wait(0)
+
+    def test_it_keeps_waiting_after_other_channels_are_notified(self):
+        listener = self.notifier.listen(ModelWithModified)
+        self.notifier.connections[0].send(
+            self.notifier.get_channel(ModelWithAnotherField))
+        self.notifier.connections[0].send()
+        started = monotonic()
+        assert not listener.wait(0.1)
+        assert monotonic() - started >= 0.1
+        timer = self.send_later(self.channel)
+        try:
+            assert listener.wait(5)
+        finally:
+            timer.cancel()
+
+    def test_it_raises_if_it_cannot_listen(self):
+        notifier = FakePostgresChangeNotifier(error=IOError('refused'))
+        with pytest.raises(IOError):
+            notifier.listen(ModelWithModified)
+
+
+class TestSignalChangeNotifier:
+
+    def setup(self):
+        self.notifier = SignalChangeNotifier()
+
+    def test_it_times_out_without_changes(self):
+        listener = self.notifier.listen(ModelWithModified)
+        assert not listener.wait(0.01)
+
+    def test_it_sees_changes_made_before_waiting(self):
+        listener = self.notifier.listen(ModelWithModified)
+        self.notifier.notify(ModelWithModified)
+        assert listener.wait(0)
+        # ...but only once
+        assert not listener.wait(0)
+
+    def test_it_ignores_changes_to_other_models(self):
+        listener = self.notifier.listen(ModelWithModified)
+        self.notifier.notify(ModelWithAnotherField)
+        assert not listener.wait(0)
+
+    def test_it_wakes_up_waiting_listeners(self):
+        listener = self.notifier.listen(ModelWithModified)
+        timer = threading.Timer(
+            0.05, self.notifier.notify, [ModelWithModified])
+        timer.start()
+        try:
+            started = time.time()
+            assert listener.wait(5)
+            assert time.time() - started < 5
+        finally:
+            timer.cancel()
+
+    def test_it_wakes_up_awaiting_listeners(self):
+        listener = self.notifier.listen(ModelWithModified)
+        assert not async_to_sync(listener.await_change)(0.01)
+        timer = threading.Timer(
+            0.05, self.notifier.notify, [ModelWithModified])
+        timer.start()
+        try:
+            started = time.time()
+            assert async_to_sync(listener.await_change)(5)
+            assert time.time() - started < 5
+        finally:
+            timer.cancel()
+        assert not async_to_sync(listener.await_change)(0)
+
+    @pytest.mark.django_db
+    def test_it_is_notified_when_the_save_commits(self):
+        listener = self.notifier.listen(ModelWithModified)
+        with TestCase.captureOnCommitCallbacks() as callbacks:
+            ModelWithModified.objects.create(n=1)
+            assert not listener.wait(0)
+        for callback in callbacks:
+            callback()
+        assert listener.wait(0)
+
+
+@pytest.mark.django_db
+class TestLongPolling:
+
+    def setup(self):
+        self.start_of_test = timezone.now()
+        ModelWithModified.objects.create(n=0)
+
+    def get(self, notifier, **params):
+        view = ViewSetWithModified.as_view(
+            {'get': 'list'}, change_notifier=notifier)
+        return view(factory.get('/data/', params))
+
+    def test_it_returns_a_non_empty_page_without_waiting(self):
+        notifier = FakeNotifier(lambda: True)
+        response = self.get(notifier,
+                            modified_from=self.start_of_test.isoformat(),
+                            wait=10)
+        assert len(response.data['results']) == 1
+        assert notifier.listeners[0].waits == []
+        assert notifier.listeners[0].closed
+
+    def test_it_waits_for_new_items(self):
+        after = ModelWithModified.objects.get().modified
+
+        def on_wait():
+            ModelWithModified.objects.create(n=1)
+            return True
+        notifier = FakeNotifier(on_wait)
+        response = self.get(notifier, modified_after=after.isoformat(),
+                            wait=10)
+        assert [item.n for item in response.data['results']] == [1]
+        assert len(notifier.listeners[0].waits) == 1
+        assert notifier.listeners[0].model is ModelWithModified
+
+    def test_it_keeps_waiting_after_unrelated_changes(self):
+        after = ModelWithModified.objects.get().modified
+        changes = []
+
+        def on_wait():
+            changes.append(None)
+            if len(changes) == 3:
+                ModelWithModified.objects.create(n=1)
+            return True
+        notifier = FakeNotifier(on_wait)
+        response = self.get(notifier, modified_after=after.isoformat(),
+                            wait=10)
+        assert [item.n for item in response.data['results']] == [1]
+        assert len(changes) == 3
+
+    def test_it_returns_an_empty_page_when_the_wait_expires(self):
+        after = ModelWithModified.objects.get().modified
+        notifier = FakeNotifier(lambda: False)
+        response = self.get(notifier, modified_after=after.isoformat(),
+                            wait=10)
+        assert response.data['results'] == []
+        assert response.data['next'] is None
+        assert len(notifier.listeners[0].waits) == 1
+        assert notifier.listeners[0].waits[0] <= 10
+        assert notifier.listeners[0].closed
+
+    def test_it_caps_the_wait(self):
+        after = ModelWithModified.objects.get().modified
+        notifier = FakeNotifier(lambda: False)
+        self.get(notifier, modified_after=after.isoformat(), wait=3600)
+        assert notifier.listeners[0].waits[0] <= 30
+
+    def test_it_does_not_wait_unless_asked_to(self):
+        after = ModelWithModified.objects.get().modified
+        notifier = FakeNotifier(lambda: False)
+        self.get(notifier, modified_after=after.isoformat())
+        self.get(notifier, modified_after=after.isoformat(), wait='soon')
+        self.get(notifier, modified_after=after.isoformat(), wait=0)
+        assert notifier.listeners == []
+
+    def test_it_does_not_wait_without_a_notifier(self):
+        after = ModelWithModified.objects.get().modified
+        started = time.time()
+        response = self.get(None, modified_after=after.isoformat(), wait=10)
+        assert response.data['results'] == []
+        assert time.time() - started < 10
+
+    def test_it_times_out_with_the_signal_notifier(self):
+        after = ModelWithModified.objects.get().modified
+        response = self.get(SignalChangeNotifier(),
+                            modified_after=after.isoformat(), wait=0.05)
+        assert response.data['results'] == []
+
+    def alist(self, notifier, **params):
+        viewset = AsyncViewSetWithModified(
+            action_map={'get': 'list'}, change_notifier=notifier)
+        request = viewset.initialize_request(factory.get('/data/', params))
+        viewset.request = request
+        viewset.format_kwarg = None
+        viewset.args, viewset.kwargs = (), {}
+        return async_to_sync(viewset.list)(request)
+
+    def test_async_views_wait_for_new_items(self):
+        after = ModelWithModified.objects.get().modified
+
+        def on_wait():
+            ModelWithModified.objects.create(n=1)
+            return True
+        notifier = FakeNotifier(on_wait)
+        response = self.alist(notifier, modified_after=after.isoformat(),
+                              wait=10)
+        assert [item.n for item in response.data['results']] == [1]
+        assert len(notifier.listeners[0].waits) == 1
+        assert notifier.listeners[0].closed
+
+    def test_async_views_time_out_with_the_signal_notifier(self):
+        after = ModelWithModified.objects.get().modified
+        started = time.time()
+        response = self.alist(SignalChangeNotifier(),
+                              modified_after=after.isoformat(), wait=0.05)
+        assert response.data['results'] == []
+        assert time.time() - started < 5
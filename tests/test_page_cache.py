@@ -0,0 +1,162 @@
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from tests.models import ModelWithModified
+from tests.views import ViewSetWithModified
+
+
+factory = APIRequestFactory()
+
+
+class ViewSetWithPageCache(ViewSetWithModified):
+    settle_window = 60
+    page_cache = 'default'
+
+
+class ViewSetWithPerUserPages(ViewSetWithPageCache):
+
+    def get_queryset(self):
+        # 'even' sees the even items, anyone else the odd ones
+        queryset = super(ViewSetWithPerUserPages, self).get_queryset()
+        first = 0 if self.request.user.username == 'even' else 1
+        return queryset.filter(n__in=range(first, 12, 2))
+
+
+class ViewSetWithPublicPages(ViewSetWithPageCache):
+    page_cache_public = True
+
+
+class ViewSetWithPageCacheOnly(ViewSetWithPageCache):
+    settle_window = None
+
+
+@pytest.mark.django_db
+class TestSettledPages:
+
+    def setup(self):
+        caches['default'].clear()
+        self.an_hour_ago = timezone.now() - timedelta(hours=1)
+        self.models = [
+            ModelWithModified.objects.create(n=n) for n in range(12)
+        ]
+        # The first two pages are old, the rest are recent
+        for n, model in enumerate(self.models[:10]):
+            ModelWithModified.objects.filter(pk=model.pk).update(
+                modified=self.an_hour_ago + timedelta(seconds=n))
+        self.view = ViewSetWithPageCache.as_view({'get': 'list'})
+
+    def get(self, params, view=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = (view or self.view)(factory.get('/data/', params))
+        return response, len(queries)
+
+    def test_it_caches_settled_pages(self):
+        params = {'modified_from': self.an_hour_ago.isoformat()}
+        response, _ = self.get(params)
+        assert [item.n for item in response.data['results']] == \
+            list(range(5))
+        assert response['Cache-Control'] == 'private, max-age=3600'
+        assert response['ETag'].startswith('W/"')
+
+        cached, queries = self.get(params)
+        assert queries == 0
+        assert cached.data == response.data
+        assert cached['ETag'] == response['ETag']
+        assert cached['Cache-Control'] == 'private, max-age=3600'
+
+    def test_it_normalizes_the_cache_key(self):
+        params = {'modified_from': self.an_hour_ago.isoformat(), 'limit': 5}
+        response, _ = self.get(params)
+        _, queries = self.get({'limit': '5',
+                               'modified_from': self.an_hour_ago.isoformat()})
+        assert queries == 0
+        _, queries = self.get({'limit': '4',
+                               'modified_from': self.an_hour_ago.isoformat()})
+        assert queries > 0
+
+    def test_it_does_not_cache_pages_that_have_not_settled(self):
+        params = {'modified_from': self.models[10].modified.isoformat()}
+        response, _ = self.get(params)
+        assert response['Cache-Control'] == 'no-cache'
+        assert 'ETag' in response
+        _, queries = self.get(params)
+        assert queries > 0
+
+    def test_it_does_not_cache_pages_spanning_the_settle_window(self):
+        params = {'modified_from': (
+            self.an_hour_ago + timedelta(seconds=6)).isoformat()}
+        response, _ = self.get(params)
+        assert [item.n for item in response.data['results']] == \
+            [6, 7, 8, 9, 10]
+        assert response.data['next'] is not None
+        assert response['Cache-Control'] == 'no-cache'
+
+    def test_it_does_not_cache_the_last_page(self):
+        ModelWithModified.objects.filter(n__gte=5).delete()
+        params = {'modified_from': self.an_hour_ago.isoformat()}
+        response, _ = self.get(params)
+        assert len(response.data['results']) == 5
+        assert response.data['next'] is None
+        assert response['Cache-Control'] == 'no-cache'
+
+    def test_the_etag_changes_when_an_item_changes(self):
+        params = {'modified_from': self.models[10].modified.isoformat()}
+        response, _ = self.get(params)
+        same, _ = self.get(params)
+        assert same['ETag'] == response['ETag']
+        self.models[11].save()
+        changed, _ = self.get(params)
+        assert changed['ETag'] != response['ETag']
+
+    def test_it_does_not_add_headers_without_a_settle_window(self):
+        view = ViewSetWithModified.as_view({'get': 'list'})
+        response, _ = self.get(
+            {'modified_from': self.an_hour_ago.isoformat()}, view=view)
+        assert 'ETag' not in response
+        assert 'Cache-Control' not in response
+
+    def get_as(self, username, params):
+        user, _ = User.objects.get_or_create(username=username)
+        request = factory.get('/data/', params)
+        force_authenticate(request, user=user)
+        view = ViewSetWithPerUserPages.as_view({'get': 'list'})
+        with CaptureQueriesContext(connection) as queries:
+            response = view(request)
+        return response, len(queries)
+
+    def test_users_only_get_their_own_cached_pages(self):
+        params = {'modified_from': self.an_hour_ago.isoformat()}
+        even, _ = self.get_as('even', params)
+        assert [item.n for item in even.data['results']] == [0, 2, 4, 6, 8]
+        assert even['Cache-Control'] == 'private, max-age=3600'
+
+        odd, queries = self.get_as('odd', params)
+        assert queries > 0
+        assert [item.n for item in odd.data['results']] == [1, 3, 5, 7, 9]
+
+        cached, queries = self.get_as('even', params)
+        assert queries == 0
+        assert cached.data == even.data
+        assert 'Authorization' in cached['Vary']
+
+    def test_pages_can_be_public(self):
+        view = ViewSetWithPublicPages.as_view({'get': 'list'})
+        response, _ = self.get(
+            {'modified_from': self.an_hour_ago.isoformat()}, view=view)
+        assert response['Cache-Control'] == 'public, max-age=3600'
+        assert 'Authorization' not in response['Vary']
+
+    def test_the_page_cache_needs_a_settle_window(self):
+        view = ViewSetWithPageCacheOnly.as_view({'get': 'list'})
+        with pytest.raises(ImproperlyConfigured):
+            self.get({'modified_from': self.an_hour_ago.isoformat()},
+                     view=view)
@@ -103,5 +103,31 @@ class TestPaginationMethods:
         paginator.next_item = next_item_qs
         assert paginator.get_next_link() is None
 
+    def test_it_paginates_queryset_with_prefetched_next_item(self):
+        paginator = TimeOrderedPagination(*[ANY] * 5,
+                                          max_limit_override=3,
+                                          prefetch_next_item_override=True)
+        request = Mock()
+        request.query_params = {'limit': 999}
+
+        page = paginator.paginate_queryset(self.mock_queryset, request)
+
+        assert page == [1, 2, 3]
+        assert paginator.next_item == [4]
+        assert paginator.get_next_item() == 4
+        assert paginator.count == 4
+
+    def test_get_next_item_returns_none_if_no_prefetched_next_item(self):
+        paginator = TimeOrderedPagination(*[ANY] * 5,
+                                          prefetch_next_item_override=True)
+        request = Mock()
+        request.query_params = {'limit': 999}
+
+        page = paginator.paginate_queryset(self.mock_queryset, request)
+
+        assert page == [1, 2, 3, 4]
+        assert paginator.get_next_item() is None
+        assert paginator.get_next_link() is None
+
     def test_it_builds_the_next_link(self):
         pass  # ZOMG I'm sick of writing these horrible brittle tests
@@ -0,0 +1,111 @@
+from datetime import timedelta
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from timeordered_pagination.counts import CursorCount
+from tests.models import ModelWithModified
+from tests.utils import create_at, get, summarize
+from tests.views import (
+    ViewSetWithCursor, ViewSetWithModified, ViewSetWithStreaming)
+
+
+class ViewSetWithCursorCount(ViewSetWithModified):
+    count_strategy_override = CursorCount()
+
+
+@pytest.mark.django_db
+class TestPreviousLinks:
+
+    def setup(self):
+        self.start_of_test = timezone.now() - timedelta(hours=1)
+        # pairs of items share a modified time
+        for n in range(12):
+            create_at(ModelWithModified, self.at(n // 2), n=n)
+
+    def at(self, seconds):
+        return self.start_of_test + timedelta(seconds=seconds)
+
+    def test_it_links_to_the_items_before_the_page(self):
+        response = get(ViewSetWithModified, {
+            'modified_from': self.at(3).isoformat(), 'limit': 4})
+        assert summarize(response) == [6, 7, 8, 9]
+        response = get(ViewSetWithModified, response.data['previous'])
+        assert summarize(response) == [2, 3, 4, 5]
+
+    def test_the_previous_page_links_back_to_the_page(self):
+        response = get(ViewSetWithModified, {
+            'modified_from': self.at(3).isoformat(), 'limit': 3})
+        previous = get(ViewSetWithModified, response.data['previous'])
+        assert summarize(previous) == [3, 4, 5]
+        assert summarize(get(ViewSetWithModified,
+                             previous.data['next'])) == [6, 7, 8]
+
+    def test_it_walks_back_to_the_start(self):
+        response = get(ViewSetWithModified, {
+            'modified_from': self.at(5).isoformat(),
+            'start_from_id': ModelWithModified.objects.get(n=11).pk,
+            'limit': 5})
+        seen = summarize(response)
+        while response.data['previous']:
+            response = get(ViewSetWithModified, response.data['previous'])
+            seen = summarize(response) + seen
+        assert seen == list(range(12))
+
+    def test_it_reads_backwards_from_a_position(self):
+        response = get(ViewSetWithModified, {
+            'modified_before': self.at(2).isoformat(), 'limit': 3})
+        assert summarize(response) == [1, 2, 3]
+        assert response.data['count'] == 4
+        params = parse_qs(urlparse(response.data['next']).query)
+        assert params['modified_from'] == [self.at(2).isoformat()]
+
+    def test_going_back_costs_the_same_as_going_forward(self):
+        response = get(ViewSetWithModified, {
+            'modified_from': self.at(5).isoformat(), 'limit': 2})
+        with CaptureQueriesContext(connection) as queries:
+            response = get(ViewSetWithModified, response.data['previous'])
+        assert summarize(response) == [8, 9]
+        # one query for the page (and the item before it), one to count
+        assert len(queries) == 2
+        page_query = queries[0]['sql']
+        assert 'OFFSET' not in page_query
+        assert 'DESC' in page_query
+
+    def test_there_is_no_previous_link_before_the_first_item(self):
+        response = get(ViewSetWithModified, {
+            'modified_before': self.at(1).isoformat(), 'limit': 5})
+        assert summarize(response) == [0, 1]
+        assert response.data['previous'] is None
+        assert response.data['next'] is not None
+
+    def test_empty_pages_have_no_previous_link(self):
+        response = get(ViewSetWithModified, {
+            'modified_after': self.at(5).isoformat()})
+        assert response.data['results'] == []
+        assert response.data['previous'] is None
+
+    def test_previous_links_use_the_cursor_token(self):
+        response = get(ViewSetWithCursor, {
+            'modified_from': self.at(3).isoformat(), 'limit': 4})
+        params = parse_qs(urlparse(response.data['previous']).query)
+        assert sorted(params) == ['cursor', 'limit']
+        response = get(ViewSetWithCursor, response.data['previous'])
+        assert summarize(response) == [2, 3, 4, 5]
+        response = get(ViewSetWithCursor, response.data['next'])
+        assert summarize(response) == [6, 7, 8, 9]
+
+    def test_previous_links_drop_the_carried_count(self):
+        response = get(ViewSetWithCursorCount, {
+            'modified_from': self.at(3).isoformat(), 'limit': 4})
+        assert 'count' in parse_qs(urlparse(response.data['next']).query)
+        assert 'count' not in \
+            parse_qs(urlparse(response.data['previous']).query)
+
+    def test_streams_can_not_be_read_backwards(self):
+        response = get(ViewSetWithStreaming, {
+            'modified_before': self.at(3).isoformat(), 'stream': 'true'})
+        assert response.status_code == 400
@@ -0,0 +1,101 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from rest_framework import serializers
+from rest_framework.test import APIRequestFactory
+from rest_framework.viewsets import ReadOnlyModelViewSet
+
+from timeordered_pagination.views import TimeOrderedPaginationViewSetMixin
+from tests.models import ModelWithModified
+from tests.views import ModelWithModifiedSerializer
+
+
+factory = APIRequestFactory()
+
+
+class ViewSetWithFields(TimeOrderedPaginationViewSetMixin,
+                        ReadOnlyModelViewSet):
+    queryset = ModelWithModified.objects.all()
+    serializer_class = ModelWithModifiedSerializer
+    ordering = 'id'
+    fields_query_param = 'fields'
+    cursor_query_param = 'cursor'
+    stream_query_param = 'stream'
+
+
+class ModelWithDoubledSerializer(serializers.ModelSerializer):
+    doubled = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ModelWithModified
+        fields = ('id', 'n', 'modified', 'created', 'doubled')
+
+    def get_doubled(self, item):
+        return item.n * 2
+
+
+class ViewSetWithMethodFields(ViewSetWithFields):
+    serializer_class = ModelWithDoubledSerializer
+
+
+@pytest.mark.django_db
+class TestFieldProjection:
+
+    def setup(self):
+        self.start_of_test = timezone.now()
+        for n in range(7):
+            ModelWithModified.objects.create(n=n)
+
+    def get(self, viewset, params):
+        params = dict(params, modified_from=self.start_of_test.isoformat())
+        view = viewset.as_view({'get': 'list'})
+        with CaptureQueriesContext(connection) as queries:
+            response = view(factory.get('/data/', params))
+        return response, queries
+
+    def get_page_query(self, queries):
+        return [query['sql'] for query in queries
+                if 'LIMIT' in query['sql']][0]
+
+    def test_it_includes_the_requested_and_position_fields(self):
+        response, queries = self.get(ViewSetWithFields, {'fields': 'n'})
+        assert [sorted(result) for result in response.data['results']] == \
+            [['id', 'modified', 'n']] * 5
+        assert '"created"' not in self.get_page_query(queries)
+
+    def test_it_only_fetches_the_position_fields(self):
+        response, queries = self.get(ViewSetWithFields, {'fields': 'id'})
+        assert [sorted(result) for result in response.data['results']] == \
+            [['id', 'modified']] * 5
+        sql = self.get_page_query(queries)
+        assert '"n"' not in sql
+        assert '"modified"' in sql
+        # and the next link still works
+        assert response.data['next'] is not None
+
+    def test_it_ignores_unknown_fields(self):
+        response, _ = self.get(ViewSetWithFields, {'fields': 'n,unknown'})
+        assert sorted(response.data['results'][0]) == ['id', 'modified', 'n']
+
+    def test_it_includes_every_field_by_default(self):
+        response, queries = self.get(ViewSetWithFields, {})
+        assert sorted(response.data['results'][0]) == ['id', 'modified', 'n']
+        assert '"created"' in self.get_page_query(queries)
+
+    def test_it_fetches_every_column_for_method_fields(self):
+        response, queries = self.get(ViewSetWithMethodFields,
+                                     {'fields': 'doubled'})
+        assert [result['doubled'] for result in response.data['results']] \
+            == [0, 2, 4, 6, 8]
+        assert '"n"' in self.get_page_query(queries)
+        # the page, the count and the next item, without a query per row
+        assert len(queries) == 4
+
+    def test_it_projects_streams(self):
+        response, queries = self.get(ViewSetWithFields,
+                                     {'fields': 'id', 'stream': 'true'})
+        content = b''.join(response.streaming_content)
+        assert content.count(b'"n"') == 0
+        assert content.count(b'"id"') == 7
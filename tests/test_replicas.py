@@ -0,0 +1,165 @@
+from datetime import datetime, timedelta
+
+import mock
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.utils import timezone
+
+from rest_framework.test import APIRequestFactory
+from rest_framework.viewsets import ReadOnlyModelViewSet
+
+from timeordered_pagination.aio import AsyncTimeOrderedPaginationViewSetMixin
+from timeordered_pagination.replicas import (
+    BaseLagDetector, FixedLagDetector, PostgresLagDetector)
+from timeordered_pagination.views import TimeOrderedPaginationViewSetMixin
+from tests.models import ModelWithModified
+from tests.utils import an_hour_ago, create_at, get, summarize
+from tests.views import PassThroughSerializer, ViewSetWithModified
+
+
+factory = APIRequestFactory()
+
+
+class UnknownLagDetector(BaseLagDetector):
+
+    def get_replayed_until(self, alias):
+        return None
+
+
+class QueryingLagDetector(FixedLagDetector):
+    """
+    Asks the replica for the time, as a real detector would.
+    """
+
+    def get_replayed_until(self, alias):
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+        return super(QueryingLagDetector, self).get_replayed_until(alias)
+
+
+class ViewSetWithReplica(ViewSetWithModified):
+    replica_aliases = ['shard']
+    replica_lag_detector = FixedLagDetector(60)
+
+
+class ViewSetWithUnknownLag(ViewSetWithReplica):
+    replica_lag_detector = UnknownLagDetector()
+
+
+class ViewSetWithoutDetector(ViewSetWithReplica):
+    replica_lag_detector = None
+
+
+class AsyncViewSetWithReplica(AsyncTimeOrderedPaginationViewSetMixin,
+                              ViewSetWithReplica):
+    replica_lag_detector = QueryingLagDetector(60)
+
+
+class GetQuerySetViewSet(ReadOnlyModelViewSet):
+    serializer_class = PassThroughSerializer
+
+    def get_queryset(self):
+        return ModelWithModified.objects.all()
+
+
+class ViewSetWithReplicaAndGetQuerySet(TimeOrderedPaginationViewSetMixin,
+                                       GetQuerySetViewSet):
+    replica_aliases = ['shard']
+    replica_lag_detector = FixedLagDetector(60)
+    snapshot_lag = 0
+
+
+@pytest.mark.django_db(databases=['default', 'shard'])
+class TestReplicas:
+
+    def setup(self):
+        self.an_hour_ago = an_hour_ago()
+        # The primary has n = 0..4 and the replica n = 100..104, plus one
+        # item that is newer than the replica has replayed
+        for alias, offset in (('default', 0), ('shard', 100)):
+            for n in range(5):
+                create_at(ModelWithModified,
+                          self.an_hour_ago + timedelta(seconds=n),
+                          using=alias, n=offset + n)
+        create_at(ModelWithModified, timezone.now() - timedelta(seconds=10),
+                  using='shard', n=105)
+
+    def test_it_reads_pages_from_the_replica(self):
+        response = get(ViewSetWithReplica, {
+            'modified_from': self.an_hour_ago.isoformat(), 'limit': 3})
+        assert summarize(response) == [100, 101, 102]
+        assert {item._state.db for item in response.data['results']} == \
+            {'shard'}
+        assert response.data['count'] == 5
+
+    def test_the_next_link_never_passes_the_replay_time(self):
+        response = get(ViewSetWithReplica, {
+            'modified_from': self.an_hour_ago.isoformat(), 'limit': 3})
+        assert 'modified_until=' in response.data['next']
+        response = get(ViewSetWithReplica, response.data['next'])
+        assert summarize(response) == [103, 104]
+        assert response.data['next'] is None
+
+    def test_a_requested_bound_is_capped_at_the_replay_time(self):
+        response = get(ViewSetWithReplica, {
+            'modified_from': self.an_hour_ago.isoformat(),
+            'modified_until': timezone.now().isoformat()})
+        assert 105 not in summarize(response)
+
+    def test_it_reads_from_the_primary_when_the_lag_is_unknown(self):
+        response = get(ViewSetWithUnknownLag, {
+            'modified_from': self.an_hour_ago.isoformat()})
+        assert summarize(response) == [0, 1, 2, 3, 4]
+
+    def test_it_only_routes_time_ordered_requests(self):
+        response = get(ViewSetWithReplica, {})
+        assert summarize(response) == [0, 1, 2, 3, 4]
+
+    def test_async_pages_are_read_from_the_replica(self):
+        viewset = AsyncViewSetWithReplica(action_map={'get': 'list'})
+        request = viewset.initialize_request(factory.get('/data/', {
+            'modified_from': self.an_hour_ago.isoformat()}))
+        viewset.request = request
+        viewset.format_kwarg = None
+        viewset.args, viewset.kwargs = (), {}
+        response = async_to_sync(viewset.list)(request)
+        assert summarize(response) == [100, 101, 102, 103, 104]
+
+    def test_viewsets_may_only_override_get_queryset(self):
+        response = get(ViewSetWithReplicaAndGetQuerySet, {
+            'modified_from': self.an_hour_ago.isoformat()})
+        assert summarize(response) == [100, 101, 102, 103, 104]
+
+    def test_it_needs_a_lag_detector(self):
+        with pytest.raises(ImproperlyConfigured):
+            get(ViewSetWithoutDetector, {
+                'modified_from': self.an_hour_ago.isoformat()})
+
+
+class TestPostgresLagDetector:
+
+    def setup(self):
+        self.replayed = datetime(2017, 1, 2, 3, 4, 5)
+        self.connection = mock.MagicMock()
+        cursor = self.connection.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = (self.replayed,)
+        self.cursor = cursor
+
+    def test_it_asks_the_replica_and_keeps_the_answer(self):
+        detector = PostgresLagDetector(max_age=60)
+        with mock.patch('timeordered_pagination.replicas.connections',
+                        {'replica': self.connection}):
+            assert detector.get_replayed_until('replica') == self.replayed
+            assert detector.get_replayed_until('replica') == self.replayed
+        self.cursor.execute.assert_called_once_with(
+            'SELECT pg_last_xact_replay_timestamp()')
+
+    def test_it_asks_again_once_the_answer_is_stale(self):
+        detector = PostgresLagDetector(max_age=0)
+        with mock.patch('timeordered_pagination.replicas.connections',
+                        {'replica': self.connection}):
+            detector.get_replayed_until('replica')
+            detector.get_replayed_until('replica')
+        assert self.cursor.execute.call_count == 2
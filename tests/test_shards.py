@@ -0,0 +1,127 @@
+from datetime import timedelta
+
+import mock
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from rest_framework.test import APIRequestFactory
+
+from timeordered_pagination.merge import get_executor
+from tests.models import ModelWithModified
+from tests.utils import create_at, get
+from tests.views import ViewSetWithCursor, ViewSetWithModified
+
+
+factory = APIRequestFactory()
+
+
+class ShardedViewSet(ViewSetWithCursor):
+    shard_aliases = ['default', 'shard']
+    # Each test's data is only visible to the connections in its thread
+    shard_parallel = False
+
+
+class ParallelShardedViewSet(ShardedViewSet):
+    shard_parallel = True
+
+
+@pytest.mark.django_db(databases=['default', 'shard'])
+class TestShards:
+
+    def setup(self):
+        self.start_of_test = timezone.now() - timedelta(hours=1)
+        # Interleave the shards: default at even seconds and shard at odd
+        # seconds, with a tie at 8 seconds
+        for n in range(5):
+            for alias, seconds in (('default', n * 2),
+                                   ('shard', min(n * 2 + 1, 8))):
+                create_at(ModelWithModified, self.at(seconds), using=alias,
+                          n=n)
+        self.view = ShardedViewSet.as_view({'get': 'list'})
+
+    def at(self, seconds):
+        return self.start_of_test + timedelta(seconds=seconds)
+
+    def summarize(self, response):
+        return [(item.n, item.modified, item._state.db)
+                for item in response.data['results']]
+
+    def test_it_merges_the_shards_in_order(self):
+        response = get(self.view, {
+            'modified_from': self.start_of_test.isoformat(), 'limit': 10})
+        assert [item.n for item in response.data['results']] == \
+            [0, 0, 1, 1, 2, 2, 3, 3, 4, 4]
+        modified = [item.modified for item in response.data['results']]
+        assert modified == sorted(modified)
+        # The next link is always there, to carry every shard's position
+        caught_up = get(self.view, response.data['next'])
+        assert caught_up.data['results'] == []
+        assert caught_up.data['next'] is not None
+
+    def test_it_walks_the_shards_with_compound_cursors(self):
+        seen = []
+        url = '/data/?limit=3&modified_from={}'.format(
+            self.start_of_test.isoformat()).replace('+', '%2B')
+        while True:
+            response = get(self.view, url)
+            if not response.data['results']:
+                break
+            seen.extend(self.summarize(response))
+            url = response.data['next']
+        assert len(seen) == 10
+        assert len(set(seen)) == 10
+        assert [n for n, _, _ in seen] == [0, 0, 1, 1, 2, 2, 3, 3, 4, 4]
+
+    def test_it_queries_each_shard_once(self):
+        with CaptureQueriesContext(connections['default']) as default, \
+                CaptureQueriesContext(connections['shard']) as shard:
+            response = get(self.view, {
+                'modified_from': self.start_of_test.isoformat(), 'limit': 3})
+        assert len(response.data['results']) == 3
+        assert len(default) == 1
+        assert len(shard) == 1
+
+    def test_it_starts_after_a_position(self):
+        response = get(self.view, {'modified_after': self.at(6).isoformat()})
+        assert [item.n for item in response.data['results']] == [3, 4, 4]
+
+    def test_it_returns_not_found_for_invalid_cursors(self):
+        response = get(self.view, {'cursor': 'not a cursor'})
+        assert response.status_code == 404
+
+    def test_it_requires_a_cursor_query_param(self):
+        view = ViewSetWithModified.as_view(
+            {'get': 'list'}, shard_aliases=['default', 'shard'])
+        with pytest.raises(ImproperlyConfigured):
+            view(factory.get('/data/', {
+                'modified_from': self.start_of_test.isoformat()}))
+
+
+@pytest.mark.django_db(databases=['default', 'shard'], transaction=True)
+class TestParallelShards:
+
+    def setup(self):
+        self.start_of_test = timezone.now() - timedelta(hours=1)
+        for n, alias in enumerate(['default', 'shard', 'default']):
+            ModelWithModified.objects.using(alias).create(n=n)
+        self.view = ParallelShardedViewSet.as_view({'get': 'list'})
+
+    def get(self):
+        return self.view(factory.get('/data/', {
+            'modified_from': self.start_of_test.isoformat()}))
+
+    def test_it_queries_the_shards_on_a_shared_executor(self):
+        assert get_executor() is get_executor()
+        with mock.patch(
+                'timeordered_pagination.merge.close_old_connections') as close:
+            response = self.get()
+            assert [item.n for item in response.data['results']] == \
+                [0, 1, 2]
+            # ...whose threads keep their connections between pages,
+            # unless they are too old
+            assert close.call_count == 4
+            assert [item.n for item in self.get().data['results']] == \
+                [0, 1, 2]
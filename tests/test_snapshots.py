@@ -0,0 +1,106 @@
+from datetime import timedelta
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from django.utils import timezone
+
+from tests.models import ModelWithModified, ModelWithVersion
+from tests.test_versions import ViewSetWithVersion
+from tests.utils import an_hour_ago, create_at, get, summarize
+from tests.views import ViewSetWithCursor, ViewSetWithModified
+
+
+class ViewSetWithSnapshot(ViewSetWithModified):
+    snapshot_lag = 60
+
+
+class ViewSetWithSnapshotCursor(ViewSetWithCursor):
+    snapshot_lag = 60
+
+
+class ViewSetWithVersionSnapshot(ViewSetWithVersion):
+    snapshot_lag = 0
+
+
+@pytest.mark.django_db
+class TestSnapshots:
+
+    def setup(self):
+        self.an_hour_ago = an_hour_ago()
+        for n in range(8):
+            create_at(ModelWithModified,
+                      self.an_hour_ago + timedelta(seconds=n), n=n)
+
+    def drain(self, viewset, params, touch=None):
+        pages = []
+        response = get(viewset, params)
+        while True:
+            pages.append(summarize(response))
+            if touch is not None:
+                touch()
+            if response.data['next'] is None:
+                return pages
+            response = get(viewset, response.data['next'])
+
+    def touch(self):
+        ModelWithModified.objects.filter(n=0).update(modified=timezone.now())
+
+    def test_items_modified_during_a_drain_are_left_for_the_next(self):
+        params = {'modified_from': self.an_hour_ago.isoformat(), 'limit': 3}
+        assert self.drain(ViewSetWithSnapshot, params, self.touch) == \
+            [[0, 1, 2], [3, 4, 5], [6, 7]]
+
+        # Without the bound the drain finds the touched item again
+        pages = self.drain(ViewSetWithModified, params, self.touch)
+        assert 0 in sum(pages[1:], [])
+
+    def test_the_bound_lags_behind_now(self):
+        ModelWithModified.objects.filter(n=7).update(
+            modified=timezone.now() - timedelta(seconds=10))
+        response = get(ViewSetWithSnapshot, {
+            'modified_from': self.an_hour_ago.isoformat()})
+        assert 7 not in summarize(response)
+
+    def test_the_bound_is_carried_in_the_links(self):
+        response = get(ViewSetWithSnapshotCursor, {
+            'modified_from': self.an_hour_ago.isoformat(), 'limit': 3})
+        query = parse_qs(urlparse(response.data['next']).query)
+        assert set(query) == {'cursor', 'limit', 'modified_until'}
+        until = timezone.now() - timedelta(seconds=60)
+        assert abs(until - ModelWithModified._meta.get_field(
+            'modified').to_python(query['modified_until'][0])) < \
+            timedelta(seconds=5)
+
+    def test_it_uses_the_requested_bound(self):
+        response = get(ViewSetWithSnapshot, {
+            'modified_from': self.an_hour_ago.isoformat(),
+            'modified_until': (self.an_hour_ago +
+                               timedelta(seconds=2)).isoformat()})
+        assert summarize(response) == [0, 1, 2]
+        assert response.data['count'] == 3
+
+    def test_it_rejects_an_invalid_bound(self):
+        response = get(ViewSetWithSnapshot, {
+            'modified_from': self.an_hour_ago.isoformat(),
+            'modified_until': 'tomorrow'})
+        assert response.status_code == 400
+        assert list(response.data) == ['modified_until']
+
+    def test_it_is_off_by_default(self):
+        response = get(ViewSetWithModified, {
+            'modified_from': self.an_hour_ago.isoformat(), 'limit': 3})
+        assert 'modified_until' not in response.data['next']
+
+    def test_versions_are_bounded_by_the_largest_version(self):
+        for n in range(4):
+            ModelWithVersion.objects.create(n=n)
+        response = get(ViewSetWithVersionSnapshot,
+                       {'version_from': 0, 'limit': 2})
+        assert summarize(response) == [0, 1]
+        assert 'version_until=4' in response.data['next']
+
+        ModelWithVersion.objects.get(n=0).save()
+        response = get(ViewSetWithVersionSnapshot,
+                       response.data['next'])
+        assert summarize(response) == [2, 3]
+        assert response.data['next'] is None
@@ -0,0 +1,100 @@
+import json
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from rest_framework.test import APIRequestFactory
+
+from tests.models import ModelWithModified
+from tests.views import ViewSetWithStreaming
+
+
+factory = APIRequestFactory()
+
+
+class ViewSetWithStreamingWithoutCursor(ViewSetWithStreaming):
+    cursor_query_param = None
+
+
+@pytest.mark.django_db
+class TestStreaming:
+
+    def setup(self):
+        self.start_of_test = timezone.now()
+        self.models = [
+            ModelWithModified.objects.create(n=n) for n in range(10)
+        ]
+        # make some ties across the chunk boundaries
+        ModelWithModified.objects.filter(n__in=range(2, 5)).update(
+            modified=self.models[2].modified)
+        self.view = ViewSetWithStreaming.as_view({'get': 'list'})
+
+    def stream(self, view, params_or_url):
+        if isinstance(params_or_url, dict):
+            request = factory.get('/data/', params_or_url)
+        else:
+            request = factory.get(params_or_url)
+        with CaptureQueriesContext(connection) as queries:
+            response = view(request)
+            records = [json.loads(line) for line in
+                       b''.join(response.streaming_content).splitlines()]
+        return response, records[:-1], records[-1]['trailer'], len(queries)
+
+    def test_it_does_not_stream_unless_asked_to(self):
+        response = self.view(factory.get('/data/', {
+            'modified_from': self.start_of_test.isoformat()}))
+        assert not response.streaming
+        assert len(response.data['results']) == 5
+
+    def test_it_does_not_stream_if_asked_not_to(self):
+        response = self.view(factory.get('/data/', {
+            'modified_from': self.start_of_test.isoformat(),
+            'stream': 'false'}))
+        assert not response.streaming
+
+    def test_it_streams_every_item_as_ndjson(self):
+        response, records, trailer, _ = self.stream(self.view, {
+            'modified_from': self.start_of_test.isoformat(), 'stream': '1'})
+        assert response['Content-Type'] == 'application/x-ndjson'
+        assert [record['id'] for record in records] == \
+            [model.id for model in self.models]
+        assert trailer['count'] == 10
+
+    def test_it_queries_once_per_chunk(self):
+        _, _, _, num_queries = self.stream(self.view, {
+            'modified_from': self.start_of_test.isoformat(), 'stream': '1'})
+        # chunks of 3, 3, 3 and 1
+        assert num_queries == 4
+
+    def test_it_streams_from_the_requested_position(self):
+        _, records, trailer, _ = self.stream(self.view, {
+            'modified_from': self.models[2].modified.isoformat(),
+            'start_from_id': self.models[3].id,
+            'stream': '1'})
+        assert [record['n'] for record in records] == list(range(3, 10))
+        assert trailer['count'] == 7
+
+    def test_the_trailer_resumes_after_the_last_item(self):
+        _, _, trailer, _ = self.stream(self.view, {
+            'modified_from': self.start_of_test.isoformat(), 'stream': '1'})
+        assert 'stream=1' in trailer['next']
+
+        # a caught-up client gets nothing more
+        _, records, caught_up, _ = self.stream(self.view, trailer['next'])
+        assert records == []
+        assert caught_up['count'] == 0
+
+        ModelWithModified.objects.get(n=4).save()
+        _, records, trailer, _ = self.stream(self.view, trailer['next'])
+        assert [record['n'] for record in records] == [4]
+        assert trailer['count'] == 1
+
+    def test_streams_need_a_cursor_query_param(self):
+        view = ViewSetWithStreamingWithoutCursor.as_view({'get': 'list'})
+        with pytest.raises(ImproperlyConfigured):
+            view(factory.get('/data/', {
+                'modified_from': self.start_of_test.isoformat(),
+                'stream': '1'}))
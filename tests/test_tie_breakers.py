@@ -0,0 +1,113 @@
+import uuid
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.viewsets import ReadOnlyModelViewSet
+
+from timeordered_pagination.checks import has_declared_keyset_index
+from timeordered_pagination.cursors import decode_cursor
+from timeordered_pagination.views import TimeOrderedPaginationViewSetMixin
+from tests.models import ModelWithNaturalKey
+from tests.utils import an_hour_ago, get
+from tests.views import PassThroughSerializer
+
+
+class ViewSetWithNaturalKey(TimeOrderedPaginationViewSetMixin,
+                            ReadOnlyModelViewSet):
+    queryset = ModelWithNaturalKey.objects.all()
+    serializer_class = PassThroughSerializer
+    ordering = 'id'
+    start_from_target_field = ('tenant', 'key')
+
+
+class ViewSetWithNaturalKeyCursor(ViewSetWithNaturalKey):
+    cursor_query_param = 'cursor'
+
+
+class ViewSetWithUUID(ViewSetWithNaturalKey):
+    start_from_target_field = 'key'
+
+
+@pytest.mark.django_db
+class TestTieBreakers:
+
+    def setup(self):
+        self.an_hour_ago = an_hour_ago()
+        for n in range(9):
+            ModelWithNaturalKey.objects.create(
+                tenant='tenant-{}'.format(n % 3), n=n)
+        # every item ties on the modified time
+        ModelWithNaturalKey.objects.update(modified=self.an_hour_ago)
+        self.ordered = [
+            item.n for item in ModelWithNaturalKey.objects.order_by(
+                'modified', 'tenant', 'key')]
+
+    def walk(self, viewset, url, link='next'):
+        seen = []
+        while url:
+            response = get(viewset, url)
+            items = [item.n for item in response.data['results']]
+            seen = items + seen if link == 'previous' else seen + items
+            url = response.data[link]
+        return seen
+
+    def first_url(self):
+        return '/data/?limit=4&modified_from={}'.format(
+            self.an_hour_ago.isoformat())
+
+    def test_it_walks_ties_with_every_tie_breaker(self):
+        assert self.walk(ViewSetWithNaturalKey, self.first_url()) == \
+            self.ordered
+
+    def test_the_next_link_has_a_parameter_per_field(self):
+        response = get(ViewSetWithNaturalKey, self.first_url())
+        params = parse_qs(urlparse(response.data['next']).query)
+        tenant, key = params['start_from_tenant'], params['start_from_key']
+        item = ModelWithNaturalKey.objects.get(tenant=tenant[0], key=key[0])
+        assert item.n == self.ordered[4]
+
+    def test_it_walks_back_with_every_tie_breaker(self):
+        response = get(ViewSetWithNaturalKey, self.first_url())
+        url = get(ViewSetWithNaturalKey,
+                  response.data['next']).data['next']
+        last_page = get(ViewSetWithNaturalKey, url)
+        assert self.walk(ViewSetWithNaturalKey,
+                         last_page.data['previous'], 'previous') == \
+            self.ordered[:8]
+
+    def test_the_cursor_carries_every_column(self):
+        response = get(ViewSetWithNaturalKeyCursor, self.first_url())
+        token = parse_qs(urlparse(response.data['next']).query)['cursor'][0]
+        cursor = decode_cursor(token)
+        assert cursor.start_from[0].startswith('tenant-')
+        assert isinstance(cursor.start_from[1], uuid.UUID)
+        assert self.walk(ViewSetWithNaturalKeyCursor, self.first_url()) == \
+            self.ordered
+
+    def test_it_compares_a_single_row_value(self):
+        response = get(ViewSetWithNaturalKey, self.first_url())
+        with CaptureQueriesContext(connection) as queries:
+            get(ViewSetWithNaturalKey, response.data['next'])
+        assert '"modified", "tests_modelwithnaturalkey"."tenant", ' \
+            '"tests_modelwithnaturalkey"."key") >=' in queries[0]['sql']
+
+    def test_it_needs_every_start_from_parameter(self):
+        response = get(ViewSetWithNaturalKey, {
+            'modified_from': self.an_hour_ago.isoformat(),
+            'start_from_tenant': 'tenant-1'})
+        assert response.status_code == 400
+        assert list(response.data) == ['start_from_key']
+
+    def test_it_pages_by_uuid(self):
+        ordered = [item.n for item in ModelWithNaturalKey.objects.order_by(
+            'modified', 'key')]
+        assert self.walk(ViewSetWithUUID, self.first_url()) == ordered
+
+    def test_it_finds_the_wider_index(self):
+        assert has_declared_keyset_index(ViewSetWithNaturalKey,
+                                         ModelWithNaturalKey)
+        assert not has_declared_keyset_index(ViewSetWithUUID,
+                                             ModelWithNaturalKey)
@@ -0,0 +1,123 @@
+import calendar
+from datetime import datetime, timedelta
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from rest_framework.test import APIRequestFactory
+
+from timeordered_pagination.cursors import UTC, Cursor, encode_cursor
+from tests.models import ModelWithModified
+from tests.views import ViewSetWithCursor, ViewSetWithModified
+
+
+factory = APIRequestFactory()
+
+
+class ViewSetWithParsedCursor(ViewSetWithModified):
+
+    def list(self, request, *args, **kwargs):
+        response = super(ViewSetWithParsedCursor, self).list(
+            request, *args, **kwargs)
+        response.cursor = request.timeordered_cursor
+        return response
+
+
+@pytest.mark.django_db
+class TestTimestampParsing:
+
+    def setup(self):
+        self.start_of_test = timezone.now().replace(microsecond=0) - \
+            timedelta(hours=1)
+        for n in range(4):
+            model = ModelWithModified.objects.create(n=n)
+            ModelWithModified.objects.filter(pk=model.pk).update(
+                modified=self.start_of_test + timedelta(seconds=n))
+        self.view = ViewSetWithParsedCursor.as_view({'get': 'list'})
+
+    def get(self, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.view(factory.get('/data/', params))
+        return response, queries
+
+    def summarize(self, response):
+        return [item.n for item in response.data['results']]
+
+    def epoch(self, value):
+        return calendar.timegm(timezone.make_aware(value).utctimetuple())
+
+    def test_it_parses_iso_timestamps(self):
+        response, _ = self.get({
+            'modified_from': (self.start_of_test +
+                              timedelta(seconds=2)).isoformat()})
+        assert self.summarize(response) == [2, 3]
+        cursor = response.cursor
+        assert cursor.position == self.start_of_test + timedelta(seconds=2)
+
+    def test_it_parses_epoch_timestamps(self):
+        response, _ = self.get({
+            'modified_after': self.epoch(self.start_of_test) + 1.5})
+        assert self.summarize(response) == [2, 3]
+
+    def test_it_parses_timestamps_with_an_offset(self):
+        position = timezone.make_aware(
+            self.start_of_test + timedelta(seconds=1)).astimezone(UTC)
+        response, _ = self.get({'modified_from': position.isoformat()})
+        assert self.summarize(response) == [1, 2, 3]
+
+    def test_it_parses_the_start_from_value(self):
+        response, _ = self.get({
+            'modified_from': self.start_of_test.isoformat(),
+            'start_from_id': str(ModelWithModified.objects.get(n=1).pk)})
+        assert self.summarize(response) == [1, 2, 3]
+        assert isinstance(response.cursor.start_from, int)
+
+    @pytest.mark.parametrize('params', [
+        {'modified_from': 'yesterday'},
+        {'modified_after': '2017-13-01T00:00:00'},
+        {'modified_from': ''},
+        {'modified_from': '2017-01-01', 'start_from_id': 'abc'},
+    ])
+    def test_it_rejects_invalid_values_without_querying(self, params):
+        response, queries = self.get(params)
+        assert response.status_code == 400
+        assert list(response.data) == list(params)[-1:]
+        assert len(queries) == 0
+
+    def test_it_parses_dates(self):
+        response, _ = self.get({
+            'modified_from': self.start_of_test.date().isoformat()})
+        assert self.summarize(response) == [0, 1, 2, 3]
+
+    def test_it_makes_timestamps_aware(self, settings):
+        settings.USE_TZ = True
+        response, _ = self.get({'modified_from': '2017-01-02T03:04'})
+        position = response.cursor.position
+        assert timezone.is_aware(position)
+        assert timezone.make_naive(position) == datetime(2017, 1, 2, 3, 4)
+
+    @pytest.mark.parametrize('cursor', [
+        Cursor(5, 1),
+        Cursor('abc', 'x'),
+        Cursor(datetime(2017, 1, 1), 'x'),
+        Cursor(datetime(2017, 1, 1), (1, 2)),
+    ])
+    def test_it_rejects_tokens_with_invalid_values(self, cursor):
+        view = ViewSetWithCursor.as_view({'get': 'list'})
+        with CaptureQueriesContext(connection) as queries:
+            response = view(factory.get('/data/', {
+                'cursor': encode_cursor(cursor)}))
+        assert response.status_code == 400
+        assert list(response.data) == ['cursor']
+        assert len(queries) == 0
+
+    def test_it_converts_the_time_zone_of_tokens(self, settings):
+        settings.USE_TZ = True
+        position = timezone.make_aware(
+            self.start_of_test + timedelta(seconds=2)).astimezone(UTC)
+        view = ViewSetWithCursor.as_view({'get': 'list'})
+        response = view(factory.get('/data/', {
+            'cursor': encode_cursor(Cursor(position, None))}))
+        assert response.status_code == 200
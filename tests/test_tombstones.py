@@ -0,0 +1,183 @@
+import json
+from datetime import timedelta
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+from rest_framework.test import APIRequestFactory
+from rest_framework.viewsets import ReadOnlyModelViewSet
+
+from timeordered_pagination.aio import AsyncTimeOrderedPaginationViewSetMixin
+from timeordered_pagination.views import TimeOrderedPaginationViewSetMixin
+from tests.models import ModelWithModified, ModelWithModifiedTombstone
+from tests.test_versions import ViewSetWithVersion
+from tests.utils import create_at, get
+from tests.views import ModelWithModifiedSerializer
+
+
+factory = APIRequestFactory()
+
+
+class ViewSetWithTombstones(TimeOrderedPaginationViewSetMixin,
+                            ReadOnlyModelViewSet):
+    queryset = ModelWithModified.objects.all()
+    serializer_class = ModelWithModifiedSerializer
+    ordering = 'id'
+    tombstone_model = ModelWithModifiedTombstone
+
+
+class ViewSetWithPrefetchedTombstones(ViewSetWithTombstones):
+    prefetch_next_item_override = True
+
+
+class ViewSetWithStreamedTombstones(ViewSetWithTombstones):
+    cursor_query_param = 'cursor'
+    stream_query_param = 'stream'
+    stream_chunk_size = 3
+
+
+class AsyncViewSetWithTombstones(AsyncTimeOrderedPaginationViewSetMixin,
+                                 ViewSetWithTombstones):
+    pass
+
+
+class ShardedViewSetWithTombstones(ViewSetWithTombstones):
+    cursor_query_param = 'cursor'
+    shard_aliases = ['default']
+
+
+class BatchViewSetWithTombstones(ViewSetWithTombstones):
+    cursor_query_param = 'cursor'
+    batch_filter_fields = ('n',)
+
+
+class VersionViewSetWithTombstones(ViewSetWithVersion):
+    tombstone_model = ModelWithModifiedTombstone
+
+
+@pytest.mark.django_db
+class TestTombstones:
+
+    def setup(self):
+        self.start_of_test = timezone.now() - timedelta(hours=1)
+        # Items at even seconds, and the deletions of 1 and 3 at 5 and 7
+        # seconds
+        self.models = []
+        for n in range(6):
+            self.models.append(
+                create_at(ModelWithModified, self.at(n * 2), n=n))
+        self.deleted = [self.models[1].pk, self.models[3].pk]
+        for n in (1, 3):
+            self.models[n].delete()
+        for pk, seconds in zip(self.deleted, (5, 7)):
+            ModelWithModifiedTombstone.objects.filter(object_id=pk).update(
+                deleted=self.at(seconds))
+        self.view = ViewSetWithTombstones.as_view({'get': 'list'})
+
+    def at(self, seconds):
+        return self.start_of_test + timedelta(seconds=seconds)
+
+    def summarize(self, response):
+        return [('deleted', result['id']) if result.get('deleted')
+                else ('live', result['n'])
+                for result in response.data['results']]
+
+    def test_deleting_records_a_tombstone(self):
+        tombstones = ModelWithModifiedTombstone.objects.order_by('object_id')
+        assert [t.object_id for t in tombstones] == self.deleted
+
+    def test_it_interleaves_tombstones_in_order(self):
+        response = get(self.view, {
+            'modified_from': self.start_of_test.isoformat(), 'limit': 10})
+        assert self.summarize(response) == [
+            ('live', 0), ('live', 2), ('deleted', self.deleted[0]),
+            ('deleted', self.deleted[1]), ('live', 4), ('live', 5),
+        ]
+        assert response.data['next'] is None
+        # Only the items are counted
+        assert response.data['count'] == 4
+
+    def test_tombstones_carry_their_position(self):
+        response = get(self.view, {'modified_after': self.at(4).isoformat(),
+                                   'limit': 1})
+        assert response.data['results'] == [{
+            'id': self.deleted[0],
+            'modified': self.at(5),
+            'deleted': True,
+        }]
+
+    def test_next_links_can_point_at_tombstones(self):
+        response = get(self.view, {
+            'modified_from': self.start_of_test.isoformat(), 'limit': 2})
+        assert self.summarize(response) == [('live', 0), ('live', 2)]
+        response = get(self.view, response.data['next'])
+        assert self.summarize(response) == [
+            ('deleted', self.deleted[0]), ('deleted', self.deleted[1])]
+
+    def test_it_walks_the_feed(self):
+        seen = []
+        url = '/data/?modified_from={}&limit=4'.format(
+            self.start_of_test.isoformat()).replace('+', '%2B')
+        while url:
+            response = get(self.view, url)
+            seen.extend(self.summarize(response))
+            url = response.data['next']
+        assert len(seen) == 6
+        assert len(set(seen)) == 6
+
+    def test_it_ignores_tombstones_before_the_cursor(self):
+        response = get(self.view, {'modified_after': self.at(7).isoformat()})
+        assert self.summarize(response) == [('live', 4), ('live', 5)]
+
+    def test_only_the_items_are_counted_on_prefetched_pages(self):
+        view = ViewSetWithPrefetchedTombstones.as_view({'get': 'list'})
+        response = view(factory.get('/data/', {
+            'modified_from': self.start_of_test.isoformat(), 'limit': 10}))
+        assert len(response.data['results']) == 6
+        assert response.data['count'] == 4
+
+    def test_streams_include_tombstones(self):
+        view = ViewSetWithStreamedTombstones.as_view({'get': 'list'})
+        response = view(factory.get('/data/', {
+            'modified_from': self.start_of_test.isoformat(), 'stream': 1}))
+        records = [json.loads(line) for line in
+                   b''.join(response.streaming_content).splitlines()]
+        assert [('deleted', record['id']) if record.get('deleted')
+                else ('live', record['n']) for record in records[:-1]] == [
+            ('live', 0), ('live', 2), ('deleted', self.deleted[0]),
+            ('deleted', self.deleted[1]), ('live', 4), ('live', 5),
+        ]
+        assert records[-1]['trailer']['count'] == 4
+
+    def test_async_pages_include_tombstones(self):
+        viewset = AsyncViewSetWithTombstones(action_map={'get': 'list'})
+        request = viewset.initialize_request(factory.get('/data/', {
+            'modified_from': self.start_of_test.isoformat(), 'limit': 10}))
+        viewset.request = request
+        viewset.format_kwarg = None
+        viewset.args, viewset.kwargs = (), {}
+        response = async_to_sync(viewset.list)(request)
+        assert self.summarize(response) == [
+            ('live', 0), ('live', 2), ('deleted', self.deleted[0]),
+            ('deleted', self.deleted[1]), ('live', 4), ('live', 5),
+        ]
+        assert response.data['count'] == 4
+
+    def test_shards_cannot_include_tombstones(self):
+        view = ShardedViewSetWithTombstones.as_view({'get': 'list'})
+        with pytest.raises(ImproperlyConfigured):
+            view(factory.get('/data/', {
+                'modified_from': self.start_of_test.isoformat()}))
+
+    def test_tombstones_need_a_timestamp_target(self):
+        view = VersionViewSetWithTombstones.as_view({'get': 'list'})
+        with pytest.raises(ImproperlyConfigured):
+            view(factory.get('/data/', {'version_from': 1}))
+
+    def test_batches_cannot_include_tombstones(self):
+        view = BatchViewSetWithTombstones.as_view({'post': 'batch'})
+        with pytest.raises(ImproperlyConfigured):
+            view(factory.post('/data/batch/', {'feeds': [{}]},
+                              format='json'))
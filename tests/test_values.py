@@ -0,0 +1,77 @@
+import json
+
+import mock
+import pytest
+
+from tests.models import ModelWithModified
+from tests.utils import an_hour_ago, get_with_queries
+from tests.views import ViewSetWithModified
+
+
+class ViewSetWithValues(ViewSetWithModified):
+    values_fields = ('n',)
+
+
+class ViewSetWithSettledValues(ViewSetWithValues):
+    settle_window = 60
+
+
+@pytest.mark.django_db
+class TestValuesFastPath:
+
+    def setup(self):
+        self.an_hour_ago = an_hour_ago()
+        for n in range(7):
+            ModelWithModified.objects.create(n=n)
+        ModelWithModified.objects.update(modified=self.an_hour_ago)
+
+    def params(self, **params):
+        return dict(params, modified_from=self.an_hour_ago.isoformat())
+
+    def test_it_renders_the_values(self):
+        response, queries = get_with_queries(ViewSetWithValues, self.params())
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'application/json'
+        data = json.loads(response.content.decode('utf-8'))
+        assert [sorted(result) for result in data['results']] == \
+            [['id', 'modified', 'n']] * 5
+        assert [result['n'] for result in data['results']] == \
+            [0, 1, 2, 3, 4]
+        assert data['count'] == 7
+        assert data['count_strategy'] == 'exact'
+        page_query = [query['sql'] for query in queries
+                      if 'LIMIT 5' in query['sql']][0]
+        assert '"created"' not in page_query
+
+    def test_it_bypasses_the_serializer(self):
+        with mock.patch.object(ViewSetWithValues, 'get_serializer') as \
+                get_serializer:
+            response, _ = get_with_queries(ViewSetWithValues, self.params())
+        assert response.status_code == 200
+        assert not get_serializer.called
+
+    def test_the_next_link_is_built_from_the_last_row(self):
+        response, _ = get_with_queries(ViewSetWithValues, self.params())
+        data = json.loads(response.content.decode('utf-8'))
+        response, _ = get_with_queries(ViewSetWithValues, data['next'])
+        data = json.loads(response.content.decode('utf-8'))
+        assert [result['n'] for result in data['results']] == [5, 6]
+        assert data['next'] is None
+
+    def test_it_matches_the_serialized_page(self):
+        response, _ = get_with_queries(ViewSetWithValues, self.params(limit=7))
+        data = json.loads(response.content.decode('utf-8'))
+        models = ModelWithModified.objects.order_by('modified', 'id')
+        assert [(r['id'], r['n']) for r in data['results']] == \
+            [(model.id, model.n) for model in models]
+        assert data['results'][0]['modified'] == \
+            self.an_hour_ago.isoformat().replace('+00:00', 'Z')
+
+    def test_it_keeps_the_cache_headers(self):
+        response, _ = get_with_queries(ViewSetWithSettledValues, self.params())
+        assert response['ETag'].startswith('W/"')
+        assert response['Cache-Control'].startswith('private, max-age=')
+
+    def test_other_requests_are_serialized(self):
+        response, _ = get_with_queries(ViewSetWithValues, {})
+        assert response.data['results'][0].n == 0
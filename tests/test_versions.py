@@ -0,0 +1,78 @@
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from rest_framework.viewsets import ReadOnlyModelViewSet
+
+from timeordered_pagination.cursors import decode_cursor
+from timeordered_pagination.versions import next_version
+from timeordered_pagination.views import TimeOrderedPaginationViewSetMixin
+from tests.models import ModelWithVersion
+from tests.utils import get, summarize
+from tests.views import PassThroughSerializer
+
+
+class ViewSetWithVersion(TimeOrderedPaginationViewSetMixin,
+                         ReadOnlyModelViewSet):
+    queryset = ModelWithVersion.objects.all()
+    serializer_class = PassThroughSerializer
+    ordering = 'id'
+    target_field = 'version'
+
+
+class ViewSetWithVersionCursor(ViewSetWithVersion):
+    cursor_query_param = 'cursor'
+
+
+@pytest.mark.django_db
+class TestVersionField:
+
+    def test_it_stamps_increasing_versions(self):
+        models = [ModelWithVersion.objects.create(n=n) for n in range(3)]
+        assert [model.version for model in models] == [1, 2, 3]
+
+    def test_saving_bumps_the_version(self):
+        first = ModelWithVersion.objects.create(n=0)
+        ModelWithVersion.objects.create(n=1)
+        first.save()
+        first.refresh_from_db()
+        assert first.version == 3
+
+    def test_it_gives_updates_the_next_version(self):
+        ModelWithVersion.objects.create(n=0)
+        ModelWithVersion.objects.update(
+            version=next_version(ModelWithVersion, 'version'))
+        assert ModelWithVersion.objects.get().version == 2
+
+
+@pytest.mark.django_db
+class TestVersionTarget:
+
+    def setup(self):
+        self.models = [ModelWithVersion.objects.create(n=n) for n in range(7)]
+        # saving moves an item to the end of the feed
+        self.models[0].save()
+
+    def test_it_pages_by_version(self):
+        response = get(ViewSetWithVersion, {'version_from': 3})
+        assert summarize(response) == [2, 3, 4, 5, 6]
+        params = parse_qs(urlparse(response.data['next']).query)
+        assert params['version_from'] == ['8']
+        response = get(ViewSetWithVersion, response.data['next'])
+        assert summarize(response) == [0]
+
+    def test_it_compares_versions_as_integers(self):
+        response = get(ViewSetWithVersion, {'version_after': '07'})
+        assert summarize(response) == [0]
+
+    def test_it_rejects_versions_that_are_not_integers(self):
+        response = get(ViewSetWithVersion, {'version_after': '1.5'})
+        assert response.status_code == 400
+
+    def test_cursors_carry_integers(self):
+        response = get(ViewSetWithVersionCursor, {'version_from': 0,
+                                                  'limit': 3})
+        token = parse_qs(urlparse(response.data['next']).query)['cursor'][0]
+        cursor = decode_cursor(token)
+        assert cursor.position == 5
+        assert cursor.start_from == self.models[4].pk
@@ -2,6 +2,8 @@ import pytest
 from mock import Mock, sentinel, patch
 from datetime import datetime
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 
@@ -11,7 +13,8 @@ from rest_framework.test import APIRequestFactory
 from timeordered_pagination.views import TimeOrderedPaginationViewSetMixin
 
 from tests.models import (ModelWithModified, ModelWithAnotherField)
-from tests.views import (ViewSetWithModified, ViewSetWithAnotherField)
+from tests.views import (ViewSetWithModified, ViewSetWithAnotherField,
+                         ViewSetWithPrefetchedNextItem)
 
 
 factory = APIRequestFactory()
@@ -121,7 +124,17 @@ class ItReturnsCustomPaginatorTests:
                 'custom_db_id_field',
                 'start_from_custom_db_id_field',
                 sut.limit_query_param_override,
-                sut.max_limit_override)
+                sut.max_limit_override,
+                prefetch_next_item_override=None,
+                count_strategy_override=None,
+                cursor_query_param_override=None,
+                settle_window_override=None,
+                page_cache_override=None,
+                metrics_sink_override=None,
+                before_query_param_override='custom_time_field_before',
+                late_row_lookup_override=False,
+                until_query_param_override='custom_time_field_until',
+                cache_public_override=False)
 
 
 @pytest.mark.django_db
@@ -342,3 +355,60 @@ class TestWithAnotherField:
         assert response.data['results'] == [
             self.middle_secondPK,
             self.last]
+
+
+@pytest.mark.django_db
+class TestQueriesPerPage:
+
+    def setup(self):
+        self.start_of_test = timezone.now()
+        self.models = [
+            ModelWithModified.objects.create(n=n) for n in range(10)
+        ]
+
+    def get_page(self, view, params):
+        request = factory.get('/data/', params)
+        with CaptureQueriesContext(connection) as queries:
+            response = view(request)
+        return response, len(queries)
+
+    def test_it_probes_for_the_next_item_separately_by_default(self):
+        view = ViewSetWithModified.as_view({'get': 'list'})
+        response, num_queries = self.get_page(view, {
+            'modified_from': self.start_of_test.isoformat(), 'limit': 3})
+
+        # count, page, next item exists() and next item get()
+        assert num_queries == 4
+        assert response.data['results'] == self.models[:3]
+
+    def test_it_fetches_the_page_and_next_item_in_one_query(self):
+        view = ViewSetWithPrefetchedNextItem.as_view({'get': 'list'})
+        response, num_queries = self.get_page(view, {
+            'modified_from': self.start_of_test.isoformat(), 'limit': 3})
+
+        # count and page (including the next item)
+        assert num_queries == 2
+        assert response.data['results'] == self.models[:3]
+
+    def test_it_builds_the_same_next_link_from_the_prefetched_item(self):
+        params = {'modified_from': self.start_of_test.isoformat(), 'limit': 3}
+        expected = ViewSetWithModified.as_view({'get': 'list'})(
+            factory.get('/data/', params)).data['next']
+
+        response, _ = self.get_page(
+            ViewSetWithPrefetchedNextItem.as_view({'get': 'list'}), params)
+
+        assert response.data['next'] == expected
+        assert 'start_from_id={}'.format(self.models[3].id) in expected
+
+    def test_it_has_no_next_link_on_the_last_prefetched_page(self):
+        view = ViewSetWithPrefetchedNextItem.as_view({'get': 'list'})
+        response, num_queries = self.get_page(view, {
+            'modified_from': self.models[8].modified.isoformat(),
+            'limit': 3})
+
+        # the page was not full, so it is also the count
+        assert num_queries == 1
+        assert response.data['results'] == self.models[8:]
+        assert response.data['count'] == 2
+        assert response.data['next'] is None
@@ -1,14 +1,14 @@
-from django.conf.urls import url, include
+from django.urls import include, re_path
 
 from rest_framework import routers
 
-from tests.views import TestViewSet, TestViewSetWithAnotherField
+from tests.views import ViewSetWithModified, ViewSetWithAnotherField
 
 
 router = routers.DefaultRouter()
-router.register(r'data', TestViewSet)
-router.register(r'data-with-another-field', TestViewSetWithAnotherField)
+router.register(r'data', ViewSetWithModified)
+router.register(r'data-with-another-field', ViewSetWithAnotherField)
 
 urlpatterns = [
-    url(r'^', include(router.urls)),
+    re_path(r'^', include(router.urls)),
 ]
@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from rest_framework.test import APIRequestFactory
+
+
+factory = APIRequestFactory()
+
+
+def an_hour_ago():
+    return timezone.now() - timedelta(hours=1)
+
+
+def create_at(model, modified, using='default', field='modified', **kwargs):
+    """
+    Creates an instance of 'model' from 'kwargs' and sets its 'field' to
+    'modified', which an auto_now field would overwrite on save.
+    """
+    instance = model.objects.using(using).create(**kwargs)
+    model.objects.using(using).filter(pk=instance.pk).update(
+        **{field: modified})
+    setattr(instance, field, modified)
+    return instance
+
+
+def get(view, url_or_params):
+    """
+    Returns the response of 'view' (or of a viewset's list action) to a GET
+    of a URL, e.g. a 'next' link, or of '/data/' with a dict of params.
+    """
+    if isinstance(view, type):
+        view = view.as_view({'get': 'list'})
+    if isinstance(url_or_params, dict):
+        return view(factory.get('/data/', url_or_params))
+    return view(factory.get(url_or_params))
+
+
+def get_with_queries(view, url_or_params):
+    """
+    Returns the response of 'get()' and the queries it ran.
+    """
+    with CaptureQueriesContext(connection) as queries:
+        response = get(view, url_or_params)
+    return response, queries
+
+
+def summarize(response):
+    return [item.n for item in response.data['results']]
@@ -11,6 +11,13 @@ class PassThroughSerializer(serializers.BaseSerializer):
         return item
 
 
+class ModelWithModifiedSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = ModelWithModified
+        fields = ('id', 'n', 'modified')
+
+
 class ViewSetWithModified(TimeOrderedPaginationViewSetMixin,
                           ReadOnlyModelViewSet):
     queryset = ModelWithModified.objects.all()
@@ -24,3 +31,29 @@ class ViewSetWithAnotherField(TimeOrderedPaginationViewSetMixin,
     serializer_class = PassThroughSerializer
     ordering = 'id'
     target_field = 'another_field'
+
+
+class ViewSetWithPrefetchedNextItem(TimeOrderedPaginationViewSetMixin,
+                                    ReadOnlyModelViewSet):
+    queryset = ModelWithModified.objects.all()
+    serializer_class = PassThroughSerializer
+    ordering = 'id'
+    prefetch_next_item_override = True
+
+
+class ViewSetWithCursor(TimeOrderedPaginationViewSetMixin,
+                        ReadOnlyModelViewSet):
+    queryset = ModelWithModified.objects.all()
+    serializer_class = PassThroughSerializer
+    ordering = 'id'
+    cursor_query_param = 'cursor'
+
+
+class ViewSetWithStreaming(TimeOrderedPaginationViewSetMixin,
+                           ReadOnlyModelViewSet):
+    queryset = ModelWithModified.objects.all()
+    serializer_class = ModelWithModifiedSerializer
+    ordering = 'id'
+    cursor_query_param = 'cursor'
+    stream_query_param = 'stream'
+    stream_chunk_size = 3